@@ -1,9 +1,308 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
 import sys
+from core.stat_collector import RunOptions
 from core.cpu_stat_collector import CpuStatCollector
+from core.timeline_collector import TimelineCollector, DEFAULT_BUCKET_WIDTH
+from core.interval_exporter import IntervalExporter
+from core.outlier_collector import OutlierCollector, OUTLIER_CATEGORIES
+from core.run_profiler import RunProfiler
+from core.checkpoint import CheckpointError
+from core.result_cache import ResultCache, DEFAULT_CACHE_SIZE
+from core.trace_time import parse_trace_time, TimeRangeError
+from core.live_runner import GrowingTraceSource, IteratorSource
+from core.bt2_source import Bt2LiveSource, is_live_url
+from core.text_trace_source import TextTraceSource
+from core.event_source import TRACE_BACKENDS
+from core.rollup import ROLLUP_LEVELS
+
+# 'K' for every category, or 'CATEGORY=K,...' the others keeping the default
+def parse_outlier_counts(text):
+    if '=' not in text:
+        count = int(text)
+        if count < 1:
+            raise argparse.ArgumentTypeError('must be positive')
+        return count
+
+    counts = {}
+    for item in text.split(','):
+        category, _, count = item.partition('=')
+        if category not in OUTLIER_CATEGORIES:
+            raise argparse.ArgumentTypeError('unknown category %r, not one '
+                                             'of %s' %
+                                             (category,
+                                              ', '.join(OUTLIER_CATEGORIES)))
+        counts[category] = int(count)
+        if counts[category] < 1:
+            raise argparse.ArgumentTypeError('must be positive')
+
+    return counts
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+                        description='Analyse the CPU usage of a CTF trace')
+    parser.add_argument('path',
+                        help='trace directory, a file of perf script or '
+                             'ftrace text output, or the net:// URL of an '
+                             'LTTng live session (with --live)')
+    parser.add_argument('--begin', type=parse_trace_time, default=None,
+                        help='analyse from this timestamp (ns, or with a '
+                             'ns/us/ms/s unit), or from this offset from the '
+                             'beginning of the trace when prefixed with +')
+    parser.add_argument('--end', type=parse_trace_time, default=None,
+                        help='analyse up to this timestamp or offset, see '
+                             '--begin')
+    parser.add_argument('--keep-intervals', action='store_true',
+                        help='keep every measured interval in memory '
+                             'instead of streaming statistics only')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='analyse the per-cpu streams in JOBS worker '
+                             'processes (runs the serial analysis on traces '
+                             'with sched_process_* or statedump events)')
+    parser.add_argument('-w', '--windows', type=int, default=1,
+                        help='also split the trace in WINDOWS time windows '
+                             'analysed by separate workers')
+    parser.add_argument('--engine', choices=['python', 'numpy'],
+                        default='python',
+                        help='compute the statistics event by event or with '
+                             'numpy array operations (runs the serial '
+                             'analysis on traces with sched_process_* or '
+                             'statedump events)')
+    parser.add_argument('--backend', choices=sorted(TRACE_BACKENDS),
+                        default='babeltrace',
+                        help='read the trace with the babeltrace 1 python '
+                             'module or through a babeltrace 2 (bt2) graph '
+                             'trimming the time range natively (default: '
+                             '%(default)s)')
+    parser.add_argument('--event-cache', action='store_true',
+                        help='read the decoded events from PATH.columns, '
+                             'converting the trace into it first when it is '
+                             'missing or out of date, which holds the events '
+                             'in memory, about 50 bytes each (not used with '
+                             '--jobs or --windows)')
+    parser.add_argument('--live', type=float, default=None, metavar='SECONDS',
+                        help='follow a trace still being written and report '
+                             'on the events of every SECONDS interval. A '
+                             'trace directory is reopened as its streams '
+                             'grow, an LTTng live session (read with '
+                             'babeltrace 2) only sends the new packets')
+    parser.add_argument('--timeline', default=None, metavar='CSV',
+                        help='also write the per-cpu usage of every time '
+                             'bucket to CSV (serial analysis only)')
+    parser.add_argument('--timeline-tids', default=None, metavar='CSV',
+                        help='also write the per-tid usage of every time '
+                             'bucket to CSV')
+    parser.add_argument('--export-intervals', default=None, metavar='FILE',
+                        help='also write every measured interval to FILE, '
+                             'in columns (serial analysis only)')
+    parser.add_argument('--outliers', type=parse_outlier_counts, default=None,
+                        metavar='K',
+                        help='also report the K longest syscalls, irqs, '
+                             'softirqs and timeslices of every syscall name, '
+                             'irq, softirq vector and cpu, K being a count '
+                             'or e.g. syscall=20,run=5 (serial analysis '
+                             'only)')
+    parser.add_argument('--group-by', action='append', default=None,
+                        choices=ROLLUP_LEVELS,
+                        help='report the per-thread tables per thread, per '
+                             'process (tgid, when the trace has fork or '
+                             'statedump events) or per comm; repeat for '
+                             'several (default: tid). Without tid, ended '
+                             'threads are only kept added up per process or '
+                             'comm')
+    parser.add_argument('--top', type=int, default=None,
+                        help='print the TOP rows of the per-thread tables '
+                             'only, and the TOP syscalls of each')
+    parser.add_argument('--bucket-width', type=parse_trace_time,
+                        default=None,
+                        help='timeline bucket width, ns or with a unit '
+                             '(default: 10ms)')
+    parser.add_argument('--profile', action='store_true',
+                        help='report the progress and where the time went on '
+                             'stderr (serial analysis only, without the '
+                             'result cache)')
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        metavar='SECONDS',
+                        help='seconds between two --profile progress reports '
+                             '(default: %(default)s)')
+    parser.add_argument('--checkpoint', default=None, metavar='FILE',
+                        help='resume from the analysis state saved in FILE, '
+                             'only reading the events after it, and save '
+                             'the state to FILE afterwards, to analyse a '
+                             'rotated or appended trace chunk by chunk '
+                             '(serial analysis only, without the result '
+                             'cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='neither read nor store the results in the '
+                             'result cache')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='remove every cached result before analysing')
+    parser.add_argument('--cache-dir', default=None,
+                        help='result cache directory (default: '
+                             '$XDG_CACHE_HOME/cpu_usage_analyser)')
+    parser.add_argument('--cache-size', type=int,
+                        default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='evict the least recently used results beyond '
+                             'CACHE_SIZE MiB (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    if args.windows < 1:
+        parser.error('--windows must be positive')
+
+    args.timeline_enabled = args.timeline is not None or \
+                            args.timeline_tids is not None
+    if args.timeline_enabled and args.live is not None:
+        parser.error('--timeline cannot be used with --live')
+    if args.profile and args.live is not None:
+        parser.error('--profile cannot be used with --live')
+    if args.progress_interval <= 0:
+        parser.error('--progress-interval must be positive')
+    if args.export_intervals is not None and args.live is not None:
+        parser.error('--export-intervals cannot be used with --live')
+    if args.checkpoint is not None and args.live is not None:
+        parser.error('--checkpoint cannot be used with --live')
+    if args.checkpoint is not None and args.timeline_enabled:
+        parser.error('--checkpoint cannot be used with --timeline')
+    if os.path.isfile(args.path) and args.live is not None:
+        parser.error('--live needs a trace directory')
+    if is_live_url(args.path) and args.live is None:
+        parser.error('an LTTng live session needs --live')
+    if args.live is not None:
+        # a live run follows the trace from its beginning, event by event
+        if args.begin is not None or args.end is not None:
+            parser.error('--begin and --end cannot be used with --live')
+        if args.jobs != 1 or args.windows != 1:
+            parser.error('--jobs and --windows cannot be used with --live')
+        if args.engine != 'python':
+            parser.error('--engine numpy cannot be used with --live')
+        if args.event_cache:
+            parser.error('--event-cache cannot be used with --live')
+    if args.engine == 'numpy' and (args.jobs != 1 or args.windows != 1):
+        parser.error('--engine numpy cannot be used with --jobs and '
+                     '--windows')
+    if os.path.isfile(args.path) and (args.jobs != 1 or args.windows != 1):
+        parser.error('--jobs and --windows need a trace directory')
+    # the numpy engine and the parallel runner only compute the usage
+    # report, see StatCollector.check_options()
+    if args.engine == 'numpy' or args.jobs != 1 or args.windows != 1:
+        if args.engine == 'numpy':
+            mode = '--engine numpy'
+        else:
+            mode = '--jobs and --windows'
+        for option, enabled in (('--timeline', args.timeline_enabled),
+                                ('--export-intervals',
+                                 args.export_intervals is not None),
+                                ('--outliers', args.outliers is not None),
+                                ('--profile', args.profile),
+                                ('--checkpoint', args.checkpoint is not None)):
+            if enabled:
+                parser.error('%s cannot be used with %s' % (option, mode))
+    if args.top is not None and args.top < 1:
+        parser.error('--top must be positive')
+    if args.group_by is None:
+        args.group_by = ['tid']
+    if args.bucket_width is not None and args.bucket_width.timestamp <= 0:
+        parser.error('--bucket-width must be positive')
+
+    return args
+
+def print_unparsed_lines(source):
+    line, error = source.unparsed_example
+    print('%s: %s: skipped %d event lines which could not be parsed, e.g. '
+          '(%s):\n%s' % (sys.argv[0], source.path, source.unparsed_lines,
+                         error, line.strip()), file=sys.stderr)
+
+def write_timeline(timeline, args):
+    if args.timeline is not None:
+        with open(args.timeline, 'w', newline='') as f:
+            timeline.write_cpu_csv(f)
+
+    if args.timeline_tids is not None:
+        with open(args.timeline_tids, 'w', newline='') as f:
+            timeline.write_tid_csv(f)
 
 if __name__ == '__main__':
-   collector = CpuStatCollector(sys.argv[1])
-   collector.run()
-   collector.print_result()
+   args = parse_args()
+
+   cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+   if args.clear_cache:
+       cache.clear()
+   if args.no_cache:
+       cache = None
+
+   live_source = None
+   if args.live is not None and is_live_url(args.path):
+       live_source = IteratorSource(Bt2LiveSource(args.path).events())
+   elif args.live is not None:
+       # per-cpu streams flushed longer than two intervals ago are idle
+       live_source = GrowingTraceSource(args.path,
+                                        max_lag=int(args.live * 2e9))
+
+   # text dumps are streamed by the serial analysis
+   source = None
+   if os.path.isfile(args.path):
+       source = TextTraceSource(args.path)
+
+   profiler = None
+   if args.profile:
+       profiler = RunProfiler(args.progress_interval)
+
+   options = RunOptions(jobs=args.jobs, windows=args.windows,
+                        begin_ts=args.begin, end_ts=args.end,
+                        engine=args.engine, cache=cache,
+                        event_cache=args.event_cache,
+                        live_source=live_source, live_interval=args.live,
+                        source=source, backend=args.backend,
+                        profiler=profiler, checkpoint=args.checkpoint)
+
+   collector = CpuStatCollector(args.path, args.keep_intervals, options,
+                                top=args.top, rollups=args.group_by)
+
+   # computed in the same pass as the usage report
+   timeline = None
+   if args.timeline_enabled:
+       bucket_width = DEFAULT_BUCKET_WIDTH
+       if args.bucket_width is not None:
+           bucket_width = args.bucket_width.timestamp
+       timeline = TimelineCollector(args.path, bucket_width)
+       collector.attach(timeline)
+
+   if args.export_intervals is not None:
+       collector.attach(IntervalExporter(args.path, args.export_intervals))
+
+   outliers = None
+   if args.outliers is not None:
+       outliers = OutlierCollector(args.path, args.outliers)
+       collector.attach(outliers)
+
+   try:
+       collector.run()
+   except (TimeRangeError, CheckpointError) as e:
+       sys.exit('%s: %s' % (sys.argv[0], e))
+   except KeyboardInterrupt:
+       sys.exit(0)
+
+   runner = collector.analyser_runner
+   if runner is not None and runner.fallback is not None:
+       print('%s: %s: %s' % (sys.argv[0], args.path, runner.fallback),
+             file=sys.stderr)
+
+   if source is not None and source.unparsed_lines:
+       print_unparsed_lines(source)
+
+   # live mode reports as it goes
+   if live_source is None:
+       collector.print_result()
+       if outliers is not None:
+           outliers.print_result()
+
+   if timeline is not None:
+       write_timeline(timeline, args)
+
+   if profiler is not None:
+       profiler.print_result()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from core.fleet import analyse_fleet, restored_collector
+from core.trace_diff import diff_collectors, find_regressions, print_diff
+from core.trace_diff import diff_thresholds
+from core.trace_diff import DEFAULT_THRESHOLD, DEFAULT_RELATIVE_THRESHOLD
+from core.trace_diff import DEFAULT_LATENCY_THRESHOLDS
+from core.trace_diff import DIFF_CATEGORIES
+from core.stat_collector import RunOptions
+from core.result_cache import ResultCache, DEFAULT_CACHE_SIZE
+from core.trace_time import parse_trace_time
+from core.event_source import TRACE_BACKENDS
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+                        description='Compare the CPU usage of a candidate '
+                                    'trace to a baseline one, exiting with '
+                                    'status 1 when something got more '
+                                    'expensive or slower beyond the '
+                                    'thresholds')
+    parser.add_argument('baseline', help='baseline trace directory or text '
+                                         'dump')
+    parser.add_argument('candidate', help='candidate trace directory or text '
+                                          'dump')
+    parser.add_argument('--begin', type=parse_trace_time, default=None,
+                        help='analyse both traces from this timestamp, or '
+                             'offset from their beginning when prefixed '
+                             'with +')
+    parser.add_argument('--end', type=parse_trace_time, default=None,
+                        help='analyse both traces up to this timestamp or '
+                             'offset, see --begin')
+    parser.add_argument('--engine', choices=['python', 'numpy'],
+                        default='python',
+                        help='compute the statistics event by event or with '
+                             'numpy array operations')
+    parser.add_argument('--backend', choices=sorted(TRACE_BACKENDS),
+                        default='babeltrace',
+                        help='trace reader (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='ignore the changes of the cpu %% of less than '
+                             'THRESHOLD points (default: %(default)s)')
+    parser.add_argument('--avg-threshold', type=parse_trace_time,
+                        default=None,
+                        help='ignore the changes of the average latency of '
+                             'less than AVG_THRESHOLD, ns or with a unit '
+                             '(default: %dns)' %
+                             DEFAULT_LATENCY_THRESHOLDS['average'])
+    parser.add_argument('--max-threshold', type=parse_trace_time,
+                        default=None,
+                        help='ignore the changes of the max latency of less '
+                             'than MAX_THRESHOLD, see --avg-threshold '
+                             '(default: %dns)' %
+                             DEFAULT_LATENCY_THRESHOLDS['max'])
+    parser.add_argument('--p99-threshold', type=parse_trace_time,
+                        default=None,
+                        help='ignore the changes of the p99 latency of less '
+                             'than P99_THRESHOLD, see --avg-threshold '
+                             '(default: %dns)' %
+                             DEFAULT_LATENCY_THRESHOLDS['p99'])
+    parser.add_argument('--relative-threshold', type=float,
+                        default=DEFAULT_RELATIVE_THRESHOLD,
+                        help='ignore the changes of the cpu %% or a latency '
+                             'of less than RELATIVE_THRESHOLD percent '
+                             '(default: %(default)s)')
+    parser.add_argument('--top', type=int, default=None,
+                        help='print the TOP rows of each table only')
+    parser.add_argument('-o', '--output', default=None,
+                        help='also write every row to OUTPUT as JSON')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='neither read nor store the results in the '
+                             'result cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help='result cache directory (default: '
+                             '$XDG_CACHE_HOME/cpu_usage_analyser)')
+    parser.add_argument('--cache-size', type=int,
+                        default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='evict the least recently used results beyond '
+                             'CACHE_SIZE MiB (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if args.threshold < 0 or args.relative_threshold < 0:
+        parser.error('thresholds must not be negative')
+
+    # metric -> absolute threshold in ns, of those given
+    args.latency_thresholds = {}
+    for metric, threshold in (('average', args.avg_threshold),
+                              ('max', args.max_threshold),
+                              ('p99', args.p99_threshold)):
+        if threshold is not None:
+            if threshold.relative:
+                parser.error('latency thresholds are durations, not '
+                             'offsets')
+            args.latency_thresholds[metric] = threshold.timestamp
+
+    return args
+
+if __name__ == '__main__':
+   args = parse_args()
+
+   cache = None
+   if not args.no_cache:
+       cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+   options = RunOptions(begin_ts=args.begin, end_ts=args.end,
+                        engine=args.engine, backend=args.backend,
+                        cache=cache)
+
+   # both traces analysed at once
+   collectors = {}
+   for path, result, error in analyse_fleet([args.baseline, args.candidate],
+                                            options, 2):
+       if error is not None:
+           print('%s: %s: %s' % (sys.argv[0], path, error), file=sys.stderr)
+           sys.exit(2)
+
+       collectors[path] = restored_collector(path, result)
+
+   thresholds = diff_thresholds(args.threshold, args.relative_threshold,
+                                args.latency_thresholds)
+   rows = diff_collectors(collectors[args.baseline],
+                          collectors[args.candidate], thresholds)
+   print_diff(rows, args.top)
+
+   if args.output is not None:
+       with open(args.output, 'w') as f:
+           json.dump({category : [row.to_dict() for row in rows[category]]
+                      for category in DIFF_CATEGORIES}, f, indent=2)
+
+   if find_regressions(rows):
+       sys.exit(1)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+from core.fleet import expand_trace_paths, analyse_fleet
+from core.fleet import restored_collector, FleetRollup, DEFAULT_TOP
+from core.stat_collector import RunOptions
+from core.result_cache import ResultCache, DEFAULT_CACHE_SIZE
+from core.trace_time import parse_trace_time
+from core.event_source import TRACE_BACKENDS
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+                        description='Analyse the CPU usage of many traces, '
+                                    'e.g. one per host, and roll them up')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='trace directory or text dump, or a glob '
+                             'matching some')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='analyse JOBS traces at once (default: the '
+                             'number of cpus)')
+    parser.add_argument('--begin', type=parse_trace_time, default=None,
+                        help='analyse every trace from this timestamp, or '
+                             'offset from its beginning when prefixed with +')
+    parser.add_argument('--end', type=parse_trace_time, default=None,
+                        help='analyse every trace up to this timestamp or '
+                             'offset, see --begin')
+    parser.add_argument('--engine', choices=['python', 'numpy'],
+                        default='python',
+                        help='compute the statistics event by event or with '
+                             'numpy array operations')
+    parser.add_argument('--backend', choices=sorted(TRACE_BACKENDS),
+                        default='babeltrace',
+                        help='trace reader (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP,
+                        help='rows of each rollup table (default: '
+                             '%(default)s)')
+    parser.add_argument('--rollup-only', action='store_true',
+                        help='only print the rollup, not the report of '
+                             'every trace')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='neither read nor store the results in the '
+                             'result cache')
+    parser.add_argument('--cache-dir', default=None,
+                        help='result cache directory (default: '
+                             '$XDG_CACHE_HOME/cpu_usage_analyser)')
+    parser.add_argument('--cache-size', type=int,
+                        default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='evict the least recently used results beyond '
+                             'CACHE_SIZE MiB (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    if args.top < 1:
+        parser.error('--top must be positive')
+
+    return args
+
+if __name__ == '__main__':
+   args = parse_args()
+
+   paths = expand_trace_paths(args.paths)
+   if not paths:
+       sys.exit('%s: no trace matches %s' % (sys.argv[0],
+                                              ' '.join(args.paths)))
+
+   cache = None
+   if not args.no_cache:
+       cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+   options = RunOptions(begin_ts=args.begin, end_ts=args.end,
+                        engine=args.engine, backend=args.backend,
+                        cache=cache)
+
+   rollup = FleetRollup(args.top)
+   failed = 0
+
+   try:
+       # reported as they finish
+       for path, result, error in analyse_fleet(paths, options, args.jobs):
+           if error is not None:
+               print('%s: %s: %s' % (sys.argv[0], path, error),
+                     file=sys.stderr)
+               failed += 1
+               continue
+
+           collector = restored_collector(path, result)
+           rollup.add(path, collector)
+
+           if not args.rollup_only:
+               print('### %s ###' % path)
+               print('')
+               collector.print_result()
+           sys.stdout.flush()
+   except KeyboardInterrupt:
+       sys.exit(1)
+
+   rollup.print_result()
+
+   if failed:
+       sys.exit(1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+from core.benchmark import WORKLOADS, TARGETS
+from core.benchmark import run_benchmarks, find_regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+                        description='Measure the throughput and memory of the '
+                                    'analysers on generated workloads')
+    parser.add_argument('-n', '--events', type=int, default=200000,
+                        help='events per workload (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='keep the best of REPEAT runs (default: '
+                             '%(default)s)')
+    parser.add_argument('--workload', action='append',
+                        choices=sorted(WORKLOADS),
+                        help='run this workload only, may be repeated')
+    parser.add_argument('--target', action='append', choices=TARGETS,
+                        help='run this analyser or pipeline only, may be '
+                             'repeated')
+    parser.add_argument('-o', '--output', default=None,
+                        help='write the results to OUTPUT as JSON')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='flag the results worse than the JSON results '
+                             'in BASELINE, exiting with status 1 if any')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='percentage of events/s lost or of peak '
+                             'allocated memory gained flagged by --compare '
+                             '(default: %(default)s)')
+
+    return parser.parse_args()
+
+def print_report(report):
+    table_row_format = '{:>15} {:>15} {:>10} {:>12} {:>13} {:>12} {:>8}'
+    print(table_row_format.format('workload', 'target', 'events',
+                                  'events/s', 'peak alloc kB', 'blocks/event',
+                                  'gc'))
+
+    for result in report['results']:
+        print(table_row_format.format(
+            result['workload'],
+            result['target'],
+            result['events'],
+            '%.0f' % result['events_per_sec'],
+            result['peak_alloc_kb'],
+            '%.3f' % result['retained_blocks_per_event'],
+            result['gc_collections']))
+    print('')
+
+def print_regressions(regressions):
+    print('=== Regressions ===')
+    for (workload, target), metric, previous, current, change in regressions:
+        print('%s %s: %s %.0f -> %.0f (%+.1f %%)' % (workload, target, metric,
+                                                     previous, current,
+                                                     change * 100))
+    print('')
+
+if __name__ == '__main__':
+   args = parse_args()
+
+   report = run_benchmarks(args.workload or sorted(WORKLOADS),
+                           args.target or list(TARGETS),
+                           args.events, args.repeat)
+   print_report(report)
+
+   if args.output is not None:
+       with open(args.output, 'w') as f:
+           json.dump(report, f, indent=2)
+
+   if args.compare is not None:
+       with open(args.compare) as f:
+           baseline = json.load(f)
+
+       try:
+           regressions = find_regressions(report, baseline,
+                                          args.threshold / 100)
+       except ValueError as e:
+           sys.exit('%s: %s' % (sys.argv[0], e))
+
+       if regressions:
+           print_regressions(regressions)
+           sys.exit(1)
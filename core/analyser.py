@@ -1,8 +1,27 @@
+import functools
+
+SYSCALL_ENTRY_PREFIXES = ('sys_enter_', 'syscall_entry_')
+
+def strip_event_name(event_name):
+    # for 'perf' tool
+    split_event_name = event_name.split(':')
+    if len(split_event_name) > 1:
+        return split_event_name[1].strip()
+
+    return event_name
+
+def strip_syscall_name(event_name):
+    for prefix in SYSCALL_ENTRY_PREFIXES:
+        if event_name.startswith(prefix):
+            return event_name[len(prefix):]
+
+    return event_name
+
 class Analyser:
-    def __init__(self, callbacks, notifiers, state):
+    def __init__(self, callbacks, bus, state):
         self.cbs = callbacks
         self.state = state
-        self.notifiers = notifiers
+        self.bus = bus
 
     def on_begin_analyse(self, timestamp):
         pass
@@ -10,25 +29,27 @@ class Analyser:
     def on_end_analyse(self, timestamp):
         pass
 
-    def analyse(self, event):
-        event_name = event.name
-
-        # for 'perf' tool
-        split_event_name = event.name.split(':')
-        if len(split_event_name) > 1:
-            event_name = split_event_name[1].strip()
+    # returns the callback handling 'event_name', or None when this analyser
+    # is not interested in it. syscall_entry callbacks get the stripped
+    # syscall name bound so that they don't have to parse it again.
+    def resolve(self, event_name):
+        event_name = strip_event_name(event_name)
 
         if event_name in self.cbs:
-            self.cbs[event_name](event)
+            return self.cbs[event_name]
         elif (event_name.startswith('sys_enter') or \
               event_name.startswith('syscall_entry_')) and \
               'syscall_entry' in self.cbs:
-            self.cbs['syscall_entry'](event)
+            return functools.partial(self.cbs['syscall_entry'],
+                                     syscall_name=strip_syscall_name(event_name))
         elif (event_name.startswith('sys_exit') or \
               event_name.startswith('syscall_exit_')) and \
               'syscall_exit' in self.cbs:
-            self.cbs['syscall_exit'](event)
+            return self.cbs['syscall_exit']
 
-    def notify(self, notification_id, **kwargs):
-        if notification_id in self.notifiers:
-            self.notifiers[notification_id](**kwargs)
+        return None
+
+    def analyse(self, event):
+        callback = self.resolve(event.name)
+        if callback is not None:
+            callback(event)
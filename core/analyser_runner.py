@@ -2,53 +2,191 @@ import os
 import sys
 import weakref
 
-import babeltrace
-
 from .state import State
 from .sched_analyser import SchedAnalyser
 from .syscall_analyser import SyscallAnalyser
 from .irq_analyser import IrqAnalyser
+from .event_dispatcher import EventDispatcher
+from .notification_bus import NotificationBus
+from .event_columns import EventColumns
+from .event_columns import load_event_cache, write_event_cache
+from .event_source import open_trace_source
+from .trace_time import TraceTime, TimeRangeError
 
+# Runs the analysers over the trace at 'path', read with 'backend' (see
+# TRACE_BACKENDS), or over the events of 'source' when given.
 class AnalyserRunner:
-    def __init__(self, path, notifiers, stat_collector):
-        self.trace_collection = babeltrace.TraceCollection()
-        self.trace = self.trace_collection.add_traces_recursive(path, 'ctf')
-        self.begin_ts = self.trace_collection.timestamp_begin
-        self.end_ts = self.trace_collection.timestamp_end
+    def __init__(self, path, notifiers, stat_collector,
+                 begin_ts=None, end_ts=None, event_cache=False, source=None,
+                 backend='babeltrace'):
+        # decoded events read from the event cache instead of the source
+        self.columns = None
+        if event_cache and source is None:
+            self.columns = load_event_cache(path)
+
+        self.source = source
+        if self.columns is None and self.source is None:
+            self.source = open_trace_source(path, backend)
+            if event_cache:
+                self.columns = write_event_cache(path, self.source)
+
+        if self.columns is not None:
+            self.trace_begin_ts = self.columns.timestamp_begin
+            self.trace_end_ts = self.columns.timestamp_end
+        else:
+            self.trace_begin_ts = self.source.timestamp_begin
+            self.trace_end_ts = self.source.timestamp_end
+
+        self.begin_ts = self.trace_begin_ts
+        self.end_ts = self.trace_end_ts
+
+        # only analyse the events within [begin_ts, end_ts] when given
+        self.time_range = begin_ts is not None or end_ts is not None
+        if begin_ts is not None:
+            self.begin_ts = self.resolve_time(begin_ts)
+        if end_ts is not None:
+            self.end_ts = self.resolve_time(end_ts)
+
+        if (isinstance(begin_ts, TraceTime) or isinstance(end_ts, TraceTime)) \
+           and self.begin_ts >= self.end_ts:
+            raise TimeRangeError('empty time range: %s to %s' %
+                                 (begin_ts, end_ts))
+
+        # set by resume_from()
+        self.checkpoint = None
+
+        # why the numpy engine or the parallel runner ran the serial analysis
+        # instead, None when they didn't
+        self.fallback = None
 
+        self.init_analysers(notifiers, stat_collector)
+
+    def init_analysers(self, notifiers, stat_collector):
+        # the stat collector owning the run, see attach() for the others
         self.stat_collector = weakref.ref(stat_collector)
+        self.stat_collectors = [self.stat_collector]
+
+        self.bus = NotificationBus()
+        self.bus.subscribe(notifiers)
 
-        state = State()
+        self.state = State()
+        self.sched_analyser = SchedAnalyser(self.bus, self.state)
         self.analysers = [
-            SchedAnalyser(notifiers, state),
-            SyscallAnalyser(notifiers, state),
-            IrqAnalyser(notifiers, state),
+            self.sched_analyser,
+            SyscallAnalyser(self.bus, self.state),
+            IrqAnalyser(self.bus, self.state),
         ]
+        self.dispatcher = EventDispatcher(self.analysers)
+
+    # has another stat collector fed by the same pass over the trace
+    def attach(self, stat_collector):
+        self.stat_collectors.append(weakref.ref(stat_collector))
+        self.bus.subscribe(stat_collector.notifiers)
+
+        stat_collector.analyser_runner = self
+
+    # a TraceTime given by the user is clamped to the trace
+    def resolve_time(self, timestamp):
+        if not isinstance(timestamp, TraceTime):
+            return timestamp
+
+        timestamp = timestamp.resolve(self.trace_begin_ts)
+
+        return min(max(timestamp, self.trace_begin_ts), self.trace_end_ts)
+
+    # goes on from 'checkpoint' (see Checkpoint), the events up to its end
+    # being already analysed: only the later ones are read
+    def resume_from(self, checkpoint):
+        self.checkpoint = checkpoint
+
+        if self.begin_ts <= checkpoint.end_ts:
+            self.begin_ts = checkpoint.end_ts + 1
+            self.time_range = True
+        self.end_ts = max(self.end_ts, checkpoint.end_ts)
+
+    # begin_analyse() at the beginning of the run, or of the first chunk when
+    # resuming, the State and results then being the checkpointed ones
+    def begin_run(self):
+        if self.checkpoint is None:
+            self.analyse_begin_ts = self.begin_ts
+            self.begin_analyse(self.begin_ts)
+            return
+
+        self.analyse_begin_ts = self.checkpoint.begin_ts
+        self.begin_analyse(self.checkpoint.begin_ts)
+        self.checkpoint.restore(self)
 
     def process_event(self, event):
-        for analyser in self.analysers:
-            analyser.analyse(event)
+        self.dispatcher.dispatch(event)
 
     def begin_analyse(self, timestamp):
         for analyser in self.analysers:
             analyser.on_begin_analyse(timestamp)
 
-        sc = self.stat_collector()
-        if sc is not None:
-            sc.on_begin_analyse(timestamp)
+        for stat_collector in self.stat_collectors:
+            sc = stat_collector()
+            if sc is not None:
+                sc.on_begin_analyse(timestamp)
 
     def end_analyse(self, timestamp):
         for analyser in self.analysers:
             analyser.on_end_analyse(timestamp)
 
-        sc = self.stat_collector()
-        if sc is not None:
-            sc.on_end_analyse(timestamp)
+        for stat_collector in self.stat_collectors:
+            sc = stat_collector()
+            if sc is not None:
+                sc.on_end_analyse(timestamp)
+
+    def events(self):
+        if self.columns is not None:
+            return self.event_columns().events()
+
+        if self.time_range:
+            return self.source.events(self.begin_ts, self.end_ts)
+
+        return self.source.events()
+
+    # names of the event classes of the source which the analysers handle,
+    # None when every event has to be looked at
+    def subscribed_events(self):
+        # the event cache only holds those
+        if self.columns is not None or self.source is None:
+            return None
+
+        event_names = self.source.event_names()
+        if event_names is None:
+            return None
+
+        return self.dispatcher.subscribed(event_names)
+
+    # the events to analyse, as EventColumns
+    def event_columns(self):
+        if self.columns is None:
+            return EventColumns.from_events(self.events())
+
+        if self.time_range:
+            return self.columns.slice(self.begin_ts, self.end_ts)
+
+        return self.columns
 
     def run(self):
-        self.begin_analyse(self.begin_ts)
+        profiler = self.stat_collector().options.profiler
+        if profiler is not None:
+            profiler.run(self)
+            return
+
+        self.begin_run()
+
+        subscribed = self.subscribed_events()
+        dispatch = self.dispatcher.dispatch
 
-        for event in self.trace_collection.events:
-            self.process_event(event)
+        if subscribed is None:
+            for event in self.events():
+                dispatch(event)
+        else:
+            # skip the other events before reading any of their fields
+            for event in self.events():
+                if event.name in subscribed:
+                    dispatch(event)
 
         self.end_analyse(self.end_ts)
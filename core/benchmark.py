@@ -0,0 +1,229 @@
+import gc
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+
+from . import state
+from .notification_bus import NotificationBus
+from .sched_analyser import SchedAnalyser
+from .syscall_analyser import SyscallAnalyser
+from .irq_analyser import IrqAnalyser
+from .event_dispatcher import EventDispatcher
+from .event_source import SyntheticSource
+from .stat_collector import RunOptions
+from .cpu_stat_collector import CpuStatCollector
+
+# bump whenever the workloads or the measurements change, results of another
+# version are not compared
+BENCHMARK_VERSION = 2
+
+# SyntheticSource parameters of each workload, besides the event count
+WORKLOADS = {
+    'sched-heavy' : {'cpus' : 8, 'threads' : 64, 'syscall_rate' : 0.05,
+                     'irq_rate' : 0.005, 'softirq_rate' : 0.005},
+    'syscall-heavy' : {'cpus' : 8, 'threads' : 64, 'syscall_rate' : 0.9,
+                       'block_rate' : 0.05, 'irq_rate' : 0.005,
+                       'softirq_rate' : 0.005},
+    'irq-storm' : {'cpus' : 8, 'threads' : 64, 'syscall_rate' : 0.2,
+                   'irq_rate' : 0.3, 'softirq_rate' : 0.2},
+    'fan-out' : {'cpus' : 32, 'threads' : 20000, 'syscall_rate' : 0.4,
+                 'irq_rate' : 0.01, 'softirq_rate' : 0.01},
+}
+
+ANALYSERS = {
+    'sched' : SchedAnalyser,
+    'syscall' : SyscallAnalyser,
+    'irq' : IrqAnalyser,
+}
+
+# what is run over a workload: one analyser alone, or the whole
+# CpuStatCollector pass with the python or numpy engine
+TARGETS = ('sched', 'syscall', 'irq', 'pipeline', 'pipeline-numpy')
+
+# The events of a workload, generated before the measurement starts.
+class EventListSource:
+    def __init__(self, source):
+        self.event_list = list(source.events())
+        self.names = source.event_names()
+
+        self.timestamp_begin = source.timestamp_begin
+        self.timestamp_end = source.timestamp_end
+
+    def events(self, begin_ts=None, end_ts=None):
+        return self.event_list
+
+    def event_names(self):
+        return self.names
+
+# a State as SchedAnalyser leaves it, a process running on every cpu, for the
+# analysers which ignore the cpus it didn't allocate
+def running_state(cpus, timestamp):
+    running = state.State()
+    for cpu_id in range(cpus):
+        cpu = state.Cpu(cpu_id)
+        proc = state.Process(-1 - cpu_id, 'bench%d' % cpu_id)
+        proc.switch_in(timestamp)
+        cpu.current_proc = proc
+
+        running.cpus[cpu_id] = cpu
+        running.tids[proc.tid] = proc
+
+    return running
+
+# the events the analyser handles and a function dispatching them to a new
+# instance of it
+def analyser_run(target, source, cpus):
+    def new_dispatcher():
+        analyser_state = state.State()
+        if target != 'sched':
+            analyser_state = running_state(cpus, source.timestamp_begin)
+
+        analyser = ANALYSERS[target](NotificationBus(), analyser_state)
+        analyser.on_begin_analyse(source.timestamp_begin)
+
+        return EventDispatcher([analyser])
+
+    subscribed = new_dispatcher().subscribed(source.event_names())
+    events = [event for event in source.events()
+              if event.name in subscribed]
+
+    def run():
+        dispatch = new_dispatcher().dispatch
+        for event in events:
+            dispatch(event)
+
+    return events, run
+
+def pipeline_run(target, source):
+    engine = 'numpy' if target == 'pipeline-numpy' else 'python'
+    options = RunOptions(engine=engine, source=source)
+
+    def run():
+        CpuStatCollector(None, options=options).run()
+
+    return source.event_list, run
+
+# the peak of the memory allocated by run(), on top of what was allocated
+# before, the fixture included. Python and numpy allocations are traced.
+def peak_allocated(run):
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+# runs one (workload, target, events, repeat) benchmark, in a process of its
+# own so that nothing left by another one is measured
+def run_benchmark(task):
+    workload, target, count, repeat = task
+
+    params = WORKLOADS[workload]
+    source = EventListSource(SyntheticSource(events=count, **params))
+
+    if target in ANALYSERS:
+        events, run = analyser_run(target, source, params['cpus'])
+    else:
+        events, run = pipeline_run(target, source)
+
+    best = None
+    blocks = None
+    collections = None
+
+    for index in range(repeat):
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        collections_before = sum(stats['collections']
+                                 for stats in gc.get_stats())
+
+        begin = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - begin
+
+        if best is None or seconds < best:
+            best = seconds
+            blocks = sys.getallocatedblocks() - blocks_before
+            collections = sum(stats['collections']
+                              for stats in gc.get_stats()) - \
+                          collections_before
+
+    # in a run of its own, tracing slowing it down
+    peak = peak_allocated(run)
+
+    return {
+        'workload' : workload,
+        'target' : target,
+        'events' : len(events),
+        'seconds' : best,
+        'events_per_sec' : len(events) / best if best else 0,
+        'peak_alloc_kb' : peak // 1024,
+        'retained_blocks_per_event' : blocks / len(events) if events else 0,
+        'gc_collections' : collections,
+    }
+
+def numpy_available():
+    try:
+        import numpy
+    except ImportError:
+        return False
+
+    return True
+
+# runs every target over every workload, each in a fresh process
+def run_benchmarks(workloads, targets, count, repeat=3):
+    if 'pipeline-numpy' in targets and not numpy_available():
+        targets = [target for target in targets
+                   if target != 'pipeline-numpy']
+
+    tasks = [(workload, target, count, repeat)
+             for workload in workloads for target in targets]
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        results = pool.map(run_benchmark, tasks, chunksize=1)
+
+    return {
+        'version' : BENCHMARK_VERSION,
+        'python' : platform.python_version(),
+        'machine' : platform.machine(),
+        'events' : count,
+        'results' : results,
+    }
+
+# the results of 'report' doing worse than 'baseline' by more than
+# 'threshold' (a fraction): fewer events/s or a higher allocation peak
+def find_regressions(report, baseline, threshold):
+    if baseline.get('version') != report['version']:
+        raise ValueError('baseline of benchmark version %r, not %r' %
+                         (baseline.get('version'), report['version']))
+    if baseline.get('events') != report['events']:
+        raise ValueError('baseline of %r events per workload, not %r' %
+                         (baseline.get('events'), report['events']))
+
+    baseline_results = {(result['workload'], result['target']) : result
+                        for result in baseline['results']}
+
+    regressions = []
+    for result in report['results']:
+        key = (result['workload'], result['target'])
+        if key not in baseline_results:
+            continue
+
+        previous = baseline_results[key]
+        for metric, worse in (('events_per_sec', -1),
+                              ('peak_alloc_kb', 1)):
+            if not previous[metric]:
+                continue
+
+            change = (result[metric] - previous[metric]) / previous[metric]
+            if change * worse > threshold:
+                regressions.append((key, metric, previous[metric],
+                                    result[metric], change))
+
+    return regressions
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+
+try:
+    import bt2
+except ImportError:
+    bt2 = None
+
+# event class names declared in CTF metadata text
+METADATA_EVENT_RE = re.compile(r'\bevent\s*\{[^}]*?\bname\s*=\s*"?([^";]+)"?\s*;')
+
+def check_bt2():
+    if bt2 is None:
+        raise ImportError('the bt2 backend requires the babeltrace 2 python '
+                          'bindings')
+
+def find_trace_dirs(path):
+    return sorted(root for root, dirs, files in os.walk(path)
+                  if 'metadata' in files)
+
+def timestamp_param(timestamp):
+    return '%d.%09d' % divmod(timestamp, 1000000000)
+
+# An event message seen the way analysers read babeltrace events: fields
+# are looked up in the payload, then the contexts, and converted to python
+# values only when read.
+class Bt2Event:
+    __slots__ = ('name', 'timestamp', 'event')
+
+    def __init__(self, name, timestamp, event):
+        self.name = name
+        self.timestamp = timestamp
+        self.event = event
+
+    def __getitem__(self, field_name):
+        field = self.event[field_name]
+
+        if isinstance(field, bt2._StringFieldConst):
+            return str(field)
+        if isinstance(field, bt2._IntegerFieldConst):
+            return int(field)
+
+        return field
+
+# A CTF trace directory read through a babeltrace 2 graph.
+#
+# The time range is trimmed by a utils.trimmer filter, so that the messages
+# out of it never reach python, and the messages are pulled through
+# TraceCollectionMessageIterator, which gets them in batches from the graph.
+# Only the event messages are handed out, their fields being decoded on
+# access.
+class Bt2Source:
+    def __init__(self, path):
+        check_bt2()
+
+        self.path = path
+        self.trace_dirs = find_trace_dirs(path)
+        self.fs = bt2.find_plugin('ctf').source_component_classes['fs']
+
+        self.timestamp_begin = None
+        self.timestamp_end = None
+
+        for trace_dir in self.trace_dirs:
+            query = bt2.QueryExecutor(self.fs, 'babeltrace.trace-infos',
+                                      {'inputs' : [trace_dir]})
+            for trace_info in query.query():
+                for stream_info in trace_info['stream-infos']:
+                    if 'range-ns' not in stream_info:
+                        continue
+
+                    begin = int(stream_info['range-ns']['begin'])
+                    end = int(stream_info['range-ns']['end'])
+                    if self.timestamp_begin is None or \
+                       begin < self.timestamp_begin:
+                        self.timestamp_begin = begin
+                    if self.timestamp_end is None or end > self.timestamp_end:
+                        self.timestamp_end = end
+
+    # the event classes declared by the metadata of the traces
+    def event_names(self):
+        if not self.trace_dirs:
+            return None
+
+        event_names = set()
+        for trace_dir in self.trace_dirs:
+            query = bt2.QueryExecutor(self.fs, 'metadata-info',
+                                      {'path' : trace_dir})
+            text = str(query.query()['text'])
+            event_names.update(name.strip()
+                               for name in METADATA_EVENT_RE.findall(text))
+
+        return event_names
+
+    def message_iterator(self, begin_ts, end_ts):
+        sources = [bt2.ComponentSpec(self.fs, {'inputs' : [trace_dir]})
+                   for trace_dir in self.trace_dirs]
+
+        filters = []
+        if begin_ts is not None or end_ts is not None:
+            params = {}
+            if begin_ts is not None:
+                params['begin'] = timestamp_param(begin_ts)
+            if end_ts is not None:
+                params['end'] = timestamp_param(end_ts)
+
+            filters.append(bt2.ComponentSpec.from_named_plugin(
+                                                'utils', 'trimmer', params))
+
+        return bt2.TraceCollectionMessageIterator(
+                                        sources, filter_component_specs=filters)
+
+    def events(self, begin_ts=None, end_ts=None):
+        event_message = bt2._EventMessageConst
+
+        for message in self.message_iterator(begin_ts, end_ts):
+            if type(message) is not event_message:
+                continue
+
+            timestamp = message.default_clock_snapshot.ns_from_origin
+
+            # the trimmer works at the message level, be exact anyway
+            if begin_ts is not None and timestamp < begin_ts:
+                continue
+            if end_ts is not None and timestamp > end_ts:
+                break
+
+            event = message.event
+            yield Bt2Event(event.name, timestamp, event)
+
+# URLs of LTTng live sessions, e.g. net://localhost/host/HOSTNAME/SESSION
+LIVE_URL_PREFIXES = ('net://', 'net4://', 'net6://')
+
+def is_live_url(path):
+    return path.startswith(LIVE_URL_PREFIXES)
+
+# An LTTng live session read through the ctf.lttng-live component of
+# babeltrace 2, for IteratorSource. The relay daemon only sends the packets
+# written since the previous ones, so that following a session costs the same
+# however long it has been traced. events() blocks until there are new ones,
+# and ends with the session.
+class Bt2LiveSource:
+    # seconds between two attempts when the session has nothing new
+    retry_interval = 0.1
+
+    def __init__(self, url):
+        check_bt2()
+
+        self.url = url
+        self.live = bt2.find_plugin('ctf').source_component_classes[
+                                                                'lttng-live']
+
+    def events(self):
+        source = bt2.ComponentSpec(self.live,
+                                   {'inputs' : [self.url],
+                                    'session-not-found-action' : 'continue'})
+        message_iterator = bt2.TraceCollectionMessageIterator(source)
+        event_message = bt2._EventMessageConst
+
+        while True:
+            try:
+                message = next(message_iterator)
+            except bt2.TryAgain:
+                time.sleep(self.retry_interval)
+                continue
+            except StopIteration:
+                return
+
+            if type(message) is not event_message:
+                continue
+
+            event = message.event
+            yield Bt2Event(event.name,
+                           message.default_clock_snapshot.ns_from_origin, event)
@@ -0,0 +1,90 @@
+import os
+import pickle
+import tempfile
+
+from .result_cache import ANALYSER_VERSION
+
+class CheckpointError(ValueError):
+    pass
+
+# The state of an analysis at the end of a trace chunk, to go on with the
+# next chunk of a rotated or appended trace without reading the previous
+# ones again: the analyser State, with the timeslices, syscalls and
+# interrupts still running, and the results of every collector.
+#
+# 'begin_ts' is where the first chunk began, which the totals are relative
+# to, and 'end_ts' where the last one analysed ended. 'collectors' names the
+# class of each collector, for 'results' to go back to the same ones.
+class Checkpoint:
+    def __init__(self, begin_ts, end_ts, state, collectors, results):
+        self.begin_ts = begin_ts
+        self.end_ts = end_ts
+        self.state = state
+        self.collectors = collectors
+        self.results = results
+
+    # the checkpoint of a run, once it's over
+    @classmethod
+    def from_runner(cls, runner):
+        collectors = []
+        results = []
+        for stat_collector in runner.stat_collectors:
+            sc = stat_collector()
+            collectors.append(type(sc).__name__)
+            results.append(None if sc is None else sc.cached_result())
+
+        return cls(runner.analyse_begin_ts, runner.end_ts, runner.state,
+                   collectors, results)
+
+    # has 'runner', which begin_analyse() was called on, go on from here
+    def restore(self, runner):
+        collectors = [type(stat_collector()).__name__
+                      for stat_collector in runner.stat_collectors]
+        if collectors != self.collectors:
+            raise CheckpointError('checkpoint of other collectors: %s' %
+                                  ', '.join(self.collectors))
+
+        runner.state = self.state
+        for analyser in runner.analysers:
+            analyser.state = self.state
+
+        for stat_collector, result in zip(runner.stat_collectors,
+                                          self.results):
+            sc = stat_collector()
+            if sc is not None and result is not None:
+                sc.restore_result(result)
+
+    def save(self, file_path):
+        entry = {
+            'version' : ANALYSER_VERSION,
+            'checkpoint' : self,
+        }
+
+        # never leaves a truncated checkpoint behind, the previous one being
+        # kept when interrupted
+        directory = os.path.dirname(os.path.abspath(file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+# the Checkpoint saved at 'file_path', None when there is none yet
+def load_checkpoint(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        raise CheckpointError('%s: not a checkpoint: %s' % (file_path, e))
+
+    if not isinstance(entry, dict) or \
+       entry.get('version') != ANALYSER_VERSION:
+        raise CheckpointError('%s: checkpoint of another analyser version' %
+                              file_path)
+
+    return entry['checkpoint']
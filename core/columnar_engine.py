@@ -0,0 +1,439 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .analyser_runner import AnalyserRunner
+from .event_columns import EVENT_SCHED_SWITCH
+from .event_columns import EVENT_IRQ_ENTRY, EVENT_IRQ_EXIT
+from .event_columns import EVENT_SOFTIRQ_ENTRY, EVENT_SOFTIRQ_EXIT
+from .event_columns import EVENT_SYSCALL_ENTRY, EVENT_SYSCALL_EXIT
+from .state import softirq_to_name
+from .stats import HISTOGRAM_SUB_BUCKETS
+from .stats import DurationStats
+from .stats import ProcessStats
+from .stats import SyscallStats
+from .stats import IrqStats, SoftIrqStats
+
+def check_numpy():
+    if numpy is None:
+        raise ImportError('the numpy engine requires numpy')
+
+def histogram_buckets(durations):
+    buckets = numpy.full(len(durations), -1, dtype=numpy.int64)
+    positive = durations >= 1
+    buckets[positive] = numpy.floor(
+                            numpy.log2(durations[positive].astype(numpy.float64))
+                            * HISTOGRAM_SUB_BUCKETS)
+
+    return buckets
+
+# positions of each key, in the order of 'keys'
+def group_by(keys):
+    if len(keys) == 0:
+        return []
+
+    order = numpy.argsort(keys, kind='stable')
+    keys, starts = numpy.unique(keys[order], return_index=True)
+
+    return zip(keys.tolist(), numpy.split(order, starts[1:]))
+
+# (key, position of its first element, stats) for each key, stats being
+# new_stats(position) updated with the durations of the key in one go.
+def grouped_stats(keys, begin_ts, durations, new_stats):
+    if len(keys) == 0:
+        return []
+
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    begin_ts = begin_ts[order]
+    durations = durations[order]
+
+    starts = numpy.flatnonzero(~same_group_as_previous(keys))
+    counts = numpy.diff(numpy.append(starts, len(keys)))
+    groups = numpy.repeat(numpy.arange(len(starts)), counts)
+
+    sums = numpy.add.reduceat(durations, starts)
+    mins = numpy.minimum.reduceat(durations, starts)
+    # DurationStats.max_duration starts at 0, which syscalls made negative by
+    # interrupts stealing their time twice (an irq within a softirq) don't
+    # go below
+    maxs = numpy.maximum(numpy.maximum.reduceat(durations, starts), 0)
+
+    durations_f = durations.astype(numpy.float64)
+    means = numpy.add.reduceat(durations_f, starts) / counts
+    m2s = numpy.add.reduceat((durations_f - means[groups]) ** 2, starts)
+
+    # (group, bucket) counts, buckets being within [-1, 64 sub buckets)
+    span = 64 * HISTOGRAM_SUB_BUCKETS + 1
+    cells, cell_counts = numpy.unique(
+                groups * span + histogram_buckets(durations) + 1,
+                return_counts=True)
+    cell_groups = cells // span
+    histograms = [{} for start in starts]
+    for group, bucket, count in zip(cell_groups.tolist(),
+                                    (cells % span - 1).tolist(),
+                                    cell_counts.tolist()):
+        histograms[group][bucket] = count
+
+    result = []
+    for group, start in enumerate(starts.tolist()):
+        first = int(order[start])
+
+        stats = new_stats(first)
+        stats.count = int(counts[group])
+        stats.sum = int(sums[group])
+        stats.min_duration = int(mins[group])
+        stats.max_duration = int(maxs[group])
+        stats.mean = float(means[group])
+        stats.m2 = float(m2s[group])
+        stats.histogram = histograms[group]
+
+        if stats.duration_list is not None:
+            end = start + stats.count
+            stats.duration_list = list(zip(begin_ts[start:end].tolist(),
+                                           durations[start:end].tolist()))
+
+        result.append((int(keys[start]), first, stats))
+
+    return result
+
+# for every element, whether the previous one belongs to the same group
+def same_group_as_previous(groups):
+    same = numpy.zeros(len(groups), dtype=bool)
+    same[1:] = groups[1:] == groups[:-1]
+
+    return same
+
+# sum of 'values' over the previous elements of the same group, 'order'
+# being the stable argsort of 'groups' when already known
+def cumsum_by_group(groups, values, order=None):
+    if order is None:
+        order = numpy.argsort(groups, kind='stable')
+    sorted_values = values[order]
+
+    sums = numpy.cumsum(sorted_values) - sorted_values
+    starts = ~same_group_as_previous(groups[order])
+    sums -= sums[starts][numpy.cumsum(starts) - 1]
+
+    result = numpy.empty_like(sums)
+    result[order] = sums
+
+    return result
+
+# (entry, exit) positions, pairing an exit with the entry right before it
+# within its group, the way the analysers pair them with current_irq,
+# current_softirq or current_syscall.
+def match_pairs(is_entry, is_exit, groups):
+    selected = numpy.flatnonzero(is_entry | is_exit)
+    selected = selected[numpy.argsort(groups[selected], kind='stable')]
+
+    exits = is_exit[selected]
+    paired = numpy.zeros(len(selected), dtype=bool)
+    paired[1:] = same_group_as_previous(groups[selected])[1:] & \
+                 ~exits[:-1] & exits[1:]
+
+    pair_exits = selected[paired]
+    pair_entries = selected[numpy.flatnonzero(paired) - 1]
+    order = numpy.argsort(pair_exits, kind='stable')
+
+    return pair_entries[order], pair_exits[order]
+
+# Computes the CpuStatCollector tables from EventColumns with whole-array
+# operations, giving the same result as SchedAnalyser, SyscallAnalyser and
+# IrqAnalyser over the same events.
+#
+# Events are referred to by their position in the columns, which orders
+# them the same way a serial run does. The result has the CpuStatShard
+# layout, first update timestamps being positions, so that merge_shards()
+# can fill the collector.
+class ColumnarEngine:
+    def __init__(self, columns, begin_ts, keep_intervals=False):
+        check_numpy()
+
+        self.keep_intervals = keep_intervals
+        self.begin_ts = begin_ts
+        self.strings = columns.strings
+
+        self.timestamp = numpy.frombuffer(columns.timestamp, dtype=numpy.int64)
+        self.cpu_id = numpy.frombuffer(columns.cpu_id, dtype=numpy.int64)
+        self.event_type = numpy.frombuffer(columns.event_type, dtype=numpy.int8)
+        self.arg0 = numpy.frombuffer(columns.arg0, dtype=numpy.int64)
+        self.arg1 = numpy.frombuffer(columns.arg1, dtype=numpy.int64)
+        self.str0 = numpy.frombuffer(columns.str0, dtype=numpy.int64)
+        self.str1 = numpy.frombuffer(columns.str1, dtype=numpy.int64)
+
+        self.index = numpy.arange(len(self.timestamp))
+        self.cpu_order = numpy.argsort(self.cpu_id, kind='stable')
+
+        self.tables = {}
+        self.first_ts = {}
+        self.first_seen = {}
+
+    def is_event(self, event_type):
+        return self.event_type == event_type
+
+    def add_table(self, table, keys, positions, begin_ts, durations,
+                  new_stats):
+        tables = self.tables.setdefault(table, {})
+        first_ts = self.first_ts.setdefault(table, {})
+
+        for key, first, stats in grouped_stats(keys, begin_ts, durations,
+                                               new_stats):
+            tables[key] = stats
+            first_ts[key] = int(positions[first])
+
+    def new_duration_stats(self, position):
+        return DurationStats(self.keep_intervals)
+
+    # the analysers ignore irqs and syscalls on a cpu until its first
+    # sched_switch
+    def known_cpus(self):
+        if len(self.cpu_id) == 0:
+            return numpy.zeros(0, dtype=bool)
+
+        switches = numpy.flatnonzero(self.is_event(EVENT_SCHED_SWITCH))
+        first_switch = numpy.full(self.cpu_id.max() + 1, len(self.cpu_id))
+        numpy.minimum.at(first_switch, self.cpu_id[switches], switches)
+
+        return self.index >= first_switch[self.cpu_id]
+
+    def analyse_irqs(self, known):
+        entries, exits = match_pairs(self.is_event(EVENT_IRQ_ENTRY) & known,
+                                     self.is_event(EVENT_IRQ_EXIT) & known,
+                                     self.cpu_id)
+        durations = self.timestamp[exits] - self.timestamp[entries]
+
+        # irq time each event is preceded by on its cpu
+        stolen = numpy.zeros(len(self.timestamp), dtype=numpy.int64)
+        stolen[exits] = durations
+        self.irq_stolen = cumsum_by_group(self.cpu_id, stolen, self.cpu_order)
+
+        begin_ts = self.timestamp[entries]
+        irqs = self.arg0[entries]
+        names = self.str0[entries]
+
+        self.add_table('cpu_irq', self.cpu_id[exits], exits, begin_ts,
+                       durations, self.new_duration_stats)
+        self.add_table('irq', irqs, exits, begin_ts, durations,
+                       lambda position: IrqStats(self.strings[names[position]],
+                                                 self.keep_intervals))
+
+    def analyse_softirqs(self, known):
+        entries, exits = match_pairs(
+                        self.is_event(EVENT_SOFTIRQ_ENTRY) & known,
+                        self.is_event(EVENT_SOFTIRQ_EXIT) & known,
+                        self.cpu_id)
+        durations = self.timestamp[exits] - self.timestamp[entries]
+
+        stolen = numpy.zeros(len(self.timestamp), dtype=numpy.int64)
+        stolen[exits] = durations
+        self.softirq_stolen = cumsum_by_group(self.cpu_id, stolen,
+                                              self.cpu_order)
+
+        begin_ts = self.timestamp[entries]
+        vecs = self.arg0[entries]
+        durations = durations - \
+                    (self.irq_stolen[exits] - self.irq_stolen[entries])
+        new_stats = lambda position: SoftIrqStats(
+                                    softirq_to_name.get(int(vecs[position])),
+                                        self.keep_intervals)
+
+        self.add_table('cpu_softirq', self.cpu_id[exits], exits, begin_ts,
+                       durations, new_stats)
+        self.add_table('softirq', vecs, exits, begin_ts, durations, new_stats)
+
+    # stolen time on the cpu of 'ends' since 'begins'
+    def stolen_between(self, begins, ends):
+        return self.irq_stolen[ends] - self.irq_stolen[begins] + \
+               self.softirq_stolen[ends] - self.softirq_stolen[begins]
+
+    def analyse_sched(self):
+        switches = numpy.flatnonzero(self.is_event(EVENT_SCHED_SWITCH))
+        prev_tids = self.arg0[switches]
+        next_tids = self.arg1[switches]
+
+        sched_outs = switches[prev_tids != 0]
+        sched_ins = switches[next_tids != 0]
+
+        # every sched_out and sched_in of each tid in order, the sched_out
+        # first within a sched_switch
+        positions = numpy.concatenate((sched_outs, sched_ins))
+        is_in = numpy.concatenate((numpy.zeros(len(sched_outs), dtype=bool),
+                                   numpy.ones(len(sched_ins), dtype=bool)))
+        tids = numpy.concatenate((self.arg0[sched_outs], self.arg1[sched_ins]))
+        comms = numpy.concatenate((self.str0[sched_outs],
+                                   self.str1[sched_ins]))
+
+        order = numpy.lexsort((is_in, positions, tids))
+        positions = positions[order]
+        is_in = is_in[order]
+        tids = tids[order]
+        comms = comms[order]
+
+        seen = same_group_as_previous(tids)
+        for tid, position, comm in zip(tids[~seen].tolist(),
+                                       positions[~seen].tolist(),
+                                       comms[~seen].tolist()):
+            self.first_seen[tid] = (position, self.strings[comm])
+
+        outs = numpy.flatnonzero(~is_in)
+        after_in = seen[outs] & is_in[outs - 1]
+        # the first meeting of a tid is a sched_out: running since the
+        # beginning. a sched_out after a sched_out: missing sched_in.
+        orphan = ~seen[outs]
+
+        out_positions = positions[outs]
+        in_positions = numpy.where(after_in, positions[outs - 1],
+                                   out_positions)
+        out_ts = self.timestamp[out_positions]
+        begin_ts = numpy.where(after_in, self.timestamp[in_positions], out_ts)
+        begin_ts = numpy.where(orphan, self.begin_ts, begin_ts)
+        durations = out_ts - begin_ts
+
+        same_cpu = self.cpu_id[in_positions] == self.cpu_id[out_positions]
+        stolen = numpy.where(after_in & same_cpu,
+                             self.stolen_between(in_positions, out_positions),
+                             0)
+        app_durations = durations - stolen
+
+        cpus = self.cpu_id[out_positions]
+        out_tids = tids[outs]
+
+        # ordered by sched_out
+        order = numpy.argsort(out_positions, kind='stable')
+        self.add_table('cpu', cpus[order], out_positions[order],
+                       begin_ts[order], durations[order],
+                       self.new_duration_stats)
+        self.add_table('cpu_app', cpus[order], out_positions[order],
+                       begin_ts[order], app_durations[order],
+                       self.new_duration_stats)
+        self.add_table('tid', out_tids[order], out_positions[order],
+                       begin_ts[order], app_durations[order],
+                       lambda position: ProcessStats(None,
+                                                     self.keep_intervals))
+
+        # app time of each tid before each of its sched_in
+        app_time = numpy.zeros(len(positions), dtype=numpy.int64)
+        app_time[outs[after_in]] = app_durations[after_in]
+        app_time = cumsum_by_group(tids, app_time)
+
+        self.app_time_at_in = numpy.zeros(len(self.timestamp),
+                                          dtype=numpy.int64)
+        self.app_time_at_in[positions[is_in]] = app_time[is_in]
+
+    # the sched_switch which made the running process current, for every
+    # event, -1 when the cpu hasn't switched yet
+    def current_switches(self):
+        order = self.cpu_order
+        is_switch = self.event_type[order] == EVENT_SCHED_SWITCH
+
+        last = numpy.where(is_switch, numpy.arange(len(order)), -1)
+        last = numpy.maximum.accumulate(last)
+        valid = last >= 0
+        valid[valid] = self.cpu_id[order][last[valid]] == \
+                       self.cpu_id[order][valid]
+
+        current = numpy.full(len(order), -1)
+        current[order[valid]] = order[last[valid]]
+
+        return current
+
+    def analyse_syscalls(self):
+        current = self.current_switches()
+
+        tids = numpy.where(current >= 0, self.arg1[current], 0)
+        running = tids != 0
+
+        entries, exits = match_pairs(
+                        self.is_event(EVENT_SYSCALL_ENTRY) & running,
+                        self.is_event(EVENT_SYSCALL_EXIT) & running,
+                        tids)
+
+        # app time of the tid up to every entry and exit, the syscall duration
+        # minus its waiting and stolen time being the difference.
+        def app_time(positions):
+            switches = current[positions]
+            return self.app_time_at_in[switches] + \
+                   self.timestamp[positions] - self.timestamp[switches] - \
+                   self.stolen_between(switches, positions)
+
+        durations = app_time(exits) - app_time(entries)
+        begin_ts = self.timestamp[entries]
+        syscall_tids = tids[exits]
+        names = self.str0[entries]
+
+        self.add_table('cpu_syscall', self.cpu_id[exits], exits, begin_ts,
+                       durations, self.new_duration_stats)
+
+        first_ts = self.first_ts.setdefault('tid_syscall_tid', {})
+        for tid, group in group_by(syscall_tids):
+            first_ts[tid] = int(exits[group[0]])
+
+        # (tid, name) keys flattened for group_by(), then restored
+        keys = syscall_tids * len(self.strings) + names
+        self.add_table('tid_syscall', keys, exits, begin_ts, durations,
+                       lambda position: SyscallStats(
+                                            self.strings[names[position]],
+                                            self.keep_intervals))
+
+        for table in (self.tables, self.first_ts):
+            table['tid_syscall'] = {
+                (key // len(self.strings), self.strings[key % len(self.strings)])
+                : value for key, value in table['tid_syscall'].items()}
+
+    def result(self):
+        known = self.known_cpus()
+
+        self.analyse_irqs(known)
+        self.analyse_softirqs(known)
+        self.analyse_sched()
+        self.analyse_syscalls()
+
+        return {
+            'window' : 0,
+            'tables' : self.tables,
+            'first_ts' : self.first_ts,
+            'first_seen' : self.first_seen,
+            'orphans' : [],
+            'pieces' : [],
+            'boundary_in' : {},
+            'boundary_out' : {},
+            'irq_closes' : {},
+            'softirq_closes' : {},
+            'unresolved_syscalls' : [],
+        }
+
+# Loads the events into columns and has the stat collector merge what
+# ColumnarEngine computes from them, instead of dispatching every event.
+class ColumnarAnalyserRunner(AnalyserRunner):
+    def __init__(self, path, notifiers, stat_collector,
+                 begin_ts=None, end_ts=None, event_cache=False, source=None,
+                 backend='babeltrace'):
+        check_numpy()
+
+        super().__init__(path, notifiers, stat_collector, begin_ts, end_ts,
+                         event_cache, source, backend)
+
+    def run(self):
+        columns = self.event_columns()
+
+        # the engine merges the threads of a reused tid, which only
+        # SchedAnalyser tells apart: the serial analysis runs over the same
+        # columns instead
+        if columns.follows_lifecycle():
+            self.fallback = 'the trace has thread lifecycle events, which ' \
+                            'the numpy engine does not follow: ran the ' \
+                            'serial analysis'
+            self.columns = columns
+            self.time_range = False
+            super().run()
+            return
+
+        self.begin_analyse(self.begin_ts)
+
+        sc = self.stat_collector()
+        engine = ColumnarEngine(columns, self.begin_ts, sc.keep_intervals)
+        sc.merge_shards([engine.result()])
+
+        self.end_analyse(self.end_ts)
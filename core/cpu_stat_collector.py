@@ -2,22 +2,52 @@ from .stats import DurationStats
 from .stats import ProcessStats
 from .stats import SyscallStats
 from .stats import IrqStats, SoftIrqStats
+from .stats import Total
 from .stat_collector import StatCollector
+from .rollup import ROLLUP_TITLES, ROLLUP_LABELS, rollup_rows, top_items
+from .rollup import Rollup
+
+# the attributes print_result() reads
+RESULT_ATTRS = (
+    'begin_ts',
+    'end_ts',
+    'per_cpu_usage_stats',
+    'per_cpu_app_usage_stats',
+    'per_tid_usage_stats',
+    'per_cpu_irq_usage_stats',
+    'per_irq_usage_stats',
+    'per_cpu_softirq_usage_stats',
+    'per_softirq_usage_stats',
+    'per_cpu_syscall_usage_stats',
+    'per_tid_syscall_usage_stats',
+    'per_tid_syscall_totals',
+    'ended_threads',
+    'process_generations',
+    'folded_threads',
+)
 
 class CpuStatCollector(StatCollector):
-    def __init__(self, path):
-        notifiers = {
-            'sched_out' : self.process_sched_out,
-            'syscall_exit' : self.process_syscall_exit,
-            'irq_exit' : self.process_irq_exit,
-            'softirq_exit' : self.process_softirq_exit,
-        }
+    def __init__(self, path, keep_intervals=False, options=None, top=None,
+                 rollups=('tid',)):
+        super().__init__(path, self.get_notifiers(), options)
+
+        self.keep_intervals = keep_intervals
 
-        super().__init__(path, notifiers)
+        # the per-thread tables are printed at each of 'rollups' (see
+        # ROLLUP_LEVELS), with their 'top' rows only when given
+        self.top = top
+        self.rollups = rollups
+
+        # when no per-tid table is printed, ended threads are only kept added
+        # up in the rows of the levels which are, see process_thread_end()
+        self.fold_levels = () if 'tid' in rollups else tuple(rollups)
 
         self.begin_ts = None
         self.end_ts = None
 
+        self.reset_stats()
+
+    def reset_stats(self):
         self.per_cpu_usage_stats = {}
 
         self.per_cpu_app_usage_stats = {}
@@ -31,42 +61,67 @@ class CpuStatCollector(StatCollector):
         self.per_cpu_syscall_usage_stats = {}
         self.per_tid_syscall_usage_stats = {}
 
-    def on_begin_analyse(self, timestamp):
-        self.begin_ts = timestamp
+        # tid -> Total of its syscalls, kept up to date by each syscall exit
+        self.per_tid_syscall_totals = {}
 
-    def on_end_analyse(self, timestamp):
-        self.end_ts = timestamp
+        # (tid, ProcessStats, syscall Total, name -> SyscallStats) of the
+        # threads which ended, see process_thread_end(), the per-tid tables
+        # above only holding the threads still running
+        self.ended_threads = []
+
+        # tgid -> generation of the process having it, bumped each time a
+        # process ends, see ProcessStats
+        self.process_generations = {}
+
+        # level -> Rollup of the ended threads, instead of ended_threads, see
+        # fold_levels
+        self.folded_threads = {}
+
+    def get_notifiers(self):
+        return {
+            'sched_out' : self.process_sched_out,
+            'syscall_exit' : self.process_syscall_exit,
+            'irq_exit' : self.process_irq_exit,
+            'softirq_exit' : self.process_softirq_exit,
+            'thread_end' : self.process_thread_end,
+        }
+
+    def shard_options(self):
+        from .cpu_stat_shard import CpuStatShard
+
+        return CpuStatShard, {'keep_intervals' : self.keep_intervals,
+                              'backend' : self.options.backend}
 
-        for tid in self.per_tid_usage_stats:
-            if tid not in self.per_tid_syscall_usage_stats:
-                self.per_tid_syscall_usage_stats[tid] = {}
-            self.per_tid_syscall_usage_stats[tid]['__total_sum__'] = 0
-            self.per_tid_syscall_usage_stats[tid]['__total_count__'] = 0
+    def merge_shards(self, results):
+        from .cpu_stat_shard import merge_shards
 
-        for tid in self.per_tid_syscall_usage_stats:
-            self.per_tid_syscall_usage_stats[tid]['__total_sum__'] = 0
-            self.per_tid_syscall_usage_stats[tid]['__total_count__'] = 0
+        merge_shards(self, results)
 
-            for syscall_name in self.per_tid_syscall_usage_stats[tid]:
-                if syscall_name == '__total_sum__' or \
-                   syscall_name == '__total_count__':
-                    continue
+    # every runner gives the same results, the numpy and parallel ones
+    # running the serial analysis on traces with lifecycle events
+    def cache_options(self):
+        return (type(self).__name__, self.options.time_range,
+                self.keep_intervals, self.fold_levels)
 
-                syscall_stats = \
-                            self.per_tid_syscall_usage_stats[tid][syscall_name]
+    def cached_result(self):
+        return {attr : getattr(self, attr) for attr in RESULT_ATTRS}
 
-                self.per_tid_syscall_usage_stats[tid]['__total_sum__'] += \
-                                                            syscall_stats.sum
-                self.per_tid_syscall_usage_stats[tid]['__total_count__'] += \
-                                                            syscall_stats.count
+    def restore_result(self, result):
+        for attr in RESULT_ATTRS:
+            setattr(self, attr, result[attr])
 
-    def process_sched_out(self, **kwargs):
-        cpu = kwargs['cpu']
-        proc = kwargs['proc']
+    def on_begin_analyse(self, timestamp):
+        self.begin_ts = timestamp
+
+    def on_end_analyse(self, timestamp):
+        self.end_ts = timestamp
 
+    def process_sched_out(self, cpu, proc):
         if cpu.cpu_id not in self.per_cpu_usage_stats:
-            self.per_cpu_usage_stats[cpu.cpu_id] = DurationStats()
-            self.per_cpu_app_usage_stats[cpu.cpu_id] = DurationStats()
+            self.per_cpu_usage_stats[cpu.cpu_id] = \
+                                        DurationStats(self.keep_intervals)
+            self.per_cpu_app_usage_stats[cpu.cpu_id] = \
+                                        DurationStats(self.keep_intervals)
 
         self.per_cpu_usage_stats[cpu.cpu_id].update(proc.duration.begin_ts,
                                                     proc.duration.duration)
@@ -77,52 +132,101 @@ class CpuStatCollector(StatCollector):
                                         proc.softirq_stolen_duration.duration)
 
         if proc.tid not in self.per_tid_usage_stats:
-            self.per_tid_usage_stats[proc.tid] = ProcessStats(proc.name)
-
-        self.per_tid_usage_stats[proc.tid].update(proc.duration.begin_ts,
-                                        proc.duration.duration -
-                                        proc.irq_stolen_duration.duration -
-                                        proc.softirq_stolen_duration.duration)
-
-    def process_syscall_exit(self, **kwargs):
-        cpu = kwargs['cpu']
-        syscall = kwargs['syscall']
-
+            stats = ProcessStats(proc.name, self.keep_intervals)
+            stats.generation = self.process_generations.get(
+                        proc.tid if proc.tgid is None else proc.tgid, 0)
+            self.per_tid_usage_stats[proc.tid] = stats
+
+        stats = self.per_tid_usage_stats[proc.tid]
+        stats.update(proc.duration.begin_ts,
+                     proc.duration.duration -
+                     proc.irq_stolen_duration.duration -
+                     proc.softirq_stolen_duration.duration)
+        stats.tgid = proc.tgid
+
+    def process_syscall_exit(self, cpu, syscall):
         proc = cpu.current_proc
 
         if cpu.cpu_id not in self.per_cpu_syscall_usage_stats:
-            self.per_cpu_syscall_usage_stats[cpu.cpu_id] = DurationStats()
+            self.per_cpu_syscall_usage_stats[cpu.cpu_id] = \
+                                        DurationStats(self.keep_intervals)
+
+        duration = syscall.duration.duration - \
+                   syscall.waiting_duration.duration - \
+                   syscall.irq_stolen_duration.duration - \
+                   syscall.softirq_stolen_duration.duration
 
         stats = self.per_cpu_syscall_usage_stats[cpu.cpu_id]
-        stats.update(syscall.duration.begin_ts,
-                     syscall.duration.duration -
-                     syscall.waiting_duration.duration -
-                     syscall.irq_stolen_duration.duration -
-                     syscall.softirq_stolen_duration.duration)
+        stats.update(syscall.duration.begin_ts, duration)
 
         if proc.tid not in self.per_tid_syscall_usage_stats:
             self.per_tid_syscall_usage_stats[proc.tid] = {}
+            self.per_tid_syscall_totals[proc.tid] = Total()
 
         if syscall.name not in self.per_tid_syscall_usage_stats[proc.tid]:
             self.per_tid_syscall_usage_stats[proc.tid][syscall.name] = \
-                        SyscallStats(syscall.name)
+                        SyscallStats(syscall.name, self.keep_intervals)
 
         stats = self.per_tid_syscall_usage_stats[proc.tid][syscall.name]
-        stats.update(syscall.duration.begin_ts,
-                     syscall.duration.duration -
-                     syscall.waiting_duration.duration -
-                     syscall.irq_stolen_duration.duration -
-                     syscall.softirq_stolen_duration.duration)
+        stats.update(syscall.duration.begin_ts, duration)
 
-    def process_irq_exit(self, **kwargs):
-        cpu = kwargs['cpu']
-        irq = kwargs['irq']
+        self.per_tid_syscall_totals[proc.tid].add(duration)
 
+    # The stats of the thread are final, its tid may be reused by another.
+    # A process ends with its main thread, the threads seen from then on
+    # with its tgid belonging to the next process having it.
+    def process_thread_end(self, proc):
+        if proc.tid not in self.per_tid_usage_stats:
+            return
+
+        stats = self.per_tid_usage_stats.pop(proc.tid)
+
+        tgid = proc.tid if stats.tgid is None else stats.tgid
+        if proc.tid == tgid:
+            self.process_generations[tgid] = \
+                                self.process_generations.get(tgid, 0) + 1
+
+        thread = (proc.tid,
+                  stats,
+                  self.per_tid_syscall_totals.pop(proc.tid, Total()),
+                  self.per_tid_syscall_usage_stats.pop(proc.tid, {}))
+
+        # the memory then grows with the comms or processes seen, not with
+        # the threads
+        if self.fold_levels:
+            for level in self.fold_levels:
+                if level not in self.folded_threads:
+                    self.folded_threads[level] = Rollup(level)
+                self.folded_threads[level].add(*thread)
+        else:
+            self.ended_threads.append(thread)
+
+    # (tid, ProcessStats, syscall Total, name -> SyscallStats) of every
+    # thread, those which ended first, but for the folded ones
+    def threads(self):
+        yield from self.ended_threads
+
+        empty_total = Total()
+        for tid, stats in self.per_tid_usage_stats.items():
+            yield (tid, stats,
+                   self.per_tid_syscall_totals.get(tid, empty_total),
+                   self.per_tid_syscall_usage_stats.get(tid, {}))
+
+    # name -> SyscallStats of every thread which made syscalls
+    def thread_syscall_stats(self):
+        for tid, stats, syscall_total, syscall_stats in self.ended_threads:
+            yield syscall_stats
+
+        yield from self.per_tid_syscall_usage_stats.values()
+
+    def process_irq_exit(self, cpu, irq):
         if cpu.cpu_id not in self.per_cpu_irq_usage_stats:
-            self.per_cpu_irq_usage_stats[cpu.cpu_id] = DurationStats()
+            self.per_cpu_irq_usage_stats[cpu.cpu_id] = \
+                                        DurationStats(self.keep_intervals)
 
         if irq.irq not in self.per_irq_usage_stats:
-            self.per_irq_usage_stats[irq.irq] = IrqStats(irq.name)
+            self.per_irq_usage_stats[irq.irq] = \
+                                        IrqStats(irq.name, self.keep_intervals)
 
         stats = self.per_cpu_irq_usage_stats[cpu.cpu_id]
         stats.update(irq.duration.begin_ts, irq.duration.duration)
@@ -130,17 +234,14 @@ class CpuStatCollector(StatCollector):
         stats = self.per_irq_usage_stats[irq.irq]
         stats.update(irq.duration.begin_ts, irq.duration.duration)
 
-    def process_softirq_exit(self, **kwargs):
-        cpu = kwargs['cpu']
-        softirq = kwargs['softirq']
-
+    def process_softirq_exit(self, cpu, softirq):
         if cpu.cpu_id not in self.per_cpu_softirq_usage_stats:
             self.per_cpu_softirq_usage_stats[cpu.cpu_id] = \
-                                                    SoftIrqStats(softirq.name)
+                            SoftIrqStats(softirq.name, self.keep_intervals)
 
         if softirq.vec not in self.per_softirq_usage_stats:
             self.per_softirq_usage_stats[softirq.vec] = \
-                                                    SoftIrqStats(softirq.name)
+                            SoftIrqStats(softirq.name, self.keep_intervals)
 
         stats = self.per_cpu_softirq_usage_stats[cpu.cpu_id]
         stats.update(softirq.duration.begin_ts,
@@ -165,11 +266,14 @@ class CpuStatCollector(StatCollector):
         sorted_stats = sorted(self.per_cpu_usage_stats.items(),
                               key=lambda key_value: key_value[1], reverse=True)
 
+        # e.g. no syscall on a cpu during a short live interval
+        no_stats = DurationStats()
+
         for cpu, stats in sorted_stats:
             app_stats = self.per_cpu_app_usage_stats[cpu]
-            syscall_stats = self.per_cpu_syscall_usage_stats[cpu]
-            irq_stats = self.per_cpu_irq_usage_stats[cpu]
-            softirq_stats = self.per_cpu_softirq_usage_stats[cpu]
+            syscall_stats = self.per_cpu_syscall_usage_stats.get(cpu, no_stats)
+            irq_stats = self.per_cpu_irq_usage_stats.get(cpu, no_stats)
+            softirq_stats = self.per_cpu_softirq_usage_stats.get(cpu, no_stats)
 
             table_content = table_row_format.format(
                 '%2d' % cpu,
@@ -255,27 +359,31 @@ class CpuStatCollector(StatCollector):
             print(table_content)
         print('')
 
-    def print_per_tid_stats(self):
-        table_title = '''=== Per-Tid CPU Usage ==='''
+    def print_per_thread_stats(self, level):
+        table_title = '''=== Per-%s CPU Usage ===''' % ROLLUP_TITLES[level]
 
         table_row_format = '{:>25} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'
-        table_label = table_row_format.format('name (tid)', 'usage', 'syscall %',
-                                              'min', 'avg', 'max', 'total',
-                                              'count')
+        table_label = table_row_format.format(ROLLUP_LABELS[level], 'usage',
+                                              'syscall %', 'min', 'avg',
+                                              'max', 'total', 'count')
         print(table_title)
         print(table_label)
 
-        sorted_stats = sorted(self.per_tid_usage_stats.items(),
-                              key=lambda key_value: key_value[1], reverse=True)
+        sorted_rows = top_items(rollup_rows(self, level),
+                                lambda row: row.stats.sum, self.top)
+
+        for row in sorted_rows:
+            stats = row.stats
 
-        for tid, stats in sorted_stats:
-            syscall_stats = self.per_tid_syscall_usage_stats[tid]
-            total_syscall_sum = syscall_stats['__total_sum__']
+            # e.g. a thread seen in zero-length timeslices only
+            syscall_percent = 0
+            if stats.sum != 0:
+                syscall_percent = row.syscall_total.sum * 100 / stats.sum
 
             table_content = table_row_format.format(
-                '%s (%d)' % (stats.name, tid),
+                row.label,
                 '%.2f %%' % (stats.sum * 100 / (self.end_ts - self.begin_ts)),
-                '%.2f %%' % (total_syscall_sum * 100 / stats.sum),
+                '%.2f %%' % syscall_percent,
                 stats.min_duration,
                 '%.1f' % stats.average,
                 stats.max_duration,
@@ -285,8 +393,9 @@ class CpuStatCollector(StatCollector):
             print(table_content)
         print('')
 
-    def print_per_tid_per_syscall_stats(self):
-        table_title = '''=== Per-Tid Per-Syscall CPU Usage ==='''
+    def print_per_thread_syscall_stats(self, level):
+        table_title = '''=== Per-%s Per-Syscall CPU Usage ===''' % \
+                                                        ROLLUP_TITLES[level]
 
         table_row_format = '{:>20} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'
         table_label = table_row_format.format('name', 'cpu %', 'count %',
@@ -294,28 +403,26 @@ class CpuStatCollector(StatCollector):
                                               'count')
         print(table_title)
 
-        for tid in self.per_tid_usage_stats:
-            tid_stats = self.per_tid_usage_stats[tid]
-            tid_syscall_stats = self.per_tid_syscall_usage_stats[tid]
+        rows = [row for row in rollup_rows(self, level)
+                if row.syscall_total.sum != 0]
 
-            total_count = tid_syscall_stats['__total_count__']
-            total_sum = tid_syscall_stats['__total_sum__']
+        # the rows spending the most in syscalls, otherwise as first seen
+        if self.top is not None:
+            rows = top_items(rows, lambda row: row.syscall_total.sum, self.top)
 
-            if total_sum == 0:
-                continue
+        for row in rows:
+            total_count = row.syscall_total.count
+            total_sum = row.syscall_total.sum
 
             print('')
-            print(tid_stats.name + ' (' + str(tid) + '):')
+            print(row.label + ':')
             print(table_label)
 
-            sorted_stats = sorted(tid_syscall_stats.items(),
-                                  key=lambda key_value: key_value[1], reverse=True)
+            sorted_stats = top_items(row.syscall_stats.items(),
+                                     lambda key_value: key_value[1].sum,
+                                     self.top)
 
             for syscall_name, stats in sorted_stats:
-                if syscall_name == '__total_sum__' or \
-                   syscall_name == '__total_count__':
-                    continue
-
                 table_content = table_row_format.format(
                     '%s' % syscall_name,
                     '%.2f %%' % (stats.sum * 100 / total_sum),
@@ -329,9 +436,17 @@ class CpuStatCollector(StatCollector):
                 print(table_content)
         print('')
 
+    def report_live(self, begin_ts, end_ts):
+        print('### %d - %d (%.3f s) ###' % (begin_ts, end_ts,
+                                            (end_ts - begin_ts) / 1e9))
+        print('')
+        self.print_result()
+
     def print_result(self):
         self.print_per_cpu_stats()
         self.print_per_irq_stats()
         self.print_per_softirq_stats()
-        self.print_per_tid_stats()
-        self.print_per_tid_per_syscall_stats()
+        for level in self.rollups:
+            self.print_per_thread_stats(level)
+        for level in self.rollups:
+            self.print_per_thread_syscall_stats(level)
@@ -0,0 +1,626 @@
+from . import state
+from .stats import DurationStats
+from .stats import ProcessStats
+from .stats import SyscallStats
+from .stats import IrqStats, SoftIrqStats
+from .stats import Total
+from .stat_collector import RunOptions
+from .cpu_stat_collector import CpuStatCollector
+
+# CpuStatCollector tables merged key by key, 'tid_syscall' is the flattened
+# per_tid_syscall_usage_stats keyed by (tid, syscall name).
+SHARD_TABLES = {
+    'cpu' : 'per_cpu_usage_stats',
+    'cpu_app' : 'per_cpu_app_usage_stats',
+    'tid' : 'per_tid_usage_stats',
+    'cpu_syscall' : 'per_cpu_syscall_usage_stats',
+    'cpu_irq' : 'per_cpu_irq_usage_stats',
+    'irq' : 'per_irq_usage_stats',
+    'cpu_softirq' : 'per_cpu_softirq_usage_stats',
+    'softirq' : 'per_softirq_usage_stats',
+}
+
+# how a syscall piece ends: switched out while still in the syscall, left the
+# syscall, or replaced by a syscall entered in the same timeslice.
+PIECE_HANDOFF = 0
+PIECE_EXIT = 1
+PIECE_KILL = 2
+
+def end_ts(duration):
+    return duration.begin_ts + duration.duration
+
+# stolen time accumulated so far, plus the part of an interrupt still running
+# at 'timestamp'.
+def stolen_until(duration, timestamp, in_flight):
+    if in_flight and duration.begin_ts is not None:
+        return duration.duration + timestamp - duration.begin_ts
+
+    return duration.duration
+
+# Analyses a subset of the streams of a trace (e.g. one cpu) within a time
+# window and keeps what can't be resolved locally for merge_shards():
+#  - the first sched_out of a tid never switched in by this shard, whose
+#    start depends on whether another shard saw the tid before.
+#  - syscall pieces: every timeslice starts with a placeholder syscall, since
+#    the tid may have entered a syscall on another cpu or in an earlier
+#    window. Syscalls which don't begin and end in the same timeslice are
+#    stitched per tid at merge time.
+#  - the timestamp each table key was first updated at, so that merged
+#    tables keep the insertion order of a serial run.
+#  - for windows but the first, what ran on each cpu when the window began:
+#    placeholder process, syscall, irq and softirq (tid, irq and vec None)
+#    stand for it until the end of the interval they belong to, which is
+#    then matched with the open state the previous window ended with.
+class CpuStatShard(CpuStatCollector):
+    def __init__(self, path, window, cpu_ids, keep_intervals=False,
+                 backend='babeltrace', source=None):
+        self.window = window
+        self.cpu_ids = cpu_ids
+
+        index, begin_ts, end_ts = window
+        super().__init__(path, keep_intervals,
+                         RunOptions(begin_ts=begin_ts, end_ts=end_ts - 1,
+                                    source=source, backend=backend))
+
+        self.first_ts = {table : {} for table in SHARD_TABLES}
+        self.first_ts['tid_syscall_tid'] = {}
+        self.first_ts['tid_syscall'] = {}
+
+        self.first_seen = {}
+        self.orphans = []
+
+        self.placeholders = {}
+        self.pieces = []
+
+        # per cpu, see result()
+        self.boundary_in = {}
+        self.boundary_out = {}
+        self.irq_closes = {}
+        self.softirq_closes = {}
+        self.unresolved_syscalls = []
+
+    def on_begin_analyse(self, timestamp):
+        super().on_begin_analyse(timestamp)
+
+        index, begin_ts, end_ts = self.window
+        if index > 0:
+            self.open_boundary(begin_ts)
+
+    # totals are computed once the shards are merged
+    def on_end_analyse(self, timestamp):
+        self.end_ts = timestamp
+
+        index, begin_ts, end_ts = self.window
+        self.close_boundary(end_ts)
+
+    def get_notifiers(self):
+        notifiers = super().get_notifiers()
+        notifiers['sched_in'] = self.process_sched_in
+
+        # threads are merged by tid across shards, ParallelAnalyserRunner
+        # only sharding traces without lifecycle events
+        del notifiers['thread_end']
+
+        return notifiers
+
+    def open_boundary(self, timestamp):
+        cpus = self.analyser_runner.state.cpus
+
+        for cpu_id in self.cpu_ids:
+            cpu = state.Cpu(cpu_id)
+
+            # an interrupt running across the boundary steals time from the
+            # beginning of the window, the first entry resets this.
+            proc = state.Process(None, None)
+            proc.duration = state.Duration(timestamp)
+            proc.irq_stolen_duration = state.Duration(timestamp)
+            proc.softirq_stolen_duration = state.Duration(timestamp)
+            cpu.current_proc = proc
+
+            syscall = self.new_placeholder(proc, timestamp)
+            syscall.irq_stolen_duration.begin(timestamp)
+            syscall.softirq_stolen_duration.begin(timestamp)
+
+            cpu.current_irq = state.Irq(None, None)
+            cpu.current_irq.duration = state.Duration(timestamp)
+
+            cpu.current_softirq = state.SoftIrq(None)
+            cpu.current_softirq.duration = state.Duration(timestamp)
+            cpu.current_softirq.irq_stolen_duration.begin(timestamp)
+
+            cpus[cpu_id] = cpu
+
+    def close_boundary(self, timestamp):
+        for cpu_id, cpu in self.analyser_runner.state.cpus.items():
+            irq = cpu.current_irq
+            irq_in_flight = irq is not None and irq.irq is not None
+            softirq = cpu.current_softirq
+            softirq_in_flight = softirq is not None and softirq.vec is not None
+
+            proc = cpu.current_proc
+            running = None
+            if proc is not None:
+                running = (proc.tid, proc.duration.begin_ts,
+                           stolen_until(proc.irq_stolen_duration,
+                                        timestamp, irq_in_flight),
+                           stolen_until(proc.softirq_stolen_duration,
+                                        timestamp, softirq_in_flight))
+                self.detach_syscalls(cpu, proc, timestamp,
+                                     irq_in_flight, softirq_in_flight)
+
+            open_irq = None
+            if irq is not None:
+                open_irq = (irq.irq, irq.name, irq.duration.begin_ts)
+
+            open_softirq = None
+            if softirq is not None:
+                open_softirq = (softirq.vec, softirq.name,
+                                softirq.duration.begin_ts,
+                                stolen_until(softirq.irq_stolen_duration,
+                                             timestamp, irq_in_flight))
+
+            self.boundary_out[cpu_id] = (running, open_irq, open_softirq)
+
+    def touch(self, table, key, timestamp):
+        first_ts = self.first_ts[table]
+        if key not in first_ts:
+            first_ts[key] = timestamp
+
+    def new_placeholder(self, proc, timestamp):
+        syscall = state.Syscall(None)
+        syscall.duration = state.Duration(timestamp)
+
+        proc.current_syscall = syscall
+        self.placeholders[proc] = syscall
+
+        return syscall
+
+    def add_piece(self, cpu, proc, syscall, end_ts, kind,
+                  irq_in_flight=False, softirq_in_flight=False):
+        self.pieces.append((syscall.duration.begin_ts, proc.tid,
+                            syscall.name, end_ts, kind,
+                            stolen_until(syscall.irq_stolen_duration,
+                                         end_ts, irq_in_flight),
+                            stolen_until(syscall.softirq_stolen_duration,
+                                         end_ts, softirq_in_flight),
+                            cpu.cpu_id))
+
+    def detach_syscalls(self, cpu, proc, timestamp,
+                        irq_in_flight=False, softirq_in_flight=False):
+        syscall = proc.current_syscall
+        placeholder = self.placeholders.pop(proc, None)
+
+        if placeholder is not None:
+            if syscall is placeholder:
+                self.add_piece(cpu, proc, placeholder, timestamp,
+                               PIECE_HANDOFF, irq_in_flight, softirq_in_flight)
+            else:
+                self.add_piece(cpu, proc, placeholder, timestamp, PIECE_KILL)
+
+        if syscall is not None and syscall is not placeholder:
+            self.add_piece(cpu, proc, syscall, timestamp, PIECE_HANDOFF,
+                           irq_in_flight, softirq_in_flight)
+
+        proc.current_syscall = None
+
+    def process_sched_in(self, cpu, proc):
+        timestamp = proc.duration.begin_ts
+
+        if proc.tid not in self.first_seen:
+            self.first_seen[proc.tid] = (timestamp, proc.name)
+
+        self.new_placeholder(proc, timestamp)
+
+    def process_sched_out(self, cpu, proc):
+        timestamp = end_ts(proc.duration)
+
+        # the process running across the window boundary
+        boundary_proc = cpu.current_proc
+        if boundary_proc is not None and boundary_proc.tid is None:
+            if proc.tid not in self.first_seen:
+                self.first_seen[proc.tid] = (timestamp, proc.name)
+
+            self.boundary_in[cpu.cpu_id] = (
+                    timestamp, proc.tid,
+                    boundary_proc.irq_stolen_duration.duration,
+                    boundary_proc.softirq_stolen_duration.duration)
+            self.detach_syscalls(cpu, boundary_proc, timestamp)
+            return
+
+        if proc.tid not in self.first_seen:
+            self.first_seen[proc.tid] = (timestamp, proc.name)
+            self.orphans.append((timestamp, cpu.cpu_id, proc.tid))
+            return
+
+        self.touch('cpu', cpu.cpu_id, timestamp)
+        self.touch('cpu_app', cpu.cpu_id, timestamp)
+        self.touch('tid', proc.tid, timestamp)
+
+        super().process_sched_out(cpu, proc)
+
+        self.detach_syscalls(cpu, proc, timestamp)
+
+    def process_syscall_exit(self, cpu, syscall):
+        proc = cpu.current_proc
+        timestamp = end_ts(syscall.duration)
+
+        if syscall.name is None:
+            del self.placeholders[proc]
+            self.add_piece(cpu, proc, syscall, timestamp, PIECE_EXIT)
+            return
+
+        if proc.tid is None:
+            self.unresolved_syscalls.append((
+                    timestamp, cpu.cpu_id, syscall.name,
+                    syscall.duration.begin_ts,
+                    syscall.duration.duration -
+                    syscall.waiting_duration.duration -
+                    syscall.irq_stolen_duration.duration -
+                    syscall.softirq_stolen_duration.duration))
+            return
+
+        self.touch('cpu_syscall', cpu.cpu_id, timestamp)
+        self.touch('tid_syscall_tid', proc.tid, timestamp)
+        self.touch('tid_syscall', (proc.tid, syscall.name), timestamp)
+
+        super().process_syscall_exit(cpu, syscall)
+
+    def process_irq_exit(self, cpu, irq):
+        timestamp = end_ts(irq.duration)
+
+        if irq.irq is None:
+            self.irq_closes[cpu.cpu_id] = timestamp
+            return
+
+        self.touch('cpu_irq', cpu.cpu_id, timestamp)
+        self.touch('irq', irq.irq, timestamp)
+
+        super().process_irq_exit(cpu, irq)
+
+    def process_softirq_exit(self, cpu, softirq):
+        timestamp = end_ts(softirq.duration)
+
+        if softirq.vec is None:
+            self.softirq_closes[cpu.cpu_id] = \
+                        (timestamp, softirq.irq_stolen_duration.duration)
+            return
+
+        self.touch('cpu_softirq', cpu.cpu_id, timestamp)
+        self.touch('softirq', softirq.vec, timestamp)
+
+        super().process_softirq_exit(cpu, softirq)
+
+    # boundary_in: cpu -> (sched_out timestamp, tid, irq stolen, softirq
+    #   stolen) ending the timeslice running when the window began.
+    # boundary_out: cpu -> (running, irq, softirq) open at the end of the
+    #   window, with running (tid, sched_in timestamp, irq stolen, softirq
+    #   stolen), irq (irq, name, begin_ts), softirq (vec, name, begin_ts, irq
+    #   stolen), each None when there is none.
+    # irq_closes, softirq_closes: cpu -> exit of the interrupt running when
+    #   the window began.
+    # unresolved_syscalls: (exit timestamp, cpu, name, begin_ts, duration)
+    #   made by the process running when the window began.
+    def result(self):
+        tables = {}
+        for table, attr in SHARD_TABLES.items():
+            tables[table] = getattr(self, attr)
+
+        tables['tid_syscall'] = {}
+        for tid, syscalls in self.per_tid_syscall_usage_stats.items():
+            for syscall_name, stats in syscalls.items():
+                tables['tid_syscall'][(tid, syscall_name)] = stats
+
+        return {
+            'window' : self.window[0],
+            'tables' : tables,
+            'first_ts' : self.first_ts,
+            'first_seen' : self.first_seen,
+            'orphans' : self.orphans,
+            'pieces' : self.pieces,
+            'boundary_in' : self.boundary_in,
+            'boundary_out' : self.boundary_out,
+            'irq_closes' : self.irq_closes,
+            'softirq_closes' : self.softirq_closes,
+            'unresolved_syscalls' : self.unresolved_syscalls,
+        }
+
+class ShardMerger:
+    def __init__(self, collector):
+        self.collector = collector
+        self.keep_intervals = collector.keep_intervals
+
+        # table -> key -> list of (first update timestamp, stats)
+        self.entries = {table : {} for table in SHARD_TABLES}
+        self.entries['tid_syscall'] = {}
+        self.tid_syscall_first_ts = {}
+
+        # table -> key -> [first update timestamp, stats] for the intervals
+        # resolved at merge time
+        self.resolved = {table : {} for table in self.entries}
+
+        self.first_seen = {}
+
+        # (window, cpu) -> tid running on the cpu when the window began
+        self.boundary_tids = {}
+
+    def add_entry(self, table, key, timestamp, stats):
+        entries = self.entries[table]
+        if key not in entries:
+            entries[key] = []
+        entries[key].append((timestamp, stats))
+
+    def add_interval(self, table, key, timestamp, new_stats,
+                     begin_ts, duration):
+        resolved = self.resolved[table]
+        if key not in resolved:
+            resolved[key] = [timestamp, new_stats()]
+        elif resolved[key][0] > timestamp:
+            resolved[key][0] = timestamp
+
+        resolved[key][1].update(begin_ts, duration)
+
+    def add_result(self, result):
+        for table, stats_table in result['tables'].items():
+            first_ts = result['first_ts'][table]
+            for key, stats in stats_table.items():
+                self.add_entry(table, key, first_ts[key], stats)
+
+        for tid, timestamp in result['first_ts']['tid_syscall_tid'].items():
+            self.touch_tid_syscall(tid, timestamp)
+
+        for tid, (timestamp, name) in result['first_seen'].items():
+            if tid not in self.first_seen or \
+               timestamp < self.first_seen[tid][0]:
+                self.first_seen[tid] = (timestamp, name)
+
+    def touch_tid_syscall(self, tid, timestamp):
+        if tid not in self.tid_syscall_first_ts or \
+           timestamp < self.tid_syscall_first_ts[tid]:
+            self.tid_syscall_first_ts[tid] = timestamp
+
+    def new_duration_stats(self):
+        return DurationStats(self.keep_intervals)
+
+    def add_timeslice(self, timestamp, cpu_id, tid, begin_ts, duration,
+                      app_duration):
+        self.add_interval('cpu', cpu_id, timestamp, self.new_duration_stats,
+                          begin_ts, duration)
+        self.add_interval('cpu_app', cpu_id, timestamp,
+                          self.new_duration_stats, begin_ts, app_duration)
+        self.add_interval('tid', tid, timestamp,
+                          lambda: ProcessStats(None, self.keep_intervals),
+                          begin_ts, app_duration)
+
+    def add_orphan(self, timestamp, cpu_id, tid):
+        # seen by another shard first: missing sched_in, exclude this time.
+        if self.first_seen[tid][0] < timestamp:
+            begin_ts = timestamp
+        else:
+            begin_ts = self.collector.begin_ts
+        duration = timestamp - begin_ts
+
+        self.add_timeslice(timestamp, cpu_id, tid, begin_ts,
+                           duration, duration)
+
+    def add_syscall(self, timestamp, cpu_id, tid, name, begin_ts, duration):
+        self.add_interval('cpu_syscall', cpu_id, timestamp,
+                          self.new_duration_stats, begin_ts, duration)
+        self.add_interval('tid_syscall', (tid, name), timestamp,
+                          lambda: SyscallStats(name, self.keep_intervals),
+                          begin_ts, duration)
+        self.touch_tid_syscall(tid, timestamp)
+
+    # follows what ran on a cpu from window to window, closing the intervals
+    # which span window boundaries.
+    def stitch_cpu(self, cpu_id, windows):
+        running = None
+        irq = None
+        softirq = None
+
+        for index, result in enumerate(windows):
+            if result is None:
+                continue
+
+            if running is not None:
+                self.boundary_tids[(index, cpu_id)] = running[0]
+
+            boundary_in = result['boundary_in'].get(cpu_id)
+            if index > 0 and boundary_in is not None:
+                timestamp, tid, irq_stolen, softirq_stolen = boundary_in
+                if running is not None and running[0] == tid:
+                    duration = timestamp - running[1]
+                    self.add_timeslice(timestamp, cpu_id, tid, running[1],
+                                       duration,
+                                       duration - running[2] - irq_stolen -
+                                       running[3] - softirq_stolen)
+                else:
+                    self.add_orphan(timestamp, cpu_id, tid)
+
+            irq_close = result['irq_closes'].get(cpu_id)
+            if irq_close is not None and irq is not None:
+                irq_num, name, begin_ts = irq
+                self.add_interval('cpu_irq', cpu_id, irq_close,
+                                  self.new_duration_stats,
+                                  begin_ts, irq_close - begin_ts)
+                self.add_interval('irq', irq_num, irq_close,
+                                  lambda: IrqStats(name, self.keep_intervals),
+                                  begin_ts, irq_close - begin_ts)
+
+            softirq_close = result['softirq_closes'].get(cpu_id)
+            if softirq_close is not None and softirq is not None:
+                vec, name, begin_ts, irq_stolen = softirq
+                timestamp, close_irq_stolen = softirq_close
+                duration = timestamp - begin_ts - irq_stolen - close_irq_stolen
+                self.add_interval('cpu_softirq', cpu_id, timestamp,
+                                  lambda: SoftIrqStats(name,
+                                                       self.keep_intervals),
+                                  begin_ts, duration)
+                self.add_interval('softirq', vec, timestamp,
+                                  lambda: SoftIrqStats(name,
+                                                       self.keep_intervals),
+                                  begin_ts, duration)
+
+            boundary_out = result['boundary_out'].get(cpu_id)
+            if boundary_out is None:
+                running = irq = softirq = None
+                continue
+
+            out_running, out_irq, out_softirq = boundary_out
+
+            # still running what the window began with
+            if out_running is not None and out_running[0] is None:
+                if running is not None:
+                    running = (running[0], running[1],
+                               running[2] + out_running[2],
+                               running[3] + out_running[3])
+            else:
+                running = out_running
+
+            if out_irq is None or out_irq[0] is not None:
+                irq = out_irq
+
+            if out_softirq is not None and out_softirq[0] is None:
+                if softirq is not None:
+                    softirq = softirq[:3] + (softirq[3] + out_softirq[3],)
+            else:
+                softirq = out_softirq
+
+    def stitch_windows(self, results):
+        windows = max(result['window'] for result in results) + 1
+
+        cpu_windows = {}
+        for result in results:
+            for cpu_id in result['boundary_out']:
+                if cpu_id not in cpu_windows:
+                    cpu_windows[cpu_id] = [None] * windows
+                cpu_windows[cpu_id][result['window']] = result
+
+        for cpu_id, cpu_results in cpu_windows.items():
+            self.stitch_cpu(cpu_id, cpu_results)
+
+        for result in results:
+            for timestamp, cpu_id, name, begin_ts, duration in \
+                                            result['unresolved_syscalls']:
+                tid = self.boundary_tids.get((result['window'], cpu_id))
+                if tid is not None:
+                    self.add_syscall(timestamp, cpu_id, tid, name,
+                                     begin_ts, duration)
+
+    # replays the syscall pieces of every tid in time order, the same way
+    # SyscallAnalyser and SchedAnalyser would have seen them serially.
+    def stitch_syscalls(self, results):
+        pieces_by_tid = {}
+        for result in results:
+            for piece in result['pieces']:
+                tid = piece[1]
+                if tid is None:
+                    tid = self.boundary_tids.get((result['window'], piece[7]))
+                    if tid is None:
+                        continue
+
+                if tid not in pieces_by_tid:
+                    pieces_by_tid[tid] = []
+                pieces_by_tid[tid].append(piece)
+
+        for tid, pieces in pieces_by_tid.items():
+            pieces.sort(key=lambda piece: (piece[0], piece[2] is not None))
+
+            current = None
+            for piece in pieces:
+                begin_ts, _, name, end_ts, kind, \
+                        irq_stolen, softirq_stolen, cpu_id = piece
+
+                if name is not None:
+                    current = [name, begin_ts, end_ts, 0,
+                               irq_stolen, softirq_stolen]
+                    continue
+
+                if current is None:
+                    continue
+
+                if kind == PIECE_KILL:
+                    current = None
+                    continue
+
+                # waiting time since the last sched_out
+                current[3] += begin_ts - current[2]
+                current[4] += irq_stolen
+                current[5] += softirq_stolen
+
+                if kind == PIECE_EXIT:
+                    syscall_name, syscall_begin_ts, _, waiting, irq, softirq = \
+                                                                        current
+                    self.add_syscall(end_ts, cpu_id, tid, syscall_name,
+                                     syscall_begin_ts,
+                                     end_ts - syscall_begin_ts -
+                                     waiting - irq - softirq)
+                    current = None
+                else:
+                    current[2] = end_ts
+
+    def merged_table(self, table):
+        merged = []
+        for key, entries in self.entries[table].items():
+            entries.sort(key=lambda entry: entry[0])
+
+            first_ts, stats = entries[0]
+            for timestamp, other in entries[1:]:
+                stats.merge(other)
+
+            if stats.duration_list is not None:
+                stats.duration_list.sort(key=lambda interval: interval[0])
+
+            merged.append((first_ts, key, stats))
+
+        merged.sort(key=lambda entry: entry[0])
+
+        return merged
+
+    def merge(self, results):
+        for result in results:
+            self.add_result(result)
+
+        self.stitch_windows(results)
+
+        for result in results:
+            for timestamp, cpu_id, tid in result['orphans']:
+                self.add_orphan(timestamp, cpu_id, tid)
+
+        self.stitch_syscalls(results)
+
+        for table, resolved in self.resolved.items():
+            for key, (timestamp, stats) in resolved.items():
+                self.add_entry(table, key, timestamp, stats)
+
+        for table, attr in SHARD_TABLES.items():
+            merged = {}
+            for first_ts, key, stats in self.merged_table(table):
+                merged[key] = stats
+            setattr(self.collector, attr, merged)
+
+        for tid, stats in self.collector.per_tid_usage_stats.items():
+            stats.name = self.first_seen[tid][1]
+
+        per_tid_syscall_usage_stats = {}
+        for tid in sorted(self.tid_syscall_first_ts,
+                          key=lambda tid: self.tid_syscall_first_ts[tid]):
+            per_tid_syscall_usage_stats[tid] = {}
+
+        for first_ts, (tid, syscall_name), stats in \
+                                            self.merged_table('tid_syscall'):
+            per_tid_syscall_usage_stats[tid][syscall_name] = stats
+
+        self.collector.per_tid_syscall_usage_stats = per_tid_syscall_usage_stats
+
+        # the shards only have the totals of their own syscalls
+        per_tid_syscall_totals = {}
+        for tid, syscalls in per_tid_syscall_usage_stats.items():
+            total = per_tid_syscall_totals[tid] = Total()
+            for stats in syscalls.values():
+                total.sum += stats.sum
+                total.count += stats.count
+
+        self.collector.per_tid_syscall_totals = per_tid_syscall_totals
+
+def merge_shards(collector, results):
+    ShardMerger(collector).merge(results)
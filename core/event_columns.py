@@ -0,0 +1,432 @@
+import array
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from .analyser import strip_event_name, strip_syscall_name
+from .result_cache import trace_identity
+
+# event_type column values
+EVENT_SCHED_SWITCH = 0
+EVENT_IRQ_ENTRY = 1
+EVENT_IRQ_EXIT = 2
+EVENT_SOFTIRQ_ENTRY = 3
+EVENT_SOFTIRQ_EXIT = 4
+EVENT_SYSCALL_ENTRY = 5
+EVENT_SYSCALL_EXIT = 6
+EVENT_PROCESS_FORK = 7
+EVENT_PROCESS_EXIT = 8
+EVENT_PROCESS_FREE = 9
+EVENT_PROCESS_EXEC = 10
+EVENT_STATEDUMP_PROCESS = 11
+
+# the events SchedAnalyser follows the lifecycle of threads with, the tid of
+# a thread being reused once it's gone
+LIFECYCLE_EVENT_TYPES = (EVENT_PROCESS_FORK, EVENT_PROCESS_EXIT,
+                         EVENT_PROCESS_FREE, EVENT_PROCESS_EXEC,
+                         EVENT_STATEDUMP_PROCESS)
+
+EVENT_TYPES = {
+    'sched_switch' : EVENT_SCHED_SWITCH,
+    'irq_handler_entry' : EVENT_IRQ_ENTRY,
+    'irq_handler_exit' : EVENT_IRQ_EXIT,
+    'irq_softirq_entry' : EVENT_SOFTIRQ_ENTRY,
+    'irq_softirq_exit' : EVENT_SOFTIRQ_EXIT,
+    # perf tool compatible
+    'softirq_entry' : EVENT_SOFTIRQ_ENTRY,
+    'softirq_exit' : EVENT_SOFTIRQ_EXIT,
+    'sched_process_fork' : EVENT_PROCESS_FORK,
+    'sched_process_exit' : EVENT_PROCESS_EXIT,
+    'sched_process_free' : EVENT_PROCESS_FREE,
+    'sched_process_exec' : EVENT_PROCESS_EXEC,
+    'lttng_statedump_process_state' : EVENT_STATEDUMP_PROCESS,
+}
+
+# names ColumnEvent gives back to the analysers, syscall entries getting the
+# syscall name appended
+EVENT_NAMES = {
+    EVENT_SCHED_SWITCH : 'sched_switch',
+    EVENT_IRQ_ENTRY : 'irq_handler_entry',
+    EVENT_IRQ_EXIT : 'irq_handler_exit',
+    EVENT_SOFTIRQ_ENTRY : 'irq_softirq_entry',
+    EVENT_SOFTIRQ_EXIT : 'irq_softirq_exit',
+    EVENT_SYSCALL_ENTRY : 'syscall_entry_',
+    EVENT_SYSCALL_EXIT : 'sys_exit',
+    EVENT_PROCESS_FORK : 'sched_process_fork',
+    EVENT_PROCESS_EXIT : 'sched_process_exit',
+    EVENT_PROCESS_FREE : 'sched_process_free',
+    EVENT_PROCESS_EXEC : 'sched_process_exec',
+    EVENT_STATEDUMP_PROCESS : 'lttng_statedump_process_state',
+}
+
+# the event cache file: header, columns padded to 8 bytes in COLUMNS order,
+# then the strings table as '\0' terminated utf-8. Everything is
+# little-endian, whatever the byte order of the host.
+# header: magic, event count, trace timestamp_begin, timestamp_end, strings
+# size, digest of the trace identity the file was converted from
+COLUMNS_MAGIC = b'CPUCOLS2'
+COLUMNS_HEADER = struct.Struct('<8sQqqQ32s')
+
+def padded(size):
+    return (size + 7) & ~7
+
+# the values of a native 'column' as stored in the file
+def little_endian(column, typecode):
+    if sys.byteorder == 'little':
+        return column
+
+    column = array.array(typecode, column)
+    column.byteswap()
+
+    return column
+
+# whether a source declaring 'event_names' (None when unknown) may reuse tids
+# within the trace, see LIFECYCLE_EVENT_TYPES
+def traces_lifecycle(event_names):
+    if event_names is None:
+        return True
+
+    return any(event_type(event_name) in LIFECYCLE_EVENT_TYPES
+               for event_name in event_names)
+
+# the same name matching as Analyser.resolve(), returns None for the events
+# no analyser reads.
+def event_type(event_name):
+    event_name = strip_event_name(event_name)
+
+    if event_name in EVENT_TYPES:
+        return EVENT_TYPES[event_name]
+    elif event_name.startswith('sys_enter') or \
+         event_name.startswith('syscall_entry_'):
+        return EVENT_SYSCALL_ENTRY
+    elif event_name.startswith('sys_exit') or \
+         event_name.startswith('syscall_exit_'):
+        return EVENT_SYSCALL_EXIT
+
+    return None
+
+# An event read back from EventColumns, with the fields the analysers read.
+class ColumnEvent:
+    __slots__ = ('name', 'timestamp', 'fields')
+
+    def __init__(self, name, timestamp, fields):
+        self.name = name
+        self.timestamp = timestamp
+        self.fields = fields
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+# The fields the analysers read, one typed column each, in trace order.
+# arg0, arg1, str0 and str1 depend on the event type:
+#   sched_switch   prev_tid, next_tid, prev_comm, next_comm
+#   irq entry      irq, -, name, -
+#   irq exit       irq, ret, -, -
+#   softirq        vec, -, -, -
+#   syscall entry  -, -, syscall name, -
+#   syscall exit   -, ret, -, -
+#   fork           child tid, child tgid or -1 when not traced, -, -
+#   exit, free     tid, -, -, -
+#   exec           tid, old tid, filename, -
+#   statedump      tid, pid, -, -
+# str0 and str1 are ids in the strings table, -1 when unset.
+class EventColumns:
+    COLUMNS = (
+        ('timestamp', 'q'),
+        ('cpu_id', 'q'),
+        ('event_type', 'b'),
+        ('arg0', 'q'),
+        ('arg1', 'q'),
+        ('str0', 'q'),
+        ('str1', 'q'),
+    )
+
+    def __init__(self):
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array.array(typecode))
+
+        self.strings = []
+        self.string_ids = {}
+
+        # of the whole trace, when loaded from an event cache
+        self.timestamp_begin = None
+        self.timestamp_end = None
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def intern(self, string):
+        try:
+            return self.string_ids[string]
+        except KeyError:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.string_ids[string] = string_id
+
+            return string_id
+
+    def append(self, timestamp, cpu_id, event_type,
+               arg0=0, arg1=0, str0=-1, str1=-1):
+        self.timestamp.append(timestamp)
+        self.cpu_id.append(cpu_id)
+        self.event_type.append(event_type)
+        self.arg0.append(arg0)
+        self.arg1.append(arg1)
+        self.str0.append(str0)
+        self.str1.append(str1)
+
+    def append_event(self, event, event_type):
+        timestamp = event.timestamp
+        cpu_id = event['cpu_id']
+
+        if event_type == EVENT_SCHED_SWITCH:
+            # for 'perf' tool
+            try:
+                prev_tid = event['prev_tid']
+                next_tid = event['next_tid']
+            except KeyError:
+                prev_tid = event['prev_pid']
+                next_tid = event['next_pid']
+
+            self.append(timestamp, cpu_id, event_type, prev_tid, next_tid,
+                        self.intern(event['prev_comm']),
+                        self.intern(event['next_comm']))
+        elif event_type == EVENT_IRQ_ENTRY:
+            self.append(timestamp, cpu_id, event_type, event['irq'], 0,
+                        self.intern(event['name']))
+        elif event_type == EVENT_IRQ_EXIT:
+            self.append(timestamp, cpu_id, event_type,
+                        event['irq'], event['ret'])
+        elif event_type == EVENT_SOFTIRQ_ENTRY or \
+             event_type == EVENT_SOFTIRQ_EXIT:
+            self.append(timestamp, cpu_id, event_type, event['vec'])
+        elif event_type == EVENT_SYSCALL_ENTRY:
+            syscall_name = strip_syscall_name(strip_event_name(event.name))
+            self.append(timestamp, cpu_id, event_type,
+                        str0=self.intern(syscall_name))
+        elif event_type == EVENT_SYSCALL_EXIT:
+            ret = 0
+            try:
+                ret = event['ret']
+            except KeyError:
+                pass
+            self.append(timestamp, cpu_id, event_type, arg1=ret)
+        elif event_type == EVENT_PROCESS_FORK:
+            # see SchedAnalyser.process_sched_process_fork()
+            try:
+                child_tid = event['child_tid']
+                child_tgid = event['child_pid']
+            except KeyError:
+                child_tid = event['child_pid']
+                child_tgid = -1
+            self.append(timestamp, cpu_id, event_type, child_tid, child_tgid)
+        elif event_type == EVENT_PROCESS_EXIT or \
+             event_type == EVENT_PROCESS_FREE:
+            # for 'perf' tool
+            try:
+                tid = event['tid']
+            except KeyError:
+                tid = event['pid']
+            self.append(timestamp, cpu_id, event_type, tid)
+        elif event_type == EVENT_PROCESS_EXEC:
+            # for 'perf' tool
+            try:
+                tid = event['tid']
+                old_tid = event['old_tid']
+            except KeyError:
+                tid = event['pid']
+                old_tid = event['old_pid']
+            self.append(timestamp, cpu_id, event_type, tid, old_tid,
+                        self.intern(event['filename']))
+        else:
+            self.append(timestamp, cpu_id, event_type,
+                        event['tid'], event['pid'])
+
+    @classmethod
+    def from_events(cls, events):
+        columns = cls()
+        event_types = {}
+
+        for event in events:
+            event_name = event.name
+
+            try:
+                event_type_ = event_types[event_name]
+            except KeyError:
+                event_type_ = event_types[event_name] = event_type(event_name)
+
+            if event_type_ is not None:
+                columns.append_event(event, event_type_)
+
+        return columns
+
+    # whether tids may be reused within the events, their threads being
+    # told apart by SchedAnalyser only
+    def follows_lifecycle(self):
+        event_types = bytes(self.event_type)
+
+        return any(bytes((event_type,)) in event_types
+                   for event_type in LIFECYCLE_EVENT_TYPES)
+
+    # the events within [begin_ts, end_ts], sharing the columns memory
+    def slice(self, begin_ts, end_ts):
+        begin = 0
+        if begin_ts is not None:
+            begin = bisect.bisect_left(self.timestamp, begin_ts)
+        end = len(self)
+        if end_ts is not None:
+            end = bisect.bisect_right(self.timestamp, end_ts)
+
+        columns = EventColumns()
+        for name, typecode in self.COLUMNS:
+            setattr(columns, name, memoryview(getattr(self, name))[begin:end])
+
+        columns.strings = self.strings
+        columns.string_ids = self.string_ids
+        columns.timestamp_begin = self.timestamp_begin
+        columns.timestamp_end = self.timestamp_end
+
+        return columns
+
+    def events(self):
+        strings = self.strings
+
+        for timestamp, cpu_id, event_type, arg0, arg1, str0, str1 in \
+                zip(self.timestamp, self.cpu_id, self.event_type,
+                    self.arg0, self.arg1, self.str0, self.str1):
+            name = EVENT_NAMES[event_type]
+
+            if event_type == EVENT_SCHED_SWITCH:
+                fields = {
+                    'cpu_id' : cpu_id,
+                    'prev_tid' : arg0,
+                    'next_tid' : arg1,
+                    'prev_comm' : strings[str0],
+                    'next_comm' : strings[str1],
+                }
+            elif event_type == EVENT_IRQ_ENTRY:
+                fields = {'cpu_id' : cpu_id, 'irq' : arg0,
+                          'name' : strings[str0]}
+            elif event_type == EVENT_IRQ_EXIT:
+                fields = {'cpu_id' : cpu_id, 'irq' : arg0, 'ret' : arg1}
+            elif event_type == EVENT_SOFTIRQ_ENTRY or \
+                 event_type == EVENT_SOFTIRQ_EXIT:
+                fields = {'cpu_id' : cpu_id, 'vec' : arg0}
+            elif event_type == EVENT_SYSCALL_ENTRY:
+                name += strings[str0]
+                fields = {'cpu_id' : cpu_id}
+            elif event_type == EVENT_SYSCALL_EXIT:
+                fields = {'cpu_id' : cpu_id, 'ret' : arg1}
+            elif event_type == EVENT_PROCESS_FORK:
+                if arg1 < 0:
+                    fields = {'cpu_id' : cpu_id, 'child_pid' : arg0}
+                else:
+                    fields = {'cpu_id' : cpu_id, 'child_tid' : arg0,
+                              'child_pid' : arg1}
+            elif event_type == EVENT_PROCESS_EXIT or \
+                 event_type == EVENT_PROCESS_FREE:
+                fields = {'cpu_id' : cpu_id, 'tid' : arg0}
+            elif event_type == EVENT_PROCESS_EXEC:
+                fields = {'cpu_id' : cpu_id, 'tid' : arg0, 'old_tid' : arg1,
+                          'filename' : strings[str0]}
+            else:
+                fields = {'cpu_id' : cpu_id, 'tid' : arg0, 'pid' : arg1}
+
+            yield ColumnEvent(name, timestamp, fields)
+
+    def save(self, file_path, identity):
+        strings = ''.join(string + '\0' for string in self.strings).encode()
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(COLUMNS_HEADER.pack(COLUMNS_MAGIC, len(self),
+                                            self.timestamp_begin,
+                                            self.timestamp_end,
+                                            len(strings), identity))
+
+                for name, typecode in self.COLUMNS:
+                    data = bytes(little_endian(getattr(self, name), typecode))
+                    f.write(data)
+                    f.write(bytes(padded(len(data)) - len(data)))
+
+                f.write(strings)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    # maps 'file_path', the columns being read in place on little-endian
+    # hosts, and byte swapped into memory on the others
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        magic, count, timestamp_begin, timestamp_end, strings_size, identity = \
+                                COLUMNS_HEADER.unpack_from(data)
+        if magic != COLUMNS_MAGIC:
+            raise ValueError('%s: not an event cache' % file_path)
+
+        columns = cls()
+        columns.timestamp_begin = timestamp_begin
+        columns.timestamp_end = timestamp_end
+
+        offset = COLUMNS_HEADER.size
+        for name, typecode in cls.COLUMNS:
+            size = count * array.array(typecode).itemsize
+            column = data[offset:offset + size].cast(typecode)
+            setattr(columns, name, little_endian(column, typecode))
+            offset += padded(size)
+
+        strings = bytes(data[offset:offset + strings_size]).decode()
+        columns.strings = strings.split('\0')[:-1]
+        columns.string_ids = {string : string_id for string_id, string
+                              in enumerate(columns.strings)}
+
+        return columns, identity
+
+# The decoded events of the trace at 'path' are kept in '<path>.columns', next
+# to it, until the trace changes. The path is made absolute first, so that
+# the cache of '.' or '..' is not written into the trace, changing it.
+def event_cache_path(path):
+    return os.path.abspath(path) + '.columns'
+
+def trace_digest(path):
+    return hashlib.sha256(repr(trace_identity(path)).encode()).digest()
+
+# the columns of an up to date event cache of 'path', or None
+def load_event_cache(path):
+    try:
+        columns, identity = EventColumns.load(event_cache_path(path))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if identity != trace_digest(path):
+        return None
+
+    return columns
+
+# 'source' reads the trace at 'path', see event_source. The columns are built
+# in memory, about 50 bytes per event, and returned as they are when the
+# cache can't be written, e.g. next to a read-only trace.
+def write_event_cache(path, source):
+    identity = trace_digest(path)
+
+    columns = EventColumns.from_events(source.events())
+    columns.timestamp_begin = source.timestamp_begin
+    columns.timestamp_end = source.timestamp_end
+
+    try:
+        columns.save(event_cache_path(path), identity)
+    except OSError:
+        return columns
+
+    columns, identity = EventColumns.load(event_cache_path(path))
+
+    return columns
@@ -0,0 +1,42 @@
+class EventDispatcher:
+    def __init__(self, analysers):
+        self.analysers = analysers
+
+        # event name -> tuple of callbacks, resolved on first sight
+        self.routes = {}
+
+    def resolve(self, event_name):
+        route = []
+        for analyser in self.analysers:
+            callback = analyser.resolve(event_name)
+            if callback is not None:
+                route.append(callback)
+
+        route = tuple(route)
+        self.routes[event_name] = route
+
+        return route
+
+    # the names among 'event_names' at least one analyser handles
+    def subscribed(self, event_names):
+        subscribed = set()
+        for event_name in event_names:
+            route = self.routes.get(event_name)
+            if route is None:
+                route = self.resolve(event_name)
+
+            if route:
+                subscribed.add(event_name)
+
+        return frozenset(subscribed)
+
+    def dispatch(self, event):
+        event_name = event.name
+
+        try:
+            route = self.routes[event_name]
+        except KeyError:
+            route = self.resolve(event_name)
+
+        for callback in route:
+            callback(event)
@@ -0,0 +1,252 @@
+import random
+
+try:
+    import babeltrace
+except ImportError:
+    babeltrace = None
+
+from .event_columns import ColumnEvent
+from .bt2_source import Bt2Source
+
+# What AnalyserRunner reads events from. A source has:
+#  - timestamp_begin, timestamp_end: the span of the trace
+#  - events(begin_ts=None, end_ts=None): the events within [begin_ts,
+#    end_ts] in timestamp order, the whole trace by default. An event has a
+#    name and a timestamp, and its fields (cpu_id and the event fields) are
+#    read with event['field'].
+#  - event_names(): the names of the events the source may yield, None when
+#    unknown.
+
+def check_babeltrace():
+    if babeltrace is None:
+        raise ImportError('the babeltrace backend requires the babeltrace 1 '
+                          'python module')
+
+# a CTF trace directory read with babeltrace
+class BabeltraceSource:
+    def __init__(self, path):
+        check_babeltrace()
+
+        self.trace_collection = babeltrace.TraceCollection()
+        self.trace = self.trace_collection.add_traces_recursive(path, 'ctf')
+
+        self.timestamp_begin = self.trace_collection.timestamp_begin
+        self.timestamp_end = self.trace_collection.timestamp_end
+
+    def events(self, begin_ts=None, end_ts=None):
+        if begin_ts is None and end_ts is None:
+            return self.trace_collection.events
+
+        if begin_ts is None:
+            begin_ts = self.timestamp_begin
+        if end_ts is None:
+            end_ts = self.timestamp_end
+
+        return self.trace_collection.events_timestamps(begin_ts, end_ts)
+
+    # the event classes declared by the trace
+    def event_names(self):
+        if not self.trace:
+            return None
+
+        event_names = set()
+        for handle in self.trace.values():
+            if handle is None:
+                continue
+
+            for declaration in handle.events:
+                event_names.add(declaration.name)
+
+        return event_names
+
+# readers of a CTF trace directory, selectable by name
+TRACE_BACKENDS = {
+    'babeltrace' : BabeltraceSource,
+    'bt2' : Bt2Source,
+}
+
+def open_trace_source(path, backend='babeltrace'):
+    if backend not in TRACE_BACKENDS:
+        raise ValueError('unknown trace backend: %r' % backend)
+
+    return TRACE_BACKENDS[backend](path)
+
+SYNTHETIC_SYSCALLS = ('read', 'write', 'futex', 'poll', 'ioctl', 'openat',
+                      'close', 'mmap')
+SYNTHETIC_IRQS = ((0, 'timer'), (16, 'eth0'), (24, 'nvme0q1'))
+SYNTHETIC_SOFTIRQS = (1, 3, 7, 9)
+
+# A reproducible kernel trace generated on the fly, e.g. to stress the
+# analysers with more events than a real trace would hold in memory.
+#
+# 'threads' threads are scheduled on 'cpus' cpus, the event i of 'events'
+# being somewhere in [timestamp_begin + i * event_gap, timestamp_begin +
+# (i + 1) * event_gap). Each event is the next step of a random cpu:
+#  - an irq or a softirq is entered with probability 'irq_rate' and
+#    'softirq_rate' (an irq may interrupt a softirq), and the next step of
+#    the cpu leaves it.
+#  - a thread enters a syscall with probability 'syscall_rate', and blocks
+#    in it, being switched out, with probability 'block_rate'.
+#  - otherwise the cpu switches to a thread which isn't running. With
+#    probability 'exit_rate', the thread it switches out exits instead, and
+#    a new thread reusing its tid is forked under another comm.
+# The same parameters and seed give the same events.
+class SyntheticSource:
+    def __init__(self, cpus=4, threads=16, events=1000000,
+                 syscall_rate=0.5, block_rate=0.2, irq_rate=0.02,
+                 softirq_rate=0.02, exit_rate=0, event_gap=1000,
+                 timestamp_begin=0, seed=0):
+        self.cpus = cpus
+        self.threads = threads
+        self.count = events
+        self.syscall_rate = syscall_rate
+        self.block_rate = block_rate
+        self.irq_rate = irq_rate
+        self.softirq_rate = softirq_rate
+        self.exit_rate = exit_rate
+        self.event_gap = event_gap
+        self.seed = seed
+
+        self.timestamp_begin = timestamp_begin
+        self.timestamp_end = timestamp_begin + events * event_gap
+
+    def event_names(self):
+        event_names = {'sched_switch', 'irq_handler_entry', 'irq_handler_exit',
+                       'irq_softirq_entry', 'irq_softirq_exit'}
+        for syscall_name in SYNTHETIC_SYSCALLS:
+            event_names.add('syscall_entry_' + syscall_name)
+            event_names.add('syscall_exit_' + syscall_name)
+        if self.exit_rate:
+            event_names.update(('sched_process_exit', 'sched_process_free',
+                                'sched_process_fork'))
+
+        return event_names
+
+    def events(self, begin_ts=None, end_ts=None):
+        if begin_ts is None:
+            begin_ts = self.timestamp_begin
+        if end_ts is None:
+            end_ts = self.timestamp_end
+
+        for event in self.generate():
+            if event.timestamp < begin_ts:
+                continue
+            if event.timestamp > end_ts:
+                break
+
+            yield event
+
+    def generate(self):
+        rng = random.Random(self.seed)
+        rand = rng.random
+        randrange = rng.randrange
+
+        irq_rate = self.irq_rate
+        softirq_rate = irq_rate + self.softirq_rate
+        syscall_rate = softirq_rate + self.syscall_rate
+        block_rate = self.block_rate
+        exit_rate = self.exit_rate
+        event_gap = self.event_gap
+
+        first_tid = 1000
+        comms = ['thread%d' % tid for tid in range(self.threads)]
+
+        # per cpu: running thread index or None, irq, softirq in flight
+        running = [None] * self.cpus
+        irqs = [None] * self.cpus
+        softirqs = [None] * self.cpus
+
+        # per thread: syscall it is in, or None, and threads which had its
+        # tid before
+        syscalls = [None] * self.threads
+        generations = [0] * self.threads
+        waiting = list(range(self.threads))
+
+        for index in range(self.count):
+            timestamp = self.timestamp_begin + index * event_gap + \
+                        randrange(event_gap)
+            cpu_id = randrange(self.cpus)
+            thread = running[cpu_id]
+            draw = rand()
+
+            if irqs[cpu_id] is not None:
+                irq = irqs[cpu_id]
+                irqs[cpu_id] = None
+                yield ColumnEvent('irq_handler_exit', timestamp,
+                                  {'cpu_id' : cpu_id, 'irq' : irq, 'ret' : 1})
+            elif draw < irq_rate:
+                irq, name = SYNTHETIC_IRQS[randrange(len(SYNTHETIC_IRQS))]
+                irqs[cpu_id] = irq
+                yield ColumnEvent('irq_handler_entry', timestamp,
+                                  {'cpu_id' : cpu_id, 'irq' : irq,
+                                   'name' : name})
+            elif softirqs[cpu_id] is not None:
+                vec = softirqs[cpu_id]
+                softirqs[cpu_id] = None
+                yield ColumnEvent('irq_softirq_exit', timestamp,
+                                  {'cpu_id' : cpu_id, 'vec' : vec})
+            elif draw < softirq_rate:
+                vec = SYNTHETIC_SOFTIRQS[randrange(len(SYNTHETIC_SOFTIRQS))]
+                softirqs[cpu_id] = vec
+                yield ColumnEvent('irq_softirq_entry', timestamp,
+                                  {'cpu_id' : cpu_id, 'vec' : vec})
+            elif thread is not None and syscalls[thread] is not None and \
+                 rand() >= block_rate:
+                syscall_name = syscalls[thread]
+                syscalls[thread] = None
+                yield ColumnEvent('syscall_exit_' + syscall_name, timestamp,
+                                  {'cpu_id' : cpu_id, 'ret' : 0})
+            elif thread is not None and syscalls[thread] is None and \
+                 draw < syscall_rate:
+                syscall_name = SYNTHETIC_SYSCALLS[
+                                        randrange(len(SYNTHETIC_SYSCALLS))]
+                syscalls[thread] = syscall_name
+                yield ColumnEvent('syscall_entry_' + syscall_name, timestamp,
+                                  {'cpu_id' : cpu_id})
+            else:
+                # switch to a waiting thread, or to idle when there's none
+                next_thread = None
+                if waiting:
+                    position = randrange(len(waiting))
+                    next_thread = waiting[position]
+                    waiting[position] = waiting[-1]
+                    waiting.pop()
+
+                # drawn only then, not to change the other traces
+                exits = thread is not None and exit_rate and \
+                        rand() < exit_rate
+
+                if thread is not None:
+                    waiting.append(thread)
+                running[cpu_id] = next_thread
+
+                if exits:
+                    yield ColumnEvent('sched_process_exit', timestamp,
+                                      {'cpu_id' : cpu_id,
+                                       'tid' : first_tid + thread})
+
+                yield ColumnEvent('sched_switch', timestamp, {
+                    'cpu_id' : cpu_id,
+                    'prev_tid' : 0 if thread is None else first_tid + thread,
+                    'prev_comm' : 'swapper/%d' % cpu_id if thread is None
+                                  else comms[thread],
+                    'next_tid' : 0 if next_thread is None
+                                 else first_tid + next_thread,
+                    'next_comm' : 'swapper/%d' % cpu_id if next_thread is None
+                                  else comms[next_thread],
+                })
+
+                if exits:
+                    yield ColumnEvent('sched_process_free', timestamp,
+                                      {'cpu_id' : cpu_id,
+                                       'tid' : first_tid + thread})
+
+                    # the waiting thread is the new one from now on
+                    syscalls[thread] = None
+                    generations[thread] += 1
+                    comms[thread] = 'thread%d.%d' % (thread,
+                                                     generations[thread])
+                    yield ColumnEvent('sched_process_fork', timestamp,
+                                      {'cpu_id' : cpu_id,
+                                       'child_tid' : first_tid + thread,
+                                       'child_pid' : first_tid + thread})
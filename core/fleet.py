@@ -0,0 +1,176 @@
+import concurrent.futures
+import copy
+import glob
+import heapq
+import os
+
+from .cpu_stat_collector import CpuStatCollector
+from .stats import DurationStats
+from .text_trace_source import TextTraceSource
+
+DEFAULT_TOP = 10
+
+# the trace directories (or text dumps) named by 'patterns', globs being
+# expanded, each once and in order
+def expand_trace_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+
+    return paths
+
+# analyses one trace in a worker, with the RunOptions 'options', and returns
+# the results as cached_result() gives them
+def analyse_trace(path, options):
+    if not os.path.exists(path):
+        raise FileNotFoundError('no such trace')
+
+    if os.path.isfile(path):
+        options = copy.copy(options)
+        options.source = TextTraceSource(path)
+
+    collector = CpuStatCollector(path, options=options)
+    collector.run()
+
+    return collector.cached_result()
+
+# a CpuStatCollector holding the results analyse_trace() returned, to print
+# them or roll them up
+def restored_collector(path, result):
+    collector = CpuStatCollector(path)
+    collector.restore_result(result)
+
+    return collector
+
+# Analyses the traces at 'paths' in 'workers' processes, yielding (path,
+# result, error) as each one finishes: result as analyse_trace() returns
+# it, or error, a message, when the trace couldn't be analysed. A trace
+# failing, even by killing its worker, doesn't stop the others; a killed
+# worker takes the traces still running in the pool with it though, which
+# are reported failed too.
+def analyse_fleet(paths, options, workers):
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(analyse_trace, path, options) : path
+                   for path in paths}
+
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, '%s: %s' % (type(e).__name__, e)
+
+# The busiest cpus, tids, irqs and syscalls over the results of many
+# traces, each being a host. Cpus and tids are ranked per host, by usage
+# over the analysed range of their trace, only the 'top' ones being kept.
+# Irqs and syscalls are added up per name across hosts.
+class FleetRollup:
+    def __init__(self, top=DEFAULT_TOP):
+        self.top = top
+        self.hosts = 0
+
+        # min-heaps of (usage, host, cpu) and (usage, host, tid, name)
+        self.cpus = []
+        self.tids = []
+
+        # name -> DurationStats, and name -> set of hosts
+        self.irqs = {}
+        self.irq_hosts = {}
+        self.syscalls = {}
+        self.syscall_hosts = {}
+
+    def keep(self, heap, entry):
+        if len(heap) < self.top:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def merge(self, stats, hosts, name, host, duration_stats):
+        if name not in stats:
+            stats[name] = DurationStats()
+            hosts[name] = set()
+
+        stats[name].merge(duration_stats)
+        hosts[name].add(host)
+
+    def add(self, host, collector):
+        self.hosts += 1
+
+        span = collector.end_ts - collector.begin_ts
+        if span <= 0:
+            span = 1
+
+        for cpu, stats in collector.per_cpu_usage_stats.items():
+            self.keep(self.cpus, (stats.sum / span, host, cpu))
+
+        for tid, stats, syscall_total, syscall_stats in collector.threads():
+            self.keep(self.tids, (stats.sum / span, host, tid, stats.name))
+
+        for stats in collector.per_irq_usage_stats.values():
+            self.merge(self.irqs, self.irq_hosts, stats.name, host, stats)
+
+        for syscall_stats in collector.thread_syscall_stats():
+            for name, stats in syscall_stats.items():
+                self.merge(self.syscalls, self.syscall_hosts, name, host,
+                           stats)
+
+    def print_usage(self, table_title, label, heap, format_key):
+        table_row_format = '{:>40} {:>30} {:>10}'
+        table_label = table_row_format.format('host', label, 'usage')
+
+        print(table_title)
+        print(table_label)
+
+        for entry in sorted(heap, reverse=True):
+            table_content = table_row_format.format(
+                entry[1],
+                format_key(entry),
+                '%.2f %%' % (entry[0] * 100))
+
+            print(table_content)
+        print('')
+
+    def print_merged(self, table_title, label, stats, hosts):
+        table_row_format = '{:>30} {:>10} {:>10} {:>10} {:>12} {:>10} {:>6}'
+        table_label = table_row_format.format(label, 'min', 'avg', 'max',
+                                              'total', 'count', 'hosts')
+
+        print(table_title)
+        print(table_label)
+
+        sorted_stats = sorted(stats.items(),
+                              key=lambda key_value: key_value[1],
+                              reverse=True)
+
+        for name, name_stats in sorted_stats[:self.top]:
+            table_content = table_row_format.format(
+                '%s' % name,
+                name_stats.min_duration,
+                '%.1f' % name_stats.average,
+                name_stats.max_duration,
+                name_stats.sum,
+                name_stats.count,
+                len(hosts[name]))
+
+            print(table_content)
+        print('')
+
+    def print_result(self):
+        print('=== Fleet Rollup (%d hosts) ===' % self.hosts)
+        print('')
+
+        self.print_usage('=== Busiest CPUs ===', 'cpu', self.cpus,
+                         lambda entry: '%d' % entry[2])
+        self.print_usage('=== Busiest Tids ===', 'name (tid)', self.tids,
+                         lambda entry: '%s (%d)' % (entry[3], entry[2]))
+        self.print_merged('=== Busiest Irqs ===', 'name', self.irqs,
+                          self.irq_hosts)
+        self.print_merged('=== Busiest Syscalls ===', 'name', self.syscalls,
+                          self.syscall_hosts)
@@ -0,0 +1,222 @@
+import array
+import os
+import struct
+
+from .stat_collector import StatCollector
+from .event_columns import padded, little_endian
+
+# kind column values. A run row is a timeslice, its app time being its
+# duration minus its stolen time, as in the app and per-tid tables.
+INTERVAL_KINDS = ('run', 'syscall', 'irq', 'softirq')
+KIND_RUN, KIND_SYSCALL, KIND_IRQ, KIND_SOFTIRQ = range(len(INTERVAL_KINDS))
+
+# the columns of an interval file, each row being one interval:
+#   kind       see INTERVAL_KINDS
+#   cpu        cpu it ended on
+#   tid        process it ran for, or was interrupted, -1 when none
+#   comm       name of that process, id in the strings table or -1
+#   name       syscall, irq or softirq name, id in the strings table or -1
+#   begin_ts
+#   duration   from begin_ts to the end, nothing subtracted
+#   waiting    time a syscall spent blocked
+#   stolen     time interrupts stole from it
+INTERVAL_COLUMNS = (
+    ('kind', 'b'),
+    ('cpu', 'q'),
+    ('tid', 'q'),
+    ('comm', 'q'),
+    ('name', 'q'),
+    ('begin_ts', 'q'),
+    ('duration', 'q'),
+    ('waiting', 'q'),
+    ('stolen', 'q'),
+)
+
+# the interval file: header, chunks, strings table, footer. A chunk is its
+# row count then its columns, padded to 8 bytes, in INTERVAL_COLUMNS order.
+# The strings table is '\0' terminated utf-8, and the footer gives its
+# offset and size and the total row count. Everything is little-endian,
+# whatever the byte order of the host.
+INTERVALS_MAGIC = b'CPUIVLS1'
+INTERVALS_HEADER = struct.Struct('<8s')
+CHUNK_HEADER = struct.Struct('<Q')
+INTERVALS_FOOTER = struct.Struct('<QQQ8s')
+
+# rows buffered before being written
+CHUNK_ROWS = 1 << 16
+
+# Streams every interval CpuStatCollector accounts to 'file_path', in typed
+# columns, without keeping them in memory. Attached to a CpuStatCollector to
+# get both in one pass, and only works with the serial runner.
+#
+# Rows are appended to one array.array per column and written in chunks of
+# CHUNK_ROWS, the arrays being emptied and reused. Comms and names are
+# interned, only the distinct ones being encoded when the file is closed.
+# The file is written to 'file_path'.tmp and renamed once complete, and
+# removed when the run fails.
+class IntervalExporter(StatCollector):
+    def __init__(self, path, file_path, chunk_rows=CHUNK_ROWS, **kwargs):
+        super().__init__(path, self.get_notifiers(), **kwargs)
+
+        self.file_path = file_path
+        self.chunk_rows = chunk_rows
+
+        self.file = None
+        self.tmp_path = None
+        self.rows = 0
+
+        self.columns = [array.array(typecode)
+                        for name, typecode in INTERVAL_COLUMNS]
+        self.appends = tuple(column.append for column in self.columns)
+        self.chunk_length = self.columns[0].__len__
+
+        # None, e.g. the name of a run row, is -1
+        self.strings = []
+        self.string_ids = {None : -1}
+
+    def get_notifiers(self):
+        return {
+            'sched_out' : self.process_sched_out,
+            'syscall_exit' : self.process_syscall_exit,
+            'irq_exit' : self.process_irq_exit,
+            'softirq_exit' : self.process_softirq_exit,
+        }
+
+    def intern(self, string):
+        try:
+            return self.string_ids[string]
+        except KeyError:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.string_ids[string] = string_id
+
+            return string_id
+
+    def on_begin_analyse(self, timestamp):
+        self.tmp_path = self.file_path + '.tmp'
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(INTERVALS_HEADER.pack(INTERVALS_MAGIC))
+
+    def on_end_analyse(self, timestamp):
+        self.flush()
+
+        strings = ''.join(string + '\0' for string in self.strings).encode()
+        offset = self.file.tell()
+        self.file.write(strings)
+        self.file.write(INTERVALS_FOOTER.pack(offset, len(strings), self.rows,
+                                              INTERVALS_MAGIC))
+
+        self.file.close()
+        self.file = None
+
+        os.replace(self.tmp_path, self.file_path)
+        self.tmp_path = None
+
+    def on_abort_analyse(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        if self.tmp_path is not None:
+            os.remove(self.tmp_path)
+            self.tmp_path = None
+
+    def flush(self):
+        count = self.chunk_length()
+        if not count:
+            return
+
+        write = self.file.write
+        write(CHUNK_HEADER.pack(count))
+        for column in self.columns:
+            size = len(column) * column.itemsize
+            write(little_endian(column, column.typecode))
+            write(bytes(padded(size) - size))
+            del column[:]
+
+        self.rows += count
+
+    def add(self, kind, cpu_id, proc, name, begin_ts, duration, waiting,
+            stolen):
+        (append_kind, append_cpu, append_tid, append_comm, append_name,
+         append_begin_ts, append_duration, append_waiting,
+         append_stolen) = self.appends
+
+        append_kind(kind)
+        append_cpu(cpu_id)
+        if proc is None:
+            append_tid(-1)
+            append_comm(-1)
+        else:
+            append_tid(proc.tid)
+            append_comm(self.intern(proc.name))
+        append_name(self.intern(name))
+        append_begin_ts(begin_ts)
+        append_duration(duration)
+        append_waiting(waiting)
+        append_stolen(stolen)
+
+        if self.chunk_length() >= self.chunk_rows:
+            self.flush()
+
+    def process_sched_out(self, cpu, proc):
+        self.add(KIND_RUN, cpu.cpu_id, proc, None,
+                 proc.duration.begin_ts, proc.duration.duration, 0,
+                 proc.irq_stolen_duration.duration +
+                 proc.softirq_stolen_duration.duration)
+
+    def process_syscall_exit(self, cpu, syscall):
+        self.add(KIND_SYSCALL, cpu.cpu_id, cpu.current_proc, syscall.name,
+                 syscall.duration.begin_ts, syscall.duration.duration,
+                 syscall.waiting_duration.duration,
+                 syscall.irq_stolen_duration.duration +
+                 syscall.softirq_stolen_duration.duration)
+
+    def process_irq_exit(self, cpu, irq):
+        self.add(KIND_IRQ, cpu.cpu_id, cpu.current_proc, irq.name,
+                 irq.duration.begin_ts, irq.duration.duration, 0, 0)
+
+    def process_softirq_exit(self, cpu, softirq):
+        self.add(KIND_SOFTIRQ, cpu.cpu_id, cpu.current_proc, softirq.name,
+                 softirq.duration.begin_ts, softirq.duration.duration, 0,
+                 softirq.irq_stolen_duration.duration)
+
+# The columns of an interval file, as a dict of column name -> array.array,
+# and its strings table, e.g. for
+#   pandas.DataFrame({name : numpy.asarray(column) for name, column in
+#                     columns.items()})
+# The chunks are read one after the other, only the columns being kept.
+def load_intervals(file_path):
+    columns = {name : array.array(typecode)
+               for name, typecode in INTERVAL_COLUMNS}
+
+    with open(file_path, 'rb') as f:
+        magic, = INTERVALS_HEADER.unpack(f.read(INTERVALS_HEADER.size))
+        if magic != INTERVALS_MAGIC:
+            raise ValueError('%s: not an interval file' % file_path)
+
+        f.seek(-INTERVALS_FOOTER.size, 2)
+        strings_offset, strings_size, rows, magic = \
+                        INTERVALS_FOOTER.unpack(f.read(INTERVALS_FOOTER.size))
+        if magic != INTERVALS_MAGIC:
+            raise ValueError('%s: truncated interval file' % file_path)
+
+        f.seek(INTERVALS_HEADER.size)
+        while f.tell() < strings_offset:
+            count, = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            for name, typecode in INTERVAL_COLUMNS:
+                column = columns[name]
+                size = count * column.itemsize
+                column.frombytes(f.read(size))
+                f.seek(padded(size) - size, 1)
+
+        strings = f.read(strings_size).decode().split('\0')[:-1]
+
+    if len(columns['kind']) != rows:
+        raise ValueError('%s: %d rows instead of %d' %
+                         (file_path, len(columns['kind']), rows))
+
+    columns = {name : little_endian(column, column.typecode)
+               for name, column in columns.items()}
+
+    return columns, strings
@@ -1,8 +1,7 @@
 from .analyser import Analyser
-from . import state
 
 class IrqAnalyser(Analyser):
-    def __init__(self, notifiers, state):
+    def __init__(self, bus, state):
         callbacks = {
             'irq_handler_entry' : self.process_irq_handler_entry,
             'irq_handler_exit' : self.process_irq_handler_exit,
@@ -13,7 +12,7 @@ class IrqAnalyser(Analyser):
             'softirq_exit' : self.process_irq_softirq_exit,
         }
 
-        super().__init__(callbacks, notifiers, state)
+        super().__init__(callbacks, bus, state)
 
         self.begin_ts = None
 
@@ -45,8 +44,7 @@ class IrqAnalyser(Analyser):
             softirq = cpu.current_softirq
             softirq.irq_stolen_duration.begin(timestamp)
 
-        cpu.current_irq = state.Irq(name, irq_num)
-        cpu.current_irq.duration = state.Duration(timestamp)
+        cpu.enter_irq(name, irq_num, timestamp)
 
     def process_irq_handler_exit(self, event):
         timestamp = event.timestamp
@@ -82,7 +80,8 @@ class IrqAnalyser(Analyser):
         irq = cpu.current_irq
         irq.duration.update(timestamp)
 
-        self.notify('irq_exit', cpu=cpu, irq=irq)
+        for callback in self.bus.irq_exit:
+            callback(cpu, irq)
 
         cpu.current_irq = None
 
@@ -105,8 +104,7 @@ class IrqAnalyser(Analyser):
 
             proc.softirq_stolen_duration.begin(timestamp)
 
-        cpu.current_softirq = state.SoftIrq(vec)
-        cpu.current_softirq.duration = state.Duration(timestamp)
+        cpu.enter_softirq(vec, timestamp)
 
     def process_irq_softirq_exit(self, event):
         timestamp = event.timestamp
@@ -134,7 +132,8 @@ class IrqAnalyser(Analyser):
         softirq = cpu.current_softirq
         softirq.duration.update(timestamp)
 
-        self.notify('softirq_exit', cpu=cpu, softirq=softirq)
+        for callback in self.bus.softirq_exit:
+            callback(cpu, softirq)
 
         cpu.current_softirq = None
 
@@ -0,0 +1,287 @@
+import heapq
+import os
+import queue
+import tempfile
+import threading
+import time
+
+try:
+    import babeltrace
+except ImportError:
+    babeltrace = None
+
+from .analyser_runner import AnalyserRunner
+from .event_columns import event_type
+from .event_columns import EVENT_PROCESS_EXIT, EVENT_PROCESS_FREE
+from .event_source import check_babeltrace
+from .parallel_runner import find_cpu_streams, link_streams
+
+# threads which weren't switched in for that many intervals are reclaimed
+# when the trace doesn't tell when threads exit, see LiveAnalyserRunner
+IDLE_INTERVALS = 60
+
+# A trace directory still being written to, e.g. by an LTTng session.
+#
+# Every poll() returns the events past the previous poll, up to the oldest
+# end of the per-cpu streams: a stream flushed less recently may still get
+# older events. Streams lagging more than 'max_lag' behind the most recent
+# one are considered idle and don't hold the others back, their late events
+# being skipped.
+#
+# Each cpu is read through a tree of links to its streams, made once and
+# kept across polls, and its reader is kept open until its streams change:
+# babeltrace 1 can't see the packets appended to an open trace, so a grown
+# stream still has to be reopened, which indexes its packets again, but an
+# idle cpu costs a stat() per poll only. Only the new events are decoded,
+# the readers seeking past the previous ones. The events of the cpus are
+# merged by timestamp. To follow a long session at a constant cost per
+# refresh, read it through LTTng live instead, see Bt2LiveSource.
+class GrowingTraceSource:
+    # reopening the trace is only worth it once per refresh
+    poll_interval = None
+
+    def __init__(self, path, max_lag):
+        check_babeltrace()
+
+        self.path = path
+        self.max_lag = max_lag
+
+        # events up to last_ts are consumed
+        self.last_ts = None
+
+        # where the per-cpu link trees are made, and the streams linked
+        self.link_dir = None
+        self.linked = set()
+
+        # cpu id, None for a trace without per-cpu streams -> (signature of
+        # its streams when opened, trace collection)
+        self.readers = {}
+
+    def open(self, path):
+        trace_collection = babeltrace.TraceCollection()
+        if not trace_collection.add_traces_recursive(path, 'ctf'):
+            return None
+
+        return trace_collection
+
+    # the size and mtime of 'files', None when one went away
+    @staticmethod
+    def signature(files):
+        try:
+            return tuple((st.st_size, st.st_mtime_ns)
+                         for st in map(os.stat, files))
+        except OSError:
+            return None
+
+    # cpu id -> (trace path to open, files it's read from), linking the
+    # streams which appeared since the previous poll
+    def reader_paths(self):
+        cpu_streams = find_cpu_streams(self.path)
+        if not cpu_streams:
+            files = [os.path.join(root, name)
+                     for root, dirs, names in os.walk(self.path)
+                     for name in sorted(names)]
+            return {None : (self.path, files)}
+
+        if self.link_dir is None:
+            self.link_dir = tempfile.TemporaryDirectory(
+                                prefix='cpu_usage_live_')
+
+        paths = {}
+        for cpu_id, streams in cpu_streams.items():
+            path = os.path.join(self.link_dir.name, str(cpu_id))
+
+            new_streams = [stream for stream in streams
+                           if stream not in self.linked]
+            link_streams(self.path, new_streams, path)
+            self.linked.update(new_streams)
+
+            # the metadata grows too, e.g. when an event gets enabled
+            metadata = sorted(set(os.path.join(os.path.dirname(stream),
+                                               'metadata')
+                                  for stream in streams))
+            paths[cpu_id] = (path, streams + metadata)
+
+        return paths
+
+    # reopens the readers whose streams changed since they were opened
+    def update_readers(self):
+        for key, (path, files) in self.reader_paths().items():
+            signature = self.signature(files)
+
+            reader = self.readers.get(key)
+            if reader is not None and reader[0] == signature:
+                continue
+
+            trace_collection = self.open(path)
+            if trace_collection is not None:
+                self.readers[key] = (signature, trace_collection)
+
+    def poll(self):
+        self.update_readers()
+
+        trace_collections = [trace_collection for signature, trace_collection
+                             in self.readers.values()
+                             if trace_collection.timestamp_end is not None]
+        if not trace_collections:
+            return []
+
+        ends = [trace_collection.timestamp_end
+                for trace_collection in trace_collections]
+        newest = max(ends)
+        horizon = min(end for end in ends if end >= newest - self.max_lag)
+        if self.last_ts is not None and horizon <= self.last_ts:
+            return []
+
+        if self.last_ts is not None:
+            begin_ts = self.last_ts + 1
+        else:
+            begin_ts = min(trace_collection.timestamp_begin
+                           for trace_collection in trace_collections)
+        self.last_ts = horizon
+
+        return heapq.merge(*[trace_collection.events_timestamps(begin_ts,
+                                                                horizon)
+                             for trace_collection in trace_collections],
+                           key=lambda event: event.timestamp)
+
+# Events read from any iterator in a thread, e.g. a live session reader or a
+# local stand-in for one. At most 'max_pending' events wait to be polled, the
+# reader blocking beyond that. Events must stay valid once the iterator moved
+# on past them.
+class IteratorSource:
+    poll_interval = 0.05
+
+    def __init__(self, events, max_pending=65536):
+        self.queue = queue.Queue(max_pending)
+        self.finished = False
+
+        self.thread = threading.Thread(target=self.read, args=(events,),
+                                       daemon=True)
+        self.thread.start()
+
+    def read(self, events):
+        try:
+            for event in events:
+                self.queue.put(event)
+        finally:
+            self.queue.put(None)
+
+    # None once the iterator is exhausted and every event has been polled
+    def poll(self):
+        if self.finished:
+            return None
+
+        events = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if event is None:
+                self.finished = True
+                break
+
+            events.append(event)
+
+        return events
+
+# Analyses the events of a live source as they come and reports on them
+# every 'interval' seconds.
+#
+# Each report covers the events since the previous one: the stat collector
+# is reset after reporting, and the next interval starts where the previous
+# one ended, the same way a --begin/--end range would. The analyser State
+# is kept across intervals, so that a timeslice, syscall or interrupt
+# running across a refresh is accounted in the interval it ends in. Memory
+# and the work per refresh depend on the interval and the event rate only.
+#
+# The State of a thread is reclaimed once it exits (see SchedAnalyser). When
+# the trace has no sched_process_exit or sched_process_free events, the
+# threads which didn't run for IDLE_INTERVALS intervals are reclaimed
+# instead, so that the State doesn't grow with every thread ever seen. A
+# syscall such a thread was blocked in is then not accounted.
+class LiveAnalyserRunner(AnalyserRunner):
+    def __init__(self, live_source, notifiers, stat_collector, interval):
+        self.live_source = live_source
+        self.interval = interval
+
+        self.columns = None
+        self.source = None
+        self.time_range = False
+        self.begin_ts = None
+        self.end_ts = None
+
+        self.init_analysers(notifiers, stat_collector)
+
+        self.max_idle = int(interval * IDLE_INTERVALS * 1e9)
+        self.exits_traced = False
+
+    # whether the events seen so far tell when threads exit
+    def traces_exits(self):
+        if not self.exits_traced:
+            self.exits_traced = any(
+                        event_type(event_name) in (EVENT_PROCESS_EXIT,
+                                                   EVENT_PROCESS_FREE)
+                        for event_name in self.dispatcher.routes)
+
+        return self.exits_traced
+
+    # reclaims the threads not switched in since 'timestamp' - max_idle
+    def reclaim_idle(self, timestamp):
+        if self.traces_exits():
+            return
+
+        oldest_ts = timestamp - self.max_idle
+        idle = [proc for proc in self.state.tids.values()
+                if proc.duration is None and
+                   proc.timeslice_durations[0].begin_ts < oldest_ts]
+
+        for proc in idle:
+            self.sched_analyser.reclaim(proc)
+
+    def refresh(self):
+        self.end_analyse(self.end_ts)
+
+        for stat_collector in self.stat_collectors:
+            sc = stat_collector()
+            if sc is not None:
+                sc.report_live(self.begin_ts, self.end_ts)
+                sc.reset_stats()
+
+        self.begin_ts = self.end_ts
+        self.begin_analyse(self.begin_ts)
+
+        self.reclaim_idle(self.end_ts)
+
+    def run(self):
+        dispatch = self.dispatcher.dispatch
+        deadline = time.monotonic() + self.interval
+
+        while True:
+            events = self.live_source.poll()
+            if events is None:
+                break
+
+            for event in events:
+                if self.begin_ts is None:
+                    self.begin_ts = self.end_ts = event.timestamp
+                    self.begin_analyse(self.begin_ts)
+
+                dispatch(event)
+                self.end_ts = event.timestamp
+
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(min(deadline - now,
+                               self.live_source.poll_interval or self.interval))
+                continue
+
+            deadline += self.interval * ((now - deadline) // self.interval + 1)
+
+            if self.begin_ts is not None and self.end_ts > self.begin_ts:
+                self.refresh()
+
+        if self.begin_ts is not None and self.end_ts > self.begin_ts:
+            self.refresh()
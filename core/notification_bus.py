@@ -0,0 +1,38 @@
+# what the analysers notify, each with the positional arguments its callbacks
+# are called with:
+#  sched_in(cpu, proc)      proc switched in on cpu
+#  sched_out(cpu, proc)     proc switched out of cpu, its timeslice in
+#                           proc.duration
+#  syscall_exit(cpu, syscall)
+#  irq_exit(cpu, irq)
+#  softirq_exit(cpu, softirq)
+#  thread_end(proc)         the stats of the thread of proc are final: it
+#                           exited, runs another program or its tid is
+#                           reused
+NOTIFICATIONS = (
+    'sched_in',
+    'sched_out',
+    'syscall_exit',
+    'irq_exit',
+    'softirq_exit',
+    'thread_end',
+)
+
+# The callbacks of every stat collector attached to an analyser run, one
+# list per notification. Analysers call them in a plain loop, without
+# building any per-notification argument dict, and a notification nobody
+# subscribed to costs an empty loop.
+class NotificationBus:
+    __slots__ = NOTIFICATIONS
+
+    def __init__(self):
+        for notification_id in NOTIFICATIONS:
+            setattr(self, notification_id, [])
+
+    # 'notifiers' maps notification ids to callbacks, see get_notifiers()
+    def subscribe(self, notifiers):
+        for notification_id, callback in notifiers.items():
+            if notification_id not in NOTIFICATIONS:
+                raise ValueError('unknown notification: %r' % notification_id)
+
+            getattr(self, notification_id).append(callback)
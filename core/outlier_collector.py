@@ -0,0 +1,221 @@
+import heapq
+
+from .stat_collector import StatCollector
+
+# what the longest intervals are tracked for, each per key:
+#   syscall   per syscall name, ranked by the time the syscall ran (waiting
+#             and stolen time subtracted, as in the syscall tables)
+#   irq       per irq number
+#   softirq   per vector, ranked without the time irqs stole from it
+#   run       per cpu, timeslices ranked by their whole duration
+OUTLIER_CATEGORIES = ('syscall', 'irq', 'softirq', 'run')
+
+DEFAULT_OUTLIER_COUNT = 10
+
+# the attributes the outlier tables are printed from
+OUTLIER_ATTRS = (
+    'heaps',
+    'names',
+)
+
+# An interval among the longest of its key, with where and when it ran.
+# 'duration' is what it's ranked by, 'total' its whole duration.
+class Outlier:
+    __slots__ = ('duration', 'begin_ts', 'cpu_id', 'tid', 'comm', 'total',
+                 'waiting', 'irq_stolen', 'softirq_stolen')
+
+    def __init__(self, duration, begin_ts, cpu_id, proc, total, waiting,
+                 irq_stolen, softirq_stolen):
+        self.duration = duration
+        self.begin_ts = begin_ts
+        self.cpu_id = cpu_id
+        self.tid = -1 if proc is None else proc.tid
+        self.comm = None if proc is None else proc.name
+        self.total = total
+        self.waiting = waiting
+        self.irq_stolen = irq_stolen
+        self.softirq_stolen = softirq_stolen
+
+# Keeps the K longest intervals of every key of each category, see
+# OUTLIER_CATEGORIES. Usually attached to a CpuStatCollector, to get both in
+# one pass, and only works with the serial runner.
+#
+# Each key has a min-heap of at most K (duration, sequence, Outlier), and the
+# duration an interval has to beat to get in, None until the heap is full: an
+# interval which doesn't beat it costs a dict lookup and a comparison, no
+# Outlier being built. Memory is O(K) per key whatever the trace length.
+#
+# 'count' is K, for every category or as a dict of category -> K.
+class OutlierCollector(StatCollector):
+    def __init__(self, path, count=DEFAULT_OUTLIER_COUNT, **kwargs):
+        super().__init__(path, self.get_notifiers(), **kwargs)
+
+        if isinstance(count, int):
+            count = {category : count for category in OUTLIER_CATEGORIES}
+        for category in OUTLIER_CATEGORIES:
+            if count.get(category, DEFAULT_OUTLIER_COUNT) < 1:
+                raise ValueError('%s outlier count must be positive' %
+                                 category)
+
+        self.counts = {category : count.get(category, DEFAULT_OUTLIER_COUNT)
+                       for category in OUTLIER_CATEGORIES}
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        # category -> key -> heap, and category -> key -> threshold
+        self.heaps = {category : {} for category in OUTLIER_CATEGORIES}
+        self.thresholds = {category : {} for category in OUTLIER_CATEGORIES}
+
+        # category -> key -> name of the key in the tables
+        self.names = {category : {} for category in OUTLIER_CATEGORIES}
+
+        self.sequence = 0
+
+    def get_notifiers(self):
+        return {
+            'sched_out' : self.process_sched_out,
+            'syscall_exit' : self.process_syscall_exit,
+            'irq_exit' : self.process_irq_exit,
+            'softirq_exit' : self.process_softirq_exit,
+        }
+
+    def cache_options(self):
+        return (type(self).__name__, self.options.time_range,
+                sorted(self.counts.items()))
+
+    def cached_result(self):
+        return {attr : getattr(self, attr) for attr in OUTLIER_ATTRS}
+
+    def restore_result(self, result):
+        for attr in OUTLIER_ATTRS:
+            setattr(self, attr, result[attr])
+
+        # what push() keeps up to date, for a resumed run to go on
+        self.thresholds = {category : {} for category in OUTLIER_CATEGORIES}
+        for category in OUTLIER_CATEGORIES:
+            for key, heap in self.heaps[category].items():
+                if len(heap) == self.counts[category]:
+                    self.thresholds[category][key] = heap[0][0]
+
+        self.sequence = max((entry[1] for heaps in self.heaps.values()
+                             for heap in heaps.values() for entry in heap),
+                            default=0)
+
+    def push(self, category, key, name, outlier):
+        heap = self.heaps[category].get(key)
+        if heap is None:
+            heap = self.heaps[category][key] = []
+            self.names[category][key] = name
+
+        # the sequence keeps Outliers of the same duration from being compared
+        self.sequence += 1
+        entry = (outlier.duration, self.sequence, outlier)
+
+        if len(heap) < self.counts[category]:
+            heapq.heappush(heap, entry)
+            if len(heap) < self.counts[category]:
+                return
+        else:
+            heapq.heapreplace(heap, entry)
+
+        self.thresholds[category][key] = heap[0][0]
+
+    def process_sched_out(self, cpu, proc):
+        duration = proc.duration.duration
+        threshold = self.thresholds['run'].get(cpu.cpu_id)
+        if threshold is not None and duration <= threshold:
+            return
+
+        self.push('run', cpu.cpu_id, 'cpu %d' % cpu.cpu_id,
+                  Outlier(duration, proc.duration.begin_ts, cpu.cpu_id, proc,
+                          duration, 0, proc.irq_stolen_duration.duration,
+                          proc.softirq_stolen_duration.duration))
+
+    def process_syscall_exit(self, cpu, syscall):
+        total = syscall.duration.duration
+        waiting = syscall.waiting_duration.duration
+        irq_stolen = syscall.irq_stolen_duration.duration
+        softirq_stolen = syscall.softirq_stolen_duration.duration
+
+        duration = total - waiting - irq_stolen - softirq_stolen
+        threshold = self.thresholds['syscall'].get(syscall.name)
+        if threshold is not None and duration <= threshold:
+            return
+
+        self.push('syscall', syscall.name, syscall.name,
+                  Outlier(duration, syscall.duration.begin_ts, cpu.cpu_id,
+                          cpu.current_proc, total, waiting, irq_stolen,
+                          softirq_stolen))
+
+    def process_irq_exit(self, cpu, irq):
+        duration = irq.duration.duration
+        threshold = self.thresholds['irq'].get(irq.irq)
+        if threshold is not None and duration <= threshold:
+            return
+
+        self.push('irq', irq.irq, '%s (%d)' % (irq.name, irq.irq),
+                  Outlier(duration, irq.duration.begin_ts, cpu.cpu_id,
+                          cpu.current_proc, duration, 0, 0, 0))
+
+    def process_softirq_exit(self, cpu, softirq):
+        total = softirq.duration.duration
+        irq_stolen = softirq.irq_stolen_duration.duration
+
+        duration = total - irq_stolen
+        threshold = self.thresholds['softirq'].get(softirq.vec)
+        if threshold is not None and duration <= threshold:
+            return
+
+        self.push('softirq', softirq.vec,
+                  '%s (%d)' % (softirq.name, softirq.vec),
+                  Outlier(duration, softirq.duration.begin_ts, cpu.cpu_id,
+                          cpu.current_proc, total, 0, irq_stolen, 0))
+
+    # the outliers of a key, longest first
+    def outliers(self, category, key):
+        return [outlier for duration, sequence, outlier
+                in sorted(self.heaps[category][key], reverse=True)]
+
+    def print_category(self, category):
+        table_title = '=== Longest %s Intervals (top %d per key) ===' % (
+                            category.capitalize(), self.counts[category])
+
+        table_row_format = '{:>25} {:>10} {:>20} {:>5} {:>25} {:>10} ' \
+                           '{:>10} {:>10} {:>10}'
+        table_label = table_row_format.format('key', 'duration', 'begin_ts',
+                                              'cpu', 'comm (tid)', 'total',
+                                              'waiting', 'irq', 'softirq')
+        print(table_title)
+        print(table_label)
+
+        heaps = self.heaps[category]
+        names = self.names[category]
+
+        # keys with the longest outlier first
+        sorted_keys = sorted(heaps, key=lambda key: max(heaps[key])[0],
+                             reverse=True)
+
+        for key in sorted_keys:
+            for outlier in self.outliers(category, key):
+                task = '-'
+                if outlier.tid >= 0:
+                    task = '%s (%d)' % (outlier.comm, outlier.tid)
+
+                table_content = table_row_format.format(
+                    names[key],
+                    outlier.duration,
+                    outlier.begin_ts,
+                    outlier.cpu_id,
+                    task,
+                    outlier.total,
+                    outlier.waiting,
+                    outlier.irq_stolen,
+                    outlier.softirq_stolen)
+
+                print(table_content)
+        print('')
+
+    def print_result(self):
+        for category in OUTLIER_CATEGORIES:
+            self.print_category(category)
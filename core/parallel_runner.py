@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import re
+import tempfile
+
+from .analyser_runner import AnalyserRunner
+from .event_columns import traces_lifecycle
+
+# LTTng (and perf's CTF converter) write one stream file per cpu, named
+# '<channel>_<cpu>'.
+CPU_STREAM_RE = re.compile(r'_(\d+)$')
+
+def find_cpu_streams(path):
+    cpu_streams = {}
+
+    for root, dirs, files in os.walk(path):
+        if 'metadata' not in files:
+            continue
+
+        for name in sorted(files):
+            match = CPU_STREAM_RE.search(name)
+            if match is None:
+                continue
+
+            cpu_id = int(match.group(1))
+            if cpu_id not in cpu_streams:
+                cpu_streams[cpu_id] = []
+            cpu_streams[cpu_id].append(os.path.join(root, name))
+
+    return cpu_streams
+
+# builds a trace tree under 'target' holding only 'streams', by linking them
+# next to a link to the metadata of the trace they belong to.
+def link_streams(path, streams, target):
+    for stream in streams:
+        trace_dir = os.path.dirname(stream)
+        link_dir = os.path.join(target, os.path.relpath(trace_dir, path))
+        os.makedirs(link_dir, exist_ok=True)
+
+        metadata = os.path.join(link_dir, 'metadata')
+        if not os.path.exists(metadata):
+            os.symlink(os.path.abspath(os.path.join(trace_dir, 'metadata')),
+                       metadata)
+
+        os.symlink(os.path.abspath(stream),
+                   os.path.join(link_dir, os.path.basename(stream)))
+
+def analyse_shard(task):
+    path, streams, shard_class, shard_kwargs = task
+
+    if streams is None:
+        shard = shard_class(path, **shard_kwargs)
+        shard.run()
+
+        return shard.result()
+
+    with tempfile.TemporaryDirectory(prefix='cpu_usage_shard_') as shard_path:
+        link_streams(path, streams, shard_path)
+
+        shard = shard_class(shard_path, **shard_kwargs)
+        shard.run()
+
+        return shard.result()
+
+# (window index, begin_ts, end_ts) of 'windows' windows of about the same
+# length covering [begin_ts, end_ts], end_ts of a window being excluded
+def split_windows(begin_ts, end_ts, windows):
+    length = end_ts + 1 - begin_ts
+    bounds = [begin_ts + length * index // windows
+              for index in range(windows + 1)]
+
+    return [(index, bounds[index], bounds[index + 1])
+            for index in range(windows)]
+
+# Splits the analysis into shards, one per cpu stream and time window, and
+# has the stat collector merge their results.
+class ParallelAnalyserRunner(AnalyserRunner):
+    def __init__(self, path, notifiers, stat_collector, jobs, windows=1,
+                 begin_ts=None, end_ts=None, backend='babeltrace'):
+        super().__init__(path, notifiers, stat_collector, begin_ts, end_ts,
+                         backend=backend)
+
+        self.path = path
+        self.jobs = jobs
+        self.windows = windows
+        self.cpu_streams = find_cpu_streams(path)
+
+    # list of (streams, cpu ids, (window index, begin_ts, end_ts)) where
+    # streams None stands for the whole trace and end_ts is excluded.
+    def shards(self):
+        if len(self.cpu_streams) > 1:
+            groups = [(self.cpu_streams[cpu_id], [cpu_id])
+                      for cpu_id in sorted(self.cpu_streams)]
+        else:
+            groups = [(None, sorted(self.cpu_streams))]
+
+        # a window starts with unknown per-cpu state, which can only be
+        # stitched when the cpus are known up front.
+        windows = self.windows
+        if not self.cpu_streams:
+            windows = 1
+
+        shards = []
+        for window in split_windows(self.begin_ts, self.end_ts, windows):
+            for streams, cpu_ids in groups:
+                shards.append((streams, cpu_ids, window))
+
+        return shards
+
+    def run(self):
+        # a shard only sees the lifecycle events of its cpus and window, and
+        # can't tell the threads of a reused tid apart when merged
+        if traces_lifecycle(self.source.event_names()):
+            self.fallback = 'the trace has thread lifecycle events, which ' \
+                            'the shards do not follow: ran the serial ' \
+                            'analysis'
+            super().run()
+            return
+
+        shards = self.shards()
+
+        # nothing to split, e.g. a trace without per-cpu streams
+        if len(shards) < 2:
+            super().run()
+            return
+
+        self.begin_analyse(self.begin_ts)
+
+        sc = self.stat_collector()
+        shard_class, shard_kwargs = sc.shard_options()
+
+        tasks = []
+        for streams, cpu_ids, window in shards:
+            kwargs = dict(shard_kwargs, window=window, cpu_ids=cpu_ids)
+            tasks.append((self.path, streams, shard_class, kwargs))
+
+        with multiprocessing.Pool(min(self.jobs, len(tasks))) as pool:
+            results = pool.map(analyse_shard, tasks, chunksize=1)
+
+        sc.merge_shards(results)
+
+        self.end_analyse(self.end_ts)
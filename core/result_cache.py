@@ -0,0 +1,131 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# bump whenever a change to the analysers or collectors changes the results,
+# so that results cached by an older version are never read back.
+ANALYSER_VERSION = 5
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.join(os.path.expanduser('~'), '.cache'))
+
+    return os.path.join(cache_home, 'cpu_usage_analyser')
+
+# identity of a trace: its path and the size and mtime of every file in it
+def trace_identity(path):
+    path = os.path.abspath(path)
+    files = []
+
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            st = os.stat(file_path)
+            files.append((os.path.relpath(file_path, path),
+                          st.st_size, st.st_mtime_ns))
+
+    return path, files
+
+# Finished collector results stored as one pickle per key in 'cache_dir',
+# the least recently used ones evicted once they take more than 'max_size'
+# bytes.
+class ResultCache:
+    def __init__(self, cache_dir=None, max_size=DEFAULT_CACHE_SIZE):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def key(self, path, options):
+        identity = (ANALYSER_VERSION, trace_identity(path), options)
+
+        return hashlib.sha256(repr(identity).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def entries(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return []
+
+        return [os.path.join(self.cache_dir, name) for name in names
+                if name.endswith('.pickle')]
+
+    def load(self, key):
+        entry_path = self.entry_path(key)
+
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # truncated or written by an incompatible version
+            self.remove(entry_path)
+            return None
+
+        if entry.get('version') != ANALYSER_VERSION:
+            self.remove(entry_path)
+            return None
+
+        # most recently used
+        os.utime(entry_path)
+
+        return entry['result']
+
+    def store(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        entry = {
+            'version' : ANALYSER_VERSION,
+            'result' : result,
+        }
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.entry_path(key))
+        except BaseException:
+            self.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+
+        for entry_path in self.entries():
+            try:
+                st = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+
+            entries.append((st.st_mtime_ns, st.st_size, entry_path))
+            total_size += st.st_size
+
+        entries.sort()
+        for mtime, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+
+            self.remove(entry_path)
+            total_size -= size
+
+    def clear(self):
+        for entry_path in self.entries():
+            self.remove(entry_path)
+
+    def remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,123 @@
+import heapq
+
+from .stats import ProcessStats, SyscallStats, Total
+
+# what the per-thread tables are reported per: every thread on its own, the
+# threads of a process (tgid) added up, or the threads sharing a comm
+ROLLUP_LEVELS = ('tid', 'process', 'comm')
+
+# table title and row label of each level
+ROLLUP_TITLES = {
+    'tid' : 'Tid',
+    'process' : 'Process',
+    'comm' : 'Comm',
+}
+
+ROLLUP_LABELS = {
+    'tid' : 'name (tid)',
+    'process' : 'name (pid)',
+    'comm' : 'name',
+}
+
+# the 'top' largest 'items' by 'key', largest first, picked without sorting
+# the others; every item, sorted, when 'top' is None
+def top_items(items, key, top=None):
+    if top is None:
+        return sorted(items, key=key, reverse=True)
+
+    return heapq.nlargest(top, items, key=key)
+
+# A row of a per-thread table: the usage of one or more threads, their
+# syscall Total and their syscalls by name.
+class RollupRow:
+    __slots__ = ('label', 'stats', 'syscall_total', 'syscall_stats')
+
+    def __init__(self, label, stats, syscall_total, syscall_stats):
+        self.label = label
+        self.stats = stats
+        self.syscall_total = syscall_total
+        self.syscall_stats = syscall_stats
+
+    def add(self, stats, syscall_total, syscall_stats):
+        self.stats.merge(stats)
+        self.syscall_total.merge(syscall_total)
+
+        for name, stats in syscall_stats.items():
+            if name not in self.syscall_stats:
+                self.syscall_stats[name] = SyscallStats(name)
+            self.syscall_stats[name].merge(stats)
+
+# The rows of the per-thread table at 'level' (see ROLLUP_LEVELS), threads
+# being added up with add(). A process is keyed by its tgid and generation
+# (see CpuStatCollector.process_thread_end), so that a new process reusing
+# the tgid of an ended one gets a row of its own.
+class Rollup:
+    def __init__(self, level):
+        self.level = level
+
+        # key -> RollupRow, and key -> name of the row
+        self.rows = {}
+        self.names = {}
+
+    def key(self, tid, stats):
+        if self.level == 'process':
+            tgid = tid if stats.tgid is None else stats.tgid
+            return (tgid, stats.generation)
+
+        return stats.name
+
+    def row(self, key, name):
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = RollupRow(None, ProcessStats(name),
+                                             Total(), {})
+            self.names[key] = name
+
+        return row
+
+    def add(self, tid, stats, syscall_total, syscall_stats):
+        key = self.key(tid, stats)
+        row = self.row(key, stats.name)
+
+        # a process is named after its main thread
+        if self.level == 'process' and tid == key[0]:
+            self.names[key] = stats.name
+
+        row.add(stats, syscall_total, syscall_stats)
+
+    def merge(self, other):
+        for key, other_row in other.rows.items():
+            row = self.row(key, other.names[key])
+            row.add(other_row.stats, other_row.syscall_total,
+                    other_row.syscall_stats)
+
+    # the RollupRows, labelled, in the order their first thread was added
+    def result(self):
+        for key, row in self.rows.items():
+            if self.level == 'process':
+                row.label = '%s (%d)' % (self.names[key], key[0])
+            else:
+                row.label = '%s' % key
+            row.stats.name = self.names[key]
+
+        return list(self.rows.values())
+
+# The RollupRows of the threads of 'collector' (a CpuStatCollector) at
+# 'level', the ended threads it folded first, then in the order of
+# CpuStatCollector.threads(). Threads whose tgid wasn't traced are processes
+# of their own.
+def rollup_rows(collector, level):
+    if level == 'tid':
+        return [RollupRow('%s (%d)' % (stats.name, tid), stats,
+                          syscall_total, syscall_stats)
+                for tid, stats, syscall_total, syscall_stats
+                in collector.threads()]
+
+    rollup = Rollup(level)
+    if level in collector.folded_threads:
+        rollup.merge(collector.folded_threads[level])
+
+    for tid, stats, syscall_total, syscall_stats in collector.threads():
+        rollup.add(tid, stats, syscall_total, syscall_stats)
+
+    return rollup.result()
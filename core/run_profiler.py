@@ -0,0 +1,226 @@
+import sys
+import time
+
+from .event_dispatcher import EventDispatcher
+from .notification_bus import NOTIFICATIONS
+
+# events read between two looks at the clock for a progress report
+PROGRESS_CHECK_EVENTS = 4096
+
+def callback_name(callback):
+    # syscall entries are partials binding the syscall name
+    callback = getattr(callback, 'func', callback)
+
+    return getattr(callback, '__qualname__', repr(callback))
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+# An EventDispatcher whose routes call the analyser callbacks through the
+# timers of 'profiler'.
+class TimedDispatcher(EventDispatcher):
+    def __init__(self, analysers, profiler):
+        super().__init__(analysers)
+
+        self.profiler = profiler
+
+    def resolve(self, event_name):
+        route = tuple(self.profiler.timed_analyser_callback(callback)
+                      for callback in super().resolve(event_name))
+        self.routes[event_name] = route
+
+        return route
+
+# Runs an AnalyserRunner with every analyser callback and notifier timed,
+# counting the events of each name and reporting the progress every
+# 'progress_interval' seconds, then prints where the time went to 'file'.
+#
+# Nothing is instrumented unless a profiler is given to the stat collector:
+# the runner then hands its run() over to it. The time of a notifier is not
+# counted in the analyser callback notifying it, and dispatch is what
+# remains of the run once the decoding, analysers and notifiers are
+# subtracted, the timers' own cost included.
+class RunProfiler:
+    def __init__(self, progress_interval=5.0, file=None):
+        self.progress_interval = progress_interval
+        self.file = file
+
+        # event name -> count
+        self.event_counts = {}
+
+        # callback name -> [calls, seconds]
+        self.analyser_stats = {}
+        self.collector_stats = {}
+
+        self.decode_time = 0.0
+        self.analyser_time = 0.0
+        self.collector_time = 0.0
+        self.total_time = 0.0
+
+    def output(self):
+        return sys.stderr if self.file is None else self.file
+
+    def timed_analyser_callback(self, callback):
+        stats = self.analyser_stats.setdefault(callback_name(callback), [0, 0.0])
+        clock = time.perf_counter
+
+        def timed(event):
+            collector_time = self.collector_time
+            begin = clock()
+            callback(event)
+            elapsed = clock() - begin - (self.collector_time - collector_time)
+
+            stats[0] += 1
+            stats[1] += elapsed
+            self.analyser_time += elapsed
+
+        return timed
+
+    def timed_notifier(self, callback):
+        stats = self.collector_stats.setdefault(callback_name(callback),
+                                                [0, 0.0])
+        clock = time.perf_counter
+
+        def timed(*args):
+            begin = clock()
+            callback(*args)
+            elapsed = clock() - begin
+
+            stats[0] += 1
+            stats[1] += elapsed
+            self.collector_time += elapsed
+
+        return timed
+
+    def instrument(self, runner):
+        runner.dispatcher = TimedDispatcher(runner.analysers, self)
+
+        for notification_id in NOTIFICATIONS:
+            callbacks = getattr(runner.bus, notification_id)
+            callbacks[:] = [self.timed_notifier(callback)
+                            for callback in callbacks]
+
+    def report_progress(self, runner, timestamp, count, elapsed):
+        span = runner.end_ts - runner.begin_ts
+        fraction = 1.0
+        if span > 0:
+            fraction = min(max((timestamp - runner.begin_ts) / span, 0.0), 1.0)
+
+        eta = '-'
+        if fraction > 0:
+            eta = format_seconds(elapsed * (1 - fraction) / fraction)
+
+        print('progress: %.1f %%, %d events, %.0f events/s, ETA %s' %
+              (fraction * 100, count, count / elapsed if elapsed else 0, eta),
+              file=self.output())
+
+    def run(self, runner):
+        self.instrument(runner)
+
+        clock = time.perf_counter
+        begin = clock()
+        runner.begin_run()
+
+        subscribed = runner.subscribed_events()
+        dispatch = runner.dispatcher.dispatch
+        event_counts = self.event_counts
+
+        events = iter(runner.events())
+        count = 0
+        next_report = begin + self.progress_interval
+
+        while True:
+            decode_begin = clock()
+            try:
+                event = next(events)
+            except StopIteration:
+                self.decode_time += clock() - decode_begin
+                break
+            self.decode_time += clock() - decode_begin
+
+            event_name = event.name
+            event_counts[event_name] = event_counts.get(event_name, 0) + 1
+
+            if subscribed is None or event_name in subscribed:
+                dispatch(event)
+
+            count += 1
+            if count % PROGRESS_CHECK_EVENTS == 0:
+                now = clock()
+                if now >= next_report:
+                    self.report_progress(runner, event.timestamp, count,
+                                         now - begin)
+                    next_report = now + self.progress_interval
+
+        runner.end_analyse(runner.end_ts)
+        self.total_time = clock() - begin
+
+    def print_callbacks(self, table_title, callback_stats):
+        table_row_format = '{:>45} {:>10} {:>10} {:>10} {:>10}'
+        table_label = table_row_format.format('callback', 'calls', 'time (s)',
+                                              'time %', 'ns/call')
+        out = self.output()
+
+        print(table_title, file=out)
+        print(table_label, file=out)
+
+        sorted_stats = sorted(callback_stats.items(),
+                              key=lambda key_value: key_value[1][1],
+                              reverse=True)
+
+        for name, (calls, seconds) in sorted_stats:
+            table_content = table_row_format.format(
+                name,
+                calls,
+                '%.3f' % seconds,
+                '%.2f %%' % (seconds * 100 / self.total_time
+                             if self.total_time else 0),
+                '%.0f' % (seconds * 1e9 / calls if calls else 0))
+
+            print(table_content, file=out)
+        print('', file=out)
+
+    def print_result(self):
+        out = self.output()
+        count = sum(self.event_counts.values())
+
+        print('=== Profile ===', file=out)
+        print('%d events in %.3f s, %.0f events/s' %
+              (count, self.total_time,
+               count / self.total_time if self.total_time else 0), file=out)
+
+        table_row_format = '{:>12} {:>10} {:>10}'
+        print(table_row_format.format('part', 'time (s)', 'time %'), file=out)
+
+        dispatch_time = self.total_time - self.decode_time - \
+                        self.analyser_time - self.collector_time
+
+        for part, seconds in (('decode', self.decode_time),
+                              ('dispatch', dispatch_time),
+                              ('analysers', self.analyser_time),
+                              ('collectors', self.collector_time)):
+            print(table_row_format.format(
+                        part,
+                        '%.3f' % seconds,
+                        '%.2f %%' % (seconds * 100 / self.total_time
+                                     if self.total_time else 0)), file=out)
+        print('', file=out)
+
+        self.print_callbacks('=== Analyser Callbacks ===', self.analyser_stats)
+        self.print_callbacks('=== Collector Notifiers ===',
+                             self.collector_stats)
+
+        table_row_format = '{:>45} {:>10} {:>10}'
+        print('=== Events ===', file=out)
+        print(table_row_format.format('name', 'count', 'count %'), file=out)
+
+        for name, event_count in sorted(self.event_counts.items(),
+                                        key=lambda key_value: key_value[1],
+                                        reverse=True):
+            print(table_row_format.format(
+                        name, event_count,
+                        '%.2f %%' % (event_count * 100 / count)), file=out)
+        print('', file=out)
@@ -1,19 +1,134 @@
+import os
+
 from . import state
 from .analyser import Analyser
 
+# a comm is at most that long, nul included
+TASK_COMM_LEN = 16
+
 class SchedAnalyser(Analyser):
-    def __init__(self, notifiers, state):
+    def __init__(self, bus, state):
         callbacks = {
             'sched_switch' : self.process_sched_switch,
+            'sched_process_fork' : self.process_sched_process_fork,
+            'lttng_statedump_process_state' : self.process_statedump_process,
+            'sched_process_exit' : self.process_sched_process_exit,
+            'sched_process_free' : self.process_sched_process_free,
+            'sched_process_exec' : self.process_sched_process_exec,
         }
 
-        super().__init__(callbacks, notifiers, state)
+        super().__init__(callbacks, bus, state)
 
         self.begin_ts = None
 
     def on_begin_analyse(self, timestamp):
         self.begin_ts = timestamp
 
+    def set_tgid(self, tid, tgid):
+        self.state.tgids[tid] = tgid
+
+        proc = self.state.tids.get(tid)
+        if proc is not None:
+            proc.tgid = tgid
+
+    # frees the state of a thread which isn't running, once its stats are
+    # made final
+    def reclaim(self, proc):
+        for callback in self.bus.thread_end:
+            callback(proc)
+
+        del self.state.tids[proc.tid]
+        self.state.tgids.pop(proc.tid, None)
+
+        # only when its last sched_switch was missed
+        for cpu in self.state.cpus.values():
+            if cpu.current_proc is proc:
+                cpu.current_proc = None
+
+    # lttng gives the child both as child_tid and child_pid (its tgid),
+    # 'perf' and ftrace only give its tid, as child_pid
+    def process_sched_process_fork(self, event):
+        try:
+            child_tid = event['child_tid']
+            child_tgid = event['child_pid']
+        except KeyError:
+            child_tid = event['child_pid']
+            child_tgid = None
+
+        # the tid is reused, the exit of its previous thread having been
+        # missed
+        proc = self.state.tids.get(child_tid)
+        if proc is not None:
+            self.reclaim(proc)
+
+        if child_tgid is not None:
+            self.set_tgid(child_tid, child_tgid)
+
+    # the tid of a sched_process_exit or sched_process_free
+    def exiting_proc(self, event):
+        # for 'perf' tool
+        try:
+            tid = event['tid']
+        except KeyError:
+            tid = event['pid']
+
+        return self.state.tids.get(tid)
+
+    # traced by the exiting thread itself, reclaimed by its last sched_switch
+    def process_sched_process_exit(self, event):
+        proc = self.exiting_proc(event)
+        if proc is not None:
+            proc.exited = True
+
+    # the thread is gone, unless its last sched_switch was missed
+    def process_sched_process_free(self, event):
+        proc = self.exiting_proc(event)
+        if proc is None:
+            return
+
+        if proc.duration is None:
+            self.reclaim(proc)
+        else:
+            proc.exited = True
+
+    # The thread runs another program from now on, under a new comm. A
+    # thread other than the leader of its process takes the tid of the
+    # leader over, the leader being gone.
+    def process_sched_process_exec(self, event):
+        # for 'perf' tool
+        try:
+            tid = event['tid']
+            old_tid = event['old_tid']
+        except KeyError:
+            tid = event['pid']
+            old_tid = event['old_pid']
+
+        if old_tid != tid:
+            leader = self.state.tids.get(tid)
+            if leader is not None:
+                self.reclaim(leader)
+
+        proc = self.state.tids.get(old_tid)
+        if proc is None:
+            return
+
+        for callback in self.bus.thread_end:
+            callback(proc)
+
+        if old_tid != tid:
+            del self.state.tids[old_tid]
+            self.state.tgids.pop(old_tid, None)
+
+            proc.tid = tid
+            self.state.tids[tid] = proc
+
+        comm = os.path.basename(event['filename'])
+        proc.name = comm[:TASK_COMM_LEN - 1]
+
+    # the threads already running when an lttng session started
+    def process_statedump_process(self, event):
+        self.set_tgid(event['tid'], event['pid'])
+
     # skip and ignore 0 (idle processes)
     def process_sched_switch(self, event):
         timestamp = event.timestamp
@@ -38,20 +153,17 @@ class SchedAnalyser(Analyser):
             # the first meeting of sched_out event without sched_in.
             # consider this time as starting from beginning.
             if prev_tid not in self.state.tids:
-                self.state.tids[prev_tid] = state.Process(prev_tid, prev_comm)
+                self.state.tids[prev_tid] = state.Process(prev_tid, prev_comm,
+                                            self.state.tgids.get(prev_tid))
 
                 proc = self.state.tids[prev_tid]
-                proc.duration = state.Duration(self.begin_ts)
-                proc.irq_stolen_duration = state.Duration(None)
-                proc.softirq_stolen_duration = state.Duration(None)
+                proc.switch_in(self.begin_ts)
 
             proc = self.state.tids[prev_tid]
 
             # missing sched_in trace event, exclude this time.
             if proc.duration is None:
-                proc.duration = state.Duration(timestamp)
-                proc.irq_stolen_duration = state.Duration(None)
-                proc.softirq_stolen_duration = state.Duration(None)
+                proc.switch_in(timestamp)
 
             proc.duration.update(timestamp)
 
@@ -60,21 +172,22 @@ class SchedAnalyser(Analyser):
             if current_syscall is not None:
                 current_syscall.waiting_duration.begin(timestamp)
 
-            self.notify('sched_out', cpu=cpu, proc=proc)
+            for callback in self.bus.sched_out:
+                callback(cpu, proc)
 
-            proc.duration = None
-            proc.irq_stolen_duration = None
-            proc.softirq_stolen_duration = None
+            proc.switch_out()
+
+            if proc.exited:
+                self.reclaim(proc)
 
         if next_tid != 0:
             if next_tid not in self.state.tids:
-                self.state.tids[next_tid] = state.Process(next_tid, next_comm)
+                self.state.tids[next_tid] = state.Process(next_tid, next_comm,
+                                            self.state.tgids.get(next_tid))
 
             proc = self.state.tids[next_tid]
-            proc.duration = state.Duration(timestamp)
-            # see irq_analyser
-            proc.irq_stolen_duration = state.Duration(None)
-            proc.softirq_stolen_duration = state.Duration(None)
+            # stolen durations: see irq_analyser
+            proc.switch_in(timestamp)
 
             cpu.current_proc = self.state.tids[next_tid]
 
@@ -82,5 +195,8 @@ class SchedAnalyser(Analyser):
             current_syscall = proc.current_syscall
             if current_syscall is not None:
                 current_syscall.waiting_duration.accumulate(timestamp)
+
+            for callback in self.bus.sched_in:
+                callback(cpu, proc)
         else:
             cpu.current_proc = None
@@ -1,11 +1,170 @@
 from .analyser_runner import AnalyserRunner
+from .parallel_runner import ParallelAnalyserRunner
+from .columnar_engine import ColumnarAnalyserRunner
+from .live_runner import LiveAnalyserRunner
+from .checkpoint import Checkpoint, load_checkpoint
+
+# How a StatCollector runs over its trace, the collectors attached to it
+# sharing the run:
+#   jobs, windows      worker processes and time windows of the parallel
+#                      runner
+#   begin_ts, end_ts   analysed time range, None for the trace bounds
+#   engine             'python', or 'numpy' for the columnar engine
+#   cache              ResultCache the results are looked up in and stored
+#                      to, None for none
+#   event_cache        whether to read the events from the event cache
+#   live_source        LiveAnalyserRunner source when following a trace
+#                      being written, reporting every 'live_interval' seconds
+#   source             events read from this source instead of the trace at
+#                      the collector's path, see event_source
+#   backend            what reads the trace at that path otherwise, see
+#                      TRACE_BACKENDS
+#   profiler           times the serial run when given, see RunProfiler
+#   checkpoint         file the run resumes from when it exists, and saves
+#                      its Checkpoint to, to analyse a rotated or appended
+#                      trace chunk by chunk
+class RunOptions:
+    def __init__(self, jobs=1, windows=1, begin_ts=None, end_ts=None,
+                 engine='python', cache=None, event_cache=False,
+                 live_source=None, live_interval=1.0, source=None,
+                 backend='babeltrace', profiler=None, checkpoint=None):
+        self.jobs = jobs
+        self.windows = windows
+        self.time_range = (begin_ts, end_ts)
+        self.engine = engine
+        self.cache = cache
+        self.event_cache = event_cache
+        self.live_source = live_source
+        self.live_interval = live_interval
+        self.source = source
+        self.backend = backend
+        self.profiler = profiler
+        self.checkpoint = checkpoint
+
+    # whether the parallel runner is asked for
+    def parallel(self):
+        return self.jobs > 1 or self.windows > 1
 
 class StatCollector:
-    def __init__(self, path, notifiers):
-        self.analyser_runner = AnalyserRunner(path, notifiers, self)
+    def __init__(self, path, notifiers, options=None):
+        self.path = path
+        self.notifiers = notifiers
+
+        # see RunOptions
+        self.options = RunOptions() if options is None else options
+
+        # other collectors fed by the same pass over the trace, see attach()
+        self.attached = []
+
+        # opening the trace is left to run(), results may come from the cache
+        self.analyser_runner = None
+
+    # has 'stat_collector' computed in the same pass over the trace as this
+    # one, e.g. a timeline along with the usage report. Only its
+    # notifications and begin/end hooks are used, the options of the run
+    # (time range, engine...) being the ones of this collector.
+    def attach(self, stat_collector):
+        self.attached.append(stat_collector)
+
+    # raises ValueError when the numpy engine or the parallel runner is asked
+    # for and can't do the run, rather than running the serial analysis
+    # instead. Both hand their results to merge_shards(), which attached
+    # collectors and the profiler don't take part in, and they keep no State
+    # to checkpoint.
+    def check_options(self):
+        options = self.options
+        if options.live_source is not None or \
+           (options.engine != 'numpy' and not options.parallel()):
+            return
+
+        if self.shard_options() is None:
+            raise ValueError('%s only runs the serial analysis' %
+                             type(self).__name__)
+        elif self.attached:
+            raise ValueError('%s only runs the serial analysis' %
+                             type(self.attached[0]).__name__)
+        elif options.profiler is not None:
+            raise ValueError('the profiler only times the serial analysis')
+        elif options.checkpoint is not None:
+            raise ValueError('checkpoints are only saved by the serial '
+                             'analysis')
+        elif options.parallel() and options.source is not None:
+            raise ValueError('event sources are only read by the serial '
+                             'analysis')
+        elif options.parallel() and options.engine == 'numpy':
+            raise ValueError('the numpy engine runs in a single process')
+
+    def new_analyser_runner(self):
+        options = self.options
+        begin_ts, end_ts = options.time_range
+
+        if options.live_source is not None:
+            return LiveAnalyserRunner(options.live_source, self.notifiers,
+                                      self, options.live_interval)
+        elif options.engine == 'numpy':
+            return ColumnarAnalyserRunner(self.path, self.notifiers, self,
+                                          begin_ts, end_ts,
+                                          options.event_cache, options.source,
+                                          options.backend)
+        elif options.parallel():
+            return ParallelAnalyserRunner(self.path, self.notifiers, self,
+                                          options.jobs, options.windows,
+                                          begin_ts, end_ts, options.backend)
+
+        return AnalyserRunner(self.path, self.notifiers, self,
+                              begin_ts, end_ts, options.event_cache,
+                              options.source, options.backend)
 
     def run(self):
-        self.analyser_runner.run()
+        self.check_options()
+
+        options = self.options
+        stat_collectors = [self] + self.attached
+
+        resume = None
+        if options.checkpoint is not None:
+            resume = load_checkpoint(options.checkpoint)
+
+        # the results of every collector are cached together, but for resumed
+        # runs which depend on the previous chunks
+        cache_options = None
+        if options.cache is not None and options.live_source is None and \
+           options.source is None and options.profiler is None and \
+           options.checkpoint is None:
+            cache_options = [sc.cache_options() for sc in stat_collectors]
+            if None in cache_options:
+                cache_options = None
+
+        if cache_options is not None:
+            cache_key = options.cache.key(self.path, cache_options)
+
+            results = options.cache.load(cache_key)
+            if results is not None:
+                for sc, result in zip(stat_collectors, results):
+                    sc.restore_result(result)
+                return
+
+        self.analyser_runner = self.new_analyser_runner()
+        for sc in self.attached:
+            self.analyser_runner.attach(sc)
+
+        if resume is not None:
+            self.analyser_runner.resume_from(resume)
+
+        try:
+            self.analyser_runner.run()
+        except BaseException:
+            for sc in stat_collectors:
+                sc.on_abort_analyse()
+            raise
+
+        if options.checkpoint is not None:
+            Checkpoint.from_runner(self.analyser_runner).save(
+                                                        options.checkpoint)
+
+        if cache_options is not None:
+            options.cache.store(cache_key, [sc.cached_result()
+                                            for sc in stat_collectors])
 
     def on_begin_analyse(self, timestamp):
         pass
@@ -13,5 +172,34 @@ class StatCollector:
     def on_end_analyse(self, timestamp):
         pass
 
+    # the run raised, e.g. was interrupted, on_end_analyse() not being called
+    def on_abort_analyse(self):
+        pass
+
+    # (shard collector class, its keyword arguments) used by parallel runners
+    def shard_options(self):
+        return None
+
+    def merge_shards(self, results):
+        pass
+
+    # what the results depend on besides the trace, None when they can't be
+    # cached
+    def cache_options(self):
+        return None
+
+    def cached_result(self):
+        return None
+
+    def restore_result(self, result):
+        pass
+
+    # clears the results, for live runners reporting on each interval
+    def reset_stats(self):
+        pass
+
+    def report_live(self, begin_ts, end_ts):
+        self.print_result()
+
     def print_result(self):
         pass
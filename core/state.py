@@ -1,9 +1,21 @@
 class State:
+    __slots__ = ('cpus', 'tids', 'tgids')
+
     def __init__(self):
         self.cpus = {}
         self.tids = {}
 
+        # tid -> tgid, from the fork and statedump events when traced
+        self.tgids = {}
+
+# The analysers don't allocate a record per event: a cpu reuses the same Irq
+# and SoftIrq for each interrupt it runs, and a process the same Durations
+# for each timeslice and the same Syscall for each syscall. A record handed
+# to a notifier is only valid until the notifier returns.
 class Cpu():
+    __slots__ = ('cpu_id', 'current_proc', 'current_irq', 'current_softirq',
+                 'irq', 'softirq')
+
     def __init__(self, cpu_id):
         self.cpu_id = cpu_id
 
@@ -11,18 +23,86 @@ class Cpu():
         self.current_irq = None
         self.current_softirq = None
 
+        # reused by enter_irq() and enter_softirq()
+        self.irq = None
+        self.softirq = None
+
+    def enter_irq(self, name, irq, timestamp):
+        if self.irq is None:
+            self.irq = Irq(name, irq)
+
+        self.irq.reset(name, irq, timestamp)
+        self.current_irq = self.irq
+
+        return self.irq
+
+    def enter_softirq(self, vec, timestamp):
+        if self.softirq is None:
+            self.softirq = SoftIrq(vec)
+
+        self.softirq.reset(vec, timestamp)
+        self.current_softirq = self.softirq
+
+        return self.softirq
+
 class Process():
-    def __init__(self, tid, name):
+    __slots__ = ('tid', 'tgid', 'name', 'exited', 'current_syscall',
+                 'duration', 'irq_stolen_duration', 'softirq_stolen_duration',
+                 'timeslice_durations', 'syscall')
+
+    # 'tgid' is None until known
+    def __init__(self, tid, name, tgid=None):
         self.tid = tid
+        self.tgid = tgid
         self.name = name
 
+        # exited while running, reclaimed once switched out
+        self.exited = False
+
         self.current_syscall = None
 
         self.duration = None
         self.irq_stolen_duration = None
         self.softirq_stolen_duration = None
 
+        # reused by switch_in() and enter_syscall()
+        self.timeslice_durations = None
+        self.syscall = None
+
+    # starts a timeslice at 'timestamp', nothing stolen from it yet
+    def switch_in(self, timestamp):
+        if self.timeslice_durations is None:
+            self.timeslice_durations = (Duration(None), Duration(None),
+                                        Duration(None))
+
+        duration, irq_stolen_duration, softirq_stolen_duration = \
+                                                    self.timeslice_durations
+        duration.reset(timestamp)
+        irq_stolen_duration.reset(None)
+        softirq_stolen_duration.reset(None)
+
+        self.duration = duration
+        self.irq_stolen_duration = irq_stolen_duration
+        self.softirq_stolen_duration = softirq_stolen_duration
+
+    def switch_out(self):
+        self.duration = None
+        self.irq_stolen_duration = None
+        self.softirq_stolen_duration = None
+
+    def enter_syscall(self, name, timestamp):
+        if self.syscall is None:
+            self.syscall = Syscall(name)
+
+        self.syscall.reset(name, timestamp)
+        self.current_syscall = self.syscall
+
+        return self.syscall
+
 class Syscall():
+    __slots__ = ('name', 'duration', 'waiting_duration',
+                 'irq_stolen_duration', 'softirq_stolen_duration')
+
     def __init__(self, name):
         self.name = name
         self.duration = None
@@ -31,13 +111,36 @@ class Syscall():
         self.irq_stolen_duration = Duration(None)
         self.softirq_stolen_duration = Duration(None)
 
+    def reset(self, name, timestamp):
+        self.name = name
+
+        if self.duration is None:
+            self.duration = Duration(timestamp)
+        else:
+            self.duration.reset(timestamp)
+
+        self.waiting_duration.reset(None)
+        self.irq_stolen_duration.reset(None)
+        self.softirq_stolen_duration.reset(None)
+
 class Irq():
+    __slots__ = ('name', 'irq', 'duration')
+
     def __init__(self, name, irq):
         self.name = name
         self.irq = irq
 
         self.duration = None
 
+    def reset(self, name, irq, timestamp):
+        self.name = name
+        self.irq = irq
+
+        if self.duration is None:
+            self.duration = Duration(timestamp)
+        else:
+            self.duration.reset(timestamp)
+
 softirq_to_name = {
     0 : 'HI_TASKLET',
     1 : 'Timer',
@@ -52,18 +155,37 @@ softirq_to_name = {
 }
 
 class SoftIrq():
+    __slots__ = ('name', 'vec', 'duration', 'irq_stolen_duration')
+
     def __init__(self, vec):
-        self.name = softirq_to_name[vec]
+        self.name = softirq_to_name.get(vec)
         self.vec = vec
 
         self.duration = None
         self.irq_stolen_duration = Duration(None)
 
+    def reset(self, vec, timestamp):
+        self.name = softirq_to_name.get(vec)
+        self.vec = vec
+
+        if self.duration is None:
+            self.duration = Duration(timestamp)
+        else:
+            self.duration.reset(timestamp)
+
+        self.irq_stolen_duration.reset(None)
+
 class Duration:
+    __slots__ = ('begin_ts', 'duration')
+
     def __init__(self, timestamp):
         self.begin_ts = timestamp
         self.duration = 0
 
+    def reset(self, timestamp):
+        self.begin_ts = timestamp
+        self.duration = 0
+
     def begin(self, timestamp):
         self.begin_ts = timestamp
 
@@ -72,7 +194,6 @@ class Duration:
             self.begin_ts = timestamp
 
         self.duration = timestamp - self.begin_ts
-        self.begin_ts = None
 
     def accumulate(self, timestamp):
 
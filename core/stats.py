@@ -1,38 +1,129 @@
+import math
 import sys
 
+# durations are binned into log2 buckets split in HISTOGRAM_SUB_BUCKETS, so
+# a percentile estimate is within ~2.2% of the real value.
+HISTOGRAM_SUB_BUCKETS = 32
+
+def histogram_bucket(duration):
+    if duration < 1:
+        return -1
+
+    return int(math.log2(duration) * HISTOGRAM_SUB_BUCKETS)
+
+def histogram_bucket_value(bucket):
+    if bucket < 0:
+        return 0
+
+    return 2 ** ((bucket + 0.5) / HISTOGRAM_SUB_BUCKETS)
+
 class Stats:
     def __init__(self):
         pass
 
 class DurationStats:
-    def __init__(self):
+    def __init__(self, keep_intervals=False):
         self.min_duration = sys.maxsize
         self.max_duration = 0
         self.sum = 0
+        self.count = 0
 
-        self.duration_list = []
+        # Welford's running mean and sum of squared differences
+        self.mean = 0.0
+        self.m2 = 0.0
 
-    @property
-    def count(self):
-        return len(self.duration_list)
+        self.histogram = {}
+
+        # every (begin_ts, duration) is only kept on request
+        self.duration_list = [] if keep_intervals else None
 
     @property
     def average(self):
         if self.count == 0:
             return 0
 
-        return self.sum / len(self.duration_list)
+        return self.sum / self.count
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return 0
+
+        return self.m2 / self.count
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    @property
+    def p999(self):
+        return self.percentile(99.9)
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return 0
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                break
+
+        value = histogram_bucket_value(bucket)
+
+        return min(max(value, self.min_duration), self.max_duration)
 
     def update(self, begin_ts, duration):
-        self.duration_list.append((begin_ts, duration))
+        if self.duration_list is not None:
+            self.duration_list.append((begin_ts, duration))
 
+        self.count += 1
         self.sum += duration
 
+        delta = duration - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (duration - self.mean)
+
+        bucket = histogram_bucket(duration)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
         if self.min_duration > duration:
             self.min_duration = duration
         if self.max_duration < duration:
             self.max_duration = duration
 
+    def merge(self, other):
+        if other.count == 0:
+            return
+
+        if self.duration_list is not None and other.duration_list is not None:
+            self.duration_list.extend(other.duration_list)
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+
+        self.count = count
+        self.sum += other.sum
+
+        for bucket, bucket_count in other.histogram.items():
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + bucket_count
+
+        if self.min_duration > other.min_duration:
+            self.min_duration = other.min_duration
+        if self.max_duration < other.max_duration:
+            self.max_duration = other.max_duration
+
     def __lt__(self, other):
         try:
             lt = self.sum < other.sum
@@ -40,27 +131,54 @@ class DurationStats:
         except:
             pass
 
+# A running sum and count, for totals nothing else is reported of.
+class Total:
+    __slots__ = ('sum', 'count')
+
+    def __init__(self):
+        self.sum = 0
+        self.count = 0
+
+    def add(self, duration):
+        self.sum += duration
+        self.count += 1
+
+    def merge(self, other):
+        self.sum += other.sum
+        self.count += other.count
+
 class ProcessStats(DurationStats):
-    def __init__(self, name):
-        super().__init__()
+    def __init__(self, name, keep_intervals=False):
+        super().__init__(keep_intervals)
 
         self.name = name
 
+        # the process of the thread, None when not traced, and which of the
+        # processes having had that tgid
+        self.tgid = None
+        self.generation = 0
+
+    def merge(self, other):
+        super().merge(other)
+
+        if self.tgid is None:
+            self.tgid = other.tgid
+
 class SyscallStats(DurationStats):
-    def __init__(self, name):
-        super().__init__()
+    def __init__(self, name, keep_intervals=False):
+        super().__init__(keep_intervals)
 
         self.name = name
 
 class IrqStats(DurationStats):
-    def __init__(self, name):
-        super().__init__()
+    def __init__(self, name, keep_intervals=False):
+        super().__init__(keep_intervals)
 
         self.name = name
 
 class SoftIrqStats(DurationStats):
-    def __init__(self, name):
-        super().__init__()
+    def __init__(self, name, keep_intervals=False):
+        super().__init__(keep_intervals)
 
         self.name = name
 
@@ -1,16 +1,15 @@
-from .analyser import Analyser
-from . import state
+from .analyser import Analyser, strip_event_name, strip_syscall_name
 
 class SyscallAnalyser(Analyser):
-    def __init__(self, notifiers, state):
+    def __init__(self, bus, state):
         callbacks = {
             'syscall_entry' : self.process_syscall_entry,
             'syscall_exit' : self.process_syscall_exit,
         }
 
-        super().__init__(callbacks, notifiers, state)
+        super().__init__(callbacks, bus, state)
 
-    def process_syscall_entry(self, event):
+    def process_syscall_entry(self, event, syscall_name=None):
         timestamp = event.timestamp
         cpu_id = event['cpu_id']
 
@@ -24,21 +23,11 @@ class SyscallAnalyser(Analyser):
         if current_proc is None:
             return
 
-        # for 'perf' tool
-        event_name = event.name
-        split_event_name = event.name.split(':')
-        if len(split_event_name) > 1:
-            event_name = split_event_name[1].strip()
+        # resolved once per event name by the dispatcher
+        if syscall_name is None:
+            syscall_name = strip_syscall_name(strip_event_name(event.name))
 
-        syscall_name = event_name
-        if event_name.startswith('sys_enter_'):
-            syscall_name = syscall_name[len('sys_enter_'):]
-        elif event_name.startswith('syscall_entry_'):
-            syscall_name = syscall_name[len('syscall_entry_'):]
-
-        current_proc.current_syscall = state.Syscall(syscall_name)
-        current_syscall = current_proc.current_syscall
-        current_syscall.duration = state.Duration(timestamp)
+        current_proc.enter_syscall(syscall_name, timestamp)
 
     def process_syscall_exit(self, event):
         timestamp = event.timestamp
@@ -58,6 +47,7 @@ class SyscallAnalyser(Analyser):
         current_syscall = current_proc.current_syscall
         current_syscall.duration.update(timestamp)
 
-        self.notify('syscall_exit', cpu=cpu, syscall=current_syscall)
+        for callback in self.bus.syscall_exit:
+            callback(cpu, current_syscall)
 
         current_proc.current_syscall = None
@@ -0,0 +1,294 @@
+import mmap
+import os
+import re
+
+from .event_columns import ColumnEvent
+
+# Lines of the text dumps TextTraceSource reads, e.g.
+# perf script:
+#   bash  4321 [001]  5678.901234: sched:sched_switch: prev_comm=bash ...
+#   bash  4321 [001]  5678.902000: raw_syscalls:sys_enter: NR 0 (3, ...)
+# ftrace / trace-cmd report:
+#   bash-4321  [001] d..2.  5678.901234: sched_switch: prev_comm=bash ...
+#   bash-4321  [001]  5678.901234: sched_switch: bash:4321 [120] S ==> ...
+# that is: the cpu in brackets, the timestamp in seconds ending the header,
+# then the event name, with or without its subsystem, and its fields.
+
+# the end of the header: the cpu, the ftrace flags if any and the timestamp.
+# Matched rather than looked for by the first ' [', comms holding brackets.
+HEADER_RE = re.compile(r' \[(\d+)\]\s+(?:\S+\s+)?(\d+\.\d+): ')
+
+# only the lines holding one of these are parsed at all
+LINE_MARKERS = (b'sched_switch', b'sched_process', b'irq', b'sys_e')
+
+# how far from the end of the file the last event is looked for
+TAIL_SIZE = 64 * 1024
+
+# binary search for a timestamp stops within that many bytes of it
+SEEK_GRANULE = 64 * 1024
+
+def parse_timestamp(text):
+    seconds, _, fraction = text.partition('.')
+
+    return int(seconds) * 1000000000 + int((fraction + '000000000')[:9])
+
+# comm and tid of a 'bash:4321 [120] S' sched_switch plugin side
+def parse_task(text):
+    task = text.strip()
+    bracket = task.rfind(' [')
+    if bracket >= 0:
+        task = task[:bracket]
+
+    comm, _, tid = task.rpartition(':')
+
+    return comm, int(tid)
+
+def parse_sched_switch(fields):
+    if 'prev_comm=' not in fields:
+        prev, _, next_ = fields.partition(' ==> ')
+        prev_comm, prev_tid = parse_task(prev)
+        next_comm, next_tid = parse_task(next_)
+    else:
+        # comms may hold spaces, the pid following them delimits them
+        begin = fields.index('prev_comm=') + len('prev_comm=')
+        end = fields.index(' prev_pid=', begin)
+        prev_comm = fields[begin:end]
+        prev_tid = int(fields[end + len(' prev_pid='):].split(None, 1)[0])
+
+        begin = fields.index('next_comm=', end) + len('next_comm=')
+        end = fields.index(' next_pid=', begin)
+        next_comm = fields[begin:end]
+        next_tid = int(fields[end + len(' next_pid='):].split(None, 1)[0])
+
+    return {
+        'prev_comm' : prev_comm,
+        'prev_tid' : prev_tid,
+        'next_comm' : next_comm,
+        'next_tid' : next_tid,
+    }
+
+def parse_key_values(fields):
+    values = {}
+    for item in fields.split():
+        key, _, value = item.partition('=')
+        if _:
+            values[key] = value
+
+    return values
+
+def parse_irq_entry(fields):
+    values = parse_key_values(fields)
+
+    return {'irq' : int(values['irq']), 'name' : values.get('name')}
+
+def parse_irq_exit(fields):
+    values = parse_key_values(fields)
+
+    return {'irq' : int(values['irq']), 'ret' : values.get('ret')}
+
+def parse_softirq(fields):
+    values = parse_key_values(fields)
+
+    return {'vec' : int(values['vec'])}
+
+# sched_process_exit and sched_process_free
+def parse_process(fields):
+    values = parse_key_values(fields)
+
+    return {'pid' : int(values['pid'])}
+
+def parse_process_fork(fields):
+    values = parse_key_values(fields)
+
+    return {'child_pid' : int(values['child_pid'])}
+
+def parse_process_exec(fields):
+    values = parse_key_values(fields)
+
+    return {
+        'filename' : values['filename'],
+        'pid' : int(values['pid']),
+        'old_pid' : int(values['old_pid']),
+    }
+
+# event name -> parser of its fields, besides the syscalls
+FIELD_PARSERS = {
+    'sched_switch' : parse_sched_switch,
+    'irq_handler_entry' : parse_irq_entry,
+    'irq_handler_exit' : parse_irq_exit,
+    'softirq_entry' : parse_softirq,
+    'softirq_exit' : parse_softirq,
+    'sched_process_fork' : parse_process_fork,
+    'sched_process_exit' : parse_process,
+    'sched_process_free' : parse_process,
+    'sched_process_exec' : parse_process_exec,
+}
+
+# A ColumnEvent for 'line' (str) when it's an event the analysers read,
+# else None. raw_syscalls entries only give the syscall number, named
+# 'nr<number>' since the names depend on the architecture. Raises ValueError
+# when the line has no header, or is an event the analysers read whose
+# fields can't be parsed.
+def parse_line(line):
+    match = HEADER_RE.search(line)
+    if match is None:
+        raise ValueError('no [cpu] and timestamp')
+
+    cpu_id = int(match.group(1))
+    timestamp = parse_timestamp(match.group(2))
+    colon = match.end() - 2
+
+    name_end = line.find(': ', colon + 2)
+    if name_end < 0:
+        name_end = len(line)
+    name = line[colon + 2:name_end].strip()
+    name = name[name.rfind(':') + 1:]
+    fields = line[name_end + 2:]
+
+    try:
+        parser = FIELD_PARSERS.get(name)
+        if parser is not None:
+            values = parser(fields)
+        elif name == 'sys_enter':
+            name = 'sys_enter_nr%d' % int(fields.split()[1])
+            values = {}
+        elif name.startswith('sys_enter_') or name.startswith('sys_exit'):
+            values = {}
+        else:
+            return None
+    except (ValueError, IndexError, KeyError) as e:
+        raise ValueError('invalid %s fields: %r' % (name, e))
+
+    values['cpu_id'] = cpu_id
+
+    return ColumnEvent(name, timestamp, values)
+
+# Reads the sched_switch, irq, softirq and syscall events of a 'perf script'
+# or ftrace/trace-cmd text dump.
+#
+# The file is mapped and read line by line, the lines without any of
+# LINE_MARKERS being skipped before being decoded, so that a dump streams in
+# constant memory. A time range is found by a binary search in the file, the
+# dump being in timestamp order.
+#
+# The lines holding a marker which can't be parsed are skipped, and counted
+# by events() in 'unparsed_lines', the first one being kept in
+# 'unparsed_example' to be reported.
+class TextTraceSource:
+    def __init__(self, path):
+        self.path = path
+
+        self.unparsed_lines = 0
+        self.unparsed_example = None
+
+        with open(path, 'rb') as f:
+            # an empty file can't be mapped
+            self.data = b''
+            if os.fstat(f.fileno()).st_size:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    self.data.madvise(mmap.MADV_SEQUENTIAL)
+
+        self.timestamp_begin = self.first_timestamp(0, len(self.data))
+        self.timestamp_end = self.last_timestamp()
+
+    # every event may be one the analysers read
+    def event_names(self):
+        return None
+
+    def lines(self, offset, end=None):
+        data = self.data
+        if end is None:
+            end = len(data)
+
+        while offset < end:
+            line_end = data.find(b'\n', offset, end)
+            if line_end < 0:
+                line_end = end
+
+            line = data[offset:line_end]
+            offset = line_end + 1
+
+            # ftrace header comments, e.g. '_-----=> irqs-off'
+            if line.startswith(b'#'):
+                continue
+
+            for marker in LINE_MARKERS:
+                if marker in line:
+                    break
+            else:
+                continue
+
+            yield line
+
+    # the events of the lines in [offset, end), the unparsed lines being
+    # counted when 'count' is set
+    def parsed(self, offset, end=None, count=False):
+        for line in self.lines(offset, end):
+            line = line.decode('utf-8', 'replace')
+            try:
+                event = parse_line(line)
+            except ValueError as e:
+                if count:
+                    self.unparsed_lines += 1
+                    if self.unparsed_example is None:
+                        self.unparsed_example = (line, e)
+                continue
+
+            if event is not None:
+                yield event
+
+    def first_timestamp(self, offset, end):
+        for event in self.parsed(offset, end):
+            return event.timestamp
+
+        return None
+
+    def last_timestamp(self):
+        offset = max(0, len(self.data) - TAIL_SIZE)
+        while True:
+            timestamp = None
+            line = 0
+            if offset:
+                line = self.data.find(b'\n', offset) + 1
+
+            for event in self.parsed(line):
+                timestamp = event.timestamp
+
+            if timestamp is not None or offset == 0:
+                return timestamp
+
+            offset = max(0, offset - TAIL_SIZE)
+
+    # the beginning of a line before any event at or after 'timestamp'
+    def seek(self, timestamp):
+        low = 0
+        high = len(self.data)
+
+        while high - low > SEEK_GRANULE:
+            middle = (low + high) // 2
+            line = self.data.find(b'\n', middle, high)
+            if line < 0:
+                high = middle
+                continue
+
+            found = self.first_timestamp(line + 1, high)
+            if found is None or found >= timestamp:
+                high = middle
+            else:
+                low = line + 1
+
+        return low
+
+    def events(self, begin_ts=None, end_ts=None):
+        offset = 0
+        if begin_ts is not None:
+            offset = self.seek(begin_ts)
+
+        for event in self.parsed(offset, count=True):
+            if begin_ts is not None and event.timestamp < begin_ts:
+                continue
+            if end_ts is not None and event.timestamp > end_ts:
+                break
+
+            yield event
@@ -0,0 +1,305 @@
+import array
+import csv
+
+from .stat_collector import StatCollector
+
+DEFAULT_BUCKET_WIDTH = 10 * 1000 * 1000
+
+# buckets a Timeline allocates at once
+CHUNK_BUCKETS = 64
+
+# series of a per-cpu timeline, in the order they are stored and written
+CPU_SERIES = ('usage', 'app', 'syscall', 'irq', 'softirq')
+CPU_USAGE, CPU_APP, CPU_SYSCALL, CPU_IRQ, CPU_SOFTIRQ = range(len(CPU_SERIES))
+
+# series of a per-tid timeline, usage being the app time as in the per-tid
+# table
+TID_SERIES = ('usage', 'syscall')
+TID_USAGE, TID_SYSCALL = range(len(TID_SERIES))
+
+# The buckets of every series of a cpu or tid, by chunks of CHUNK_BUCKETS
+# buckets: one array.array of len(series) * CHUNK_BUCKETS values, series
+# after series, per chunk of buckets with some time in it.
+class Timeline:
+    __slots__ = ('series_count', 'chunks')
+
+    def __init__(self, series_count):
+        self.series_count = series_count
+
+        # chunk index -> array of buckets
+        self.chunks = {}
+
+    def add(self, series, bucket, value):
+        index, bucket = divmod(bucket, CHUNK_BUCKETS)
+
+        chunk = self.chunks.get(index)
+        if chunk is None:
+            chunk = array.array('q', bytes(8 * self.series_count *
+                                           CHUNK_BUCKETS))
+            self.chunks[index] = chunk
+
+        chunk[series * CHUNK_BUCKETS + bucket] += value
+
+    # the value of each series in 'bucket', None when its chunk wasn't
+    # allocated
+    def values(self, bucket):
+        index, bucket = divmod(bucket, CHUNK_BUCKETS)
+
+        chunk = self.chunks.get(index)
+        if chunk is None:
+            return None
+
+        return chunk[bucket::CHUNK_BUCKETS].tolist()
+
+# the attributes the timeline CSVs are written from
+TIMELINE_ATTRS = (
+    'origin_ts',
+    'bucket_count',
+    'cpu_timelines',
+    'tid_timelines',
+    'tid_names',
+    'ended_timelines',
+)
+
+# Adds up the time of every interval CpuStatCollector accounts in fixed-width
+# time buckets, per cpu and per tid, so that short bursts are not averaged
+# away over the whole trace. Usually attached to a CpuStatCollector, to get
+# both in one pass.
+#
+# An interval crossing bucket edges is split at the edges. The time stolen by
+# interrupts is subtracted from the buckets it was stolen in, and a syscall
+# is accounted to the cpus and buckets it actually ran in, so that summing
+# the buckets gives the totals of the CpuStatCollector tables (the per-cpu
+# syscall table accounts a whole syscall to the cpu it exits on).
+#
+# The buckets of a cpu or tid are a Timeline, only allocated for the chunks
+# of buckets it ran in, so that short lived threads of a long trace take
+# little memory. The timeline of a thread which ended, e.g. exited or exec'd
+# (see SchedAnalyser), is set aside, a thread reusing its tid getting
+# another one. Intervals are clipped to the analysed range. The timeline
+# needs the end of the analysed range up front, and only works with the
+# serial runner.
+class TimelineCollector(StatCollector):
+    def __init__(self, path, bucket_width=DEFAULT_BUCKET_WIDTH, **kwargs):
+        super().__init__(path, self.get_notifiers(), **kwargs)
+
+        self.bucket_width = bucket_width
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.origin_ts = None
+        self.bucket_count = 0
+
+        # cpu id or tid -> Timeline
+        self.cpu_timelines = {}
+        self.tid_timelines = {}
+        self.tid_names = {}
+
+        # (tid, name, Timeline) of the threads which ended, in that order
+        self.ended_timelines = []
+
+        # per cpu, (begin_ts, end_ts) of the interrupts which stole time
+        # from the running process, and of the irqs which stole time from the
+        # running softirq
+        self.stolen = {}
+        self.softirq_stolen = {}
+
+        # per tid, (syscall entry timestamp, [(cpu id, begin_ts, end_ts,
+        # stolen)]): the timeslices of the current syscall, accounted when it
+        # exits. The Syscall record itself is reused by the next syscall.
+        self.syscall_pieces = {}
+
+    def get_notifiers(self):
+        return {
+            'sched_in' : self.process_sched_in,
+            'sched_out' : self.process_sched_out,
+            'syscall_exit' : self.process_syscall_exit,
+            'irq_exit' : self.process_irq_exit,
+            'softirq_exit' : self.process_softirq_exit,
+            'thread_end' : self.process_thread_end,
+        }
+
+    def cache_options(self):
+        return (type(self).__name__, self.options.time_range,
+                self.bucket_width)
+
+    def cached_result(self):
+        return {attr : getattr(self, attr) for attr in TIMELINE_ATTRS}
+
+    def restore_result(self, result):
+        for attr in TIMELINE_ATTRS:
+            setattr(self, attr, result[attr])
+
+    def on_begin_analyse(self, timestamp):
+        end_ts = self.analyser_runner.end_ts
+
+        self.origin_ts = timestamp
+        self.bucket_count = (end_ts - timestamp) // self.bucket_width + 1
+
+    def cpu_timeline(self, cpu_id):
+        try:
+            return self.cpu_timelines[cpu_id]
+        except KeyError:
+            timeline = self.cpu_timelines[cpu_id] = Timeline(len(CPU_SERIES))
+            return timeline
+
+    def tid_timeline(self, tid):
+        try:
+            return self.tid_timelines[tid]
+        except KeyError:
+            timeline = self.tid_timelines[tid] = Timeline(len(TID_SERIES))
+            return timeline
+
+    # adds 'sign' times the length of [begin_ts, end_ts) to the buckets of
+    # 'series' it overlaps, clipped to the buckets there are
+    def fold(self, timeline, series, begin_ts, end_ts, sign=1):
+        width = self.bucket_width
+
+        begin = max(begin_ts - self.origin_ts, 0)
+        end = min(end_ts - self.origin_ts, self.bucket_count * width)
+        if end <= begin:
+            return
+
+        first = begin // width
+        last = (end - 1) // width
+
+        if first == last:
+            timeline.add(series, first, sign * (end - begin))
+            return
+
+        timeline.add(series, first, sign * ((first + 1) * width - begin))
+        for bucket in range(first + 1, last):
+            timeline.add(series, bucket, sign * width)
+        timeline.add(series, last, sign * (end - last * width))
+
+    # the running time of [begin_ts, end_ts) less the interrupts in it
+    def fold_running(self, timeline, series, begin_ts, end_ts, stolen):
+        self.fold(timeline, series, begin_ts, end_ts)
+
+        for stolen_begin_ts, stolen_end_ts in stolen:
+            if stolen_begin_ts >= begin_ts and stolen_end_ts <= end_ts:
+                self.fold(timeline, series, stolen_begin_ts, stolen_end_ts,
+                          -1)
+
+    def process_sched_in(self, cpu, proc):
+        self.stolen.pop(cpu.cpu_id, None)
+
+    def process_sched_out(self, cpu, proc):
+        begin_ts = proc.duration.begin_ts
+        end_ts = begin_ts + proc.duration.duration
+        stolen = self.stolen.pop(cpu.cpu_id, ())
+
+        timeline = self.cpu_timeline(cpu.cpu_id)
+        self.fold(timeline, CPU_USAGE, begin_ts, end_ts)
+        self.fold_running(timeline, CPU_APP, begin_ts, end_ts, stolen)
+
+        self.tid_names[proc.tid] = proc.name
+        self.fold_running(self.tid_timeline(proc.tid), TID_USAGE,
+                          begin_ts, end_ts, stolen)
+
+        syscall = proc.current_syscall
+        if syscall is None:
+            return
+
+        pieces = self.syscall_pieces.get(proc.tid)
+        if pieces is None or pieces[0] != syscall.duration.begin_ts:
+            pieces = (syscall.duration.begin_ts, [])
+            self.syscall_pieces[proc.tid] = pieces
+
+        pieces[1].append((cpu.cpu_id,
+                          max(begin_ts, syscall.duration.begin_ts), end_ts,
+                          stolen))
+
+    def process_syscall_exit(self, cpu, syscall):
+        proc = cpu.current_proc
+
+        pieces = []
+        previous = self.syscall_pieces.pop(proc.tid, None)
+        if previous is not None and \
+           previous[0] == syscall.duration.begin_ts:
+            pieces = previous[1]
+
+        begin_ts = syscall.duration.begin_ts
+        if proc.duration is not None:
+            begin_ts = max(begin_ts, proc.duration.begin_ts)
+        end_ts = syscall.duration.begin_ts + syscall.duration.duration
+        pieces.append((cpu.cpu_id, begin_ts, end_ts,
+                       self.stolen.get(cpu.cpu_id, ())))
+
+        tid_timeline = self.tid_timeline(proc.tid)
+        for cpu_id, begin_ts, end_ts, stolen in pieces:
+            self.fold_running(self.cpu_timeline(cpu_id), CPU_SYSCALL,
+                              begin_ts, end_ts, stolen)
+            self.fold_running(tid_timeline, TID_SYSCALL,
+                              begin_ts, end_ts, stolen)
+
+    def process_irq_exit(self, cpu, irq):
+        begin_ts = irq.duration.begin_ts
+        end_ts = begin_ts + irq.duration.duration
+
+        self.fold(self.cpu_timeline(cpu.cpu_id), CPU_IRQ, begin_ts, end_ts)
+
+        # see IrqAnalyser for what the time is stolen from
+        if cpu.current_proc is not None:
+            self.stolen.setdefault(cpu.cpu_id, []).append((begin_ts, end_ts))
+        if cpu.current_softirq is not None:
+            self.softirq_stolen.setdefault(cpu.cpu_id, []).append((begin_ts,
+                                                                   end_ts))
+
+    def process_softirq_exit(self, cpu, softirq):
+        begin_ts = softirq.duration.begin_ts
+        end_ts = begin_ts + softirq.duration.duration
+        stolen = self.softirq_stolen.pop(cpu.cpu_id, ())
+
+        self.fold_running(self.cpu_timeline(cpu.cpu_id), CPU_SOFTIRQ,
+                          begin_ts, end_ts, stolen)
+
+        if cpu.current_proc is not None:
+            self.stolen.setdefault(cpu.cpu_id, []).append((begin_ts, end_ts))
+
+    def process_thread_end(self, proc):
+        self.syscall_pieces.pop(proc.tid, None)
+
+        timeline = self.tid_timelines.pop(proc.tid, None)
+        if timeline is not None:
+            self.ended_timelines.append((proc.tid, proc.name, timeline))
+        self.tid_names.pop(proc.tid, None)
+
+    # timestamp each bucket begins at, the last one ending at end_ts
+    def bucket_timestamps(self):
+        return [self.origin_ts + bucket * self.bucket_width
+                for bucket in range(self.bucket_count)]
+
+    # one row per bucket and cpu, with the ns spent in each of CPU_SERIES
+    def write_cpu_csv(self, f):
+        writer = csv.writer(f)
+        writer.writerow(('begin_ts', 'cpu') + CPU_SERIES)
+
+        cpu_ids = sorted(self.cpu_timelines)
+        zeros = [0] * len(CPU_SERIES)
+
+        for bucket, timestamp in enumerate(self.bucket_timestamps()):
+            for cpu_id in cpu_ids:
+                values = self.cpu_timelines[cpu_id].values(bucket)
+                writer.writerow([timestamp, cpu_id] + (values or zeros))
+
+    # one row per bucket and thread the thread ran in, with the ns spent in
+    # each of TID_SERIES. The threads of a reused tid are told apart by their
+    # name, the ended ones coming first.
+    def write_tid_csv(self, f):
+        writer = csv.writer(f)
+        writer.writerow(('begin_ts', 'tid', 'name') + TID_SERIES)
+
+        timelines = self.ended_timelines + \
+                    [(tid, self.tid_names.get(tid), timeline)
+                     for tid, timeline in self.tid_timelines.items()]
+        timelines.sort(key=lambda item: item[0])
+
+        for bucket, timestamp in enumerate(self.bucket_timestamps()):
+            for tid, name, timeline in timelines:
+                values = timeline.values(bucket)
+                if values is None or not any(values):
+                    continue
+
+                writer.writerow([timestamp, tid, name] + values)
@@ -0,0 +1,224 @@
+from .stats import DurationStats
+
+# what is compared for every row, cpu being the percentage of the analysed
+# range the row took
+DIFF_METRICS = ('cpu', 'count', 'average', 'max', 'p50', 'p99')
+
+# the tables compared, in the order they are printed
+DIFF_CATEGORIES = ('cpu', 'tid', 'syscall', 'irq', 'softirq')
+
+# the metrics a row is significant by, the cpu % and the latencies, and
+# their default absolute thresholds: cpu % points, and ns for the others
+THRESHOLD_METRICS = ('cpu', 'average', 'max', 'p99')
+
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_LATENCY_THRESHOLDS = {
+    'average' : 1000,
+    'max' : 10 * 1000,
+    'p99' : 1000,
+}
+DEFAULT_RELATIVE_THRESHOLD = 5.0
+
+# metric -> (absolute threshold, relative threshold in percent) of each of
+# THRESHOLD_METRICS, the defaults but for those given
+def diff_thresholds(threshold=DEFAULT_THRESHOLD,
+                    relative_threshold=DEFAULT_RELATIVE_THRESHOLD,
+                    latency_thresholds=None):
+    absolute = dict(DEFAULT_LATENCY_THRESHOLDS, cpu=threshold)
+    absolute.update(latency_thresholds or {})
+
+    return {metric : (absolute[metric], relative_threshold)
+            for metric in THRESHOLD_METRICS}
+
+def merged_stats(stats_list):
+    merged = DurationStats()
+    for stats in stats_list:
+        merged.merge(stats)
+
+    return merged
+
+# category -> row name -> DurationStats of a CpuStatCollector. Threads are
+# matched by comm, the threads sharing a comm being added up, so that tids
+# differing between the traces don't matter, and syscalls are added up over
+# every thread.
+def diff_tables(collector):
+    tids = {}
+    for tid, stats, syscall_total, syscall_stats in collector.threads():
+        tids.setdefault(stats.name, []).append(stats)
+
+    syscalls = {}
+    for syscall_stats in collector.thread_syscall_stats():
+        for name, stats in syscall_stats.items():
+            syscalls.setdefault(name, []).append(stats)
+
+    return {
+        'cpu' : {'%d' % cpu : stats for cpu, stats
+                 in collector.per_cpu_usage_stats.items()},
+        'tid' : {name : merged_stats(stats_list)
+                 for name, stats_list in tids.items()},
+        'syscall' : {name : merged_stats(stats_list)
+                     for name, stats_list in syscalls.items()},
+        'irq' : {'%s (%d)' % (stats.name, irq) : stats for irq, stats
+                 in collector.per_irq_usage_stats.items()},
+        'softirq' : {'%s (%d)' % (stats.name, vec) : stats for vec, stats
+                     in collector.per_softirq_usage_stats.items()},
+    }
+
+def stats_metrics(stats, span):
+    if stats is None or stats.count == 0:
+        return dict.fromkeys(DIFF_METRICS, 0)
+
+    return {
+        'cpu' : stats.sum * 100 / span,
+        'count' : stats.count,
+        'average' : stats.average,
+        'max' : stats.max_duration,
+        'p50' : stats.p50,
+        'p99' : stats.p99,
+    }
+
+# the change from 'base' to 'candidate' in percent, None when base is 0
+def relative_change(base, candidate):
+    if base == 0:
+        return 0.0 if candidate == 0 else None
+
+    return (candidate - base) * 100 / base
+
+# A row of both traces, e.g. a syscall, with each metric of both and its
+# change. The impact of a row is the change of its cpu %, in points.
+# 'changed' lists the metrics changing beyond their thresholds, see
+# changed_metrics().
+class DiffRow:
+    __slots__ = ('category', 'name', 'base', 'candidate', 'changed')
+
+    def __init__(self, category, name, base, candidate):
+        self.category = category
+        self.name = name
+        self.base = base
+        self.candidate = candidate
+        self.changed = []
+
+    @property
+    def impact(self):
+        return self.candidate['cpu'] - self.base['cpu']
+
+    def change(self, metric):
+        return self.candidate[metric] - self.base[metric]
+
+    def relative_change(self, metric):
+        return relative_change(self.base[metric], self.candidate[metric])
+
+    # the metrics beyond the noise, 'thresholds' being metric -> (absolute,
+    # relative) (see diff_thresholds()): an absolute change of at least the
+    # absolute threshold and a relative one of at least the relative one
+    def changed_metrics(self, thresholds):
+        changed = []
+        for metric, (threshold, relative_threshold) in thresholds.items():
+            if abs(self.change(metric)) < threshold:
+                continue
+
+            relative = self.relative_change(metric)
+            if relative is None or abs(relative) >= relative_threshold:
+                changed.append(metric)
+
+        return changed
+
+    # the changed metrics which got worse
+    def regressed_metrics(self):
+        return [metric for metric in self.changed if self.change(metric) > 0]
+
+    def to_dict(self):
+        return {
+            'category' : self.category,
+            'name' : self.name,
+            'base' : self.base,
+            'candidate' : self.candidate,
+            'impact' : self.impact,
+            'change' : {metric : self.change(metric)
+                        for metric in DIFF_METRICS},
+            'relative' : {metric : self.relative_change(metric)
+                          for metric in DIFF_METRICS},
+            'changed' : self.changed,
+        }
+
+# The rows of 'base' and 'candidate' (CpuStatCollectors) with a metric
+# changing beyond its noise thresholds ('thresholds', see diff_thresholds(),
+# the defaults when None), as category -> DiffRows, largest impact first. A
+# row missing from a trace counts as 0 there.
+def diff_collectors(base, candidate, thresholds=None):
+    if thresholds is None:
+        thresholds = diff_thresholds()
+
+    base_span = max(base.end_ts - base.begin_ts, 1)
+    candidate_span = max(candidate.end_ts - candidate.begin_ts, 1)
+
+    base_tables = diff_tables(base)
+    candidate_tables = diff_tables(candidate)
+
+    rows = {}
+    for category in DIFF_CATEGORIES:
+        base_table = base_tables[category]
+        candidate_table = candidate_tables[category]
+
+        names = set(base_table) | set(candidate_table)
+
+        category_rows = []
+        for name in names:
+            row = DiffRow(category, name,
+                          stats_metrics(base_table.get(name), base_span),
+                          stats_metrics(candidate_table.get(name),
+                                        candidate_span))
+
+            row.changed = row.changed_metrics(thresholds)
+            if row.changed:
+                category_rows.append(row)
+
+        category_rows.sort(key=lambda row: (-abs(row.impact), row.name))
+        rows[category] = category_rows
+
+    return rows
+
+# the rows which got more expensive or slower
+def find_regressions(rows):
+    return [row for category in DIFF_CATEGORIES for row in rows[category]
+            if row.regressed_metrics()]
+
+def format_relative(relative):
+    if relative is None:
+        return 'new'
+
+    return '%+.1f %%' % relative
+
+# the absolute and relative change of 'metric', e.g. '+1200 (+12.0 %)'
+def format_change(row, metric):
+    return '%+.0f (%s)' % (row.change(metric),
+                           format_relative(row.relative_change(metric)))
+
+def print_diff(rows, top=None):
+    table_row_format = '{:>25} {:>9} {:>9} {:>9} {:>9} {:>17} {:>17} ' \
+                       '{:>17} {:>17} {:>17}  {}'
+    table_label = table_row_format.format('name', 'cpu% base', 'cpu% cand',
+                                          'cpu% +/-', 'cpu% rel', 'count',
+                                          'avg', 'max', 'p50', 'p99',
+                                          'changed')
+
+    for category in DIFF_CATEGORIES:
+        print('=== %s Changes ===' % category.capitalize())
+        print(table_label)
+
+        for row in rows[category][:top]:
+            table_content = table_row_format.format(
+                row.name,
+                '%.2f' % row.base['cpu'],
+                '%.2f' % row.candidate['cpu'],
+                '%+.2f' % row.impact,
+                format_relative(row.relative_change('cpu')),
+                format_change(row, 'count'),
+                format_change(row, 'average'),
+                format_change(row, 'max'),
+                format_change(row, 'p50'),
+                format_change(row, 'p99'),
+                ', '.join(row.changed))
+
+            print(table_content)
+        print('')
@@ -0,0 +1,52 @@
+import re
+
+TIME_UNITS = {
+    'ns' : 1,
+    'us' : 1000,
+    'ms' : 1000 * 1000,
+    's' : 1000 * 1000 * 1000,
+}
+
+TRACE_TIME_RE = re.compile(r'^(\+)?(\d+(?:\.\d*)?)(ns|us|ms|s)?$')
+
+class TimeRangeError(ValueError):
+    pass
+
+# A point in a trace given by the user: an absolute timestamp, or an offset
+# from the beginning of the trace.
+class TraceTime:
+    def __init__(self, timestamp, relative=False):
+        self.timestamp = timestamp
+        self.relative = relative
+
+    def __repr__(self):
+        return 'TraceTime(%d, relative=%r)' % (self.timestamp, self.relative)
+
+    def __str__(self):
+        return '%s%dns' % ('+' if self.relative else '', self.timestamp)
+
+    def resolve(self, trace_begin_ts):
+        if self.relative:
+            return trace_begin_ts + self.timestamp
+
+        return self.timestamp
+
+# '<time>[unit]' is an absolute timestamp, '+<time>[unit]' an offset from the
+# beginning of the trace, unit being one of TIME_UNITS (ns by default).
+def parse_trace_time(text):
+    match = TRACE_TIME_RE.match(text.strip())
+    if match is None:
+        raise ValueError('invalid time: %r' % text)
+
+    relative, value, unit = match.groups()
+    scale = TIME_UNITS[unit or 'ns']
+
+    if '.' in value:
+        integer, fraction = value.split('.')
+        fraction = fraction[:len(str(scale)) - 1]
+        timestamp = int(integer) * scale + \
+                    int(fraction or '0') * scale // 10 ** len(fraction)
+    else:
+        timestamp = int(value) * scale
+
+    return TraceTime(timestamp, relative is not None)
@@ -0,0 +1,75 @@
+import copy
+import unittest
+
+from core.benchmark import run_benchmark, find_regressions, numpy_available
+from core.benchmark import TARGETS, BENCHMARK_VERSION
+
+def benchmark_report(results):
+    return {
+        'version' : BENCHMARK_VERSION,
+        'events' : 1000,
+        'results' : results,
+    }
+
+def benchmark_result(workload, target, events_per_sec, peak_alloc_kb):
+    return {
+        'workload' : workload,
+        'target' : target,
+        'events_per_sec' : events_per_sec,
+        'peak_alloc_kb' : peak_alloc_kb,
+    }
+
+# The measurement of one benchmark, run in this process, and the comparison
+# of a report with a baseline.
+class BenchmarkTest(unittest.TestCase):
+    def test_run(self):
+        for target in TARGETS:
+            if target == 'pipeline-numpy' and not numpy_available():
+                continue
+
+            with self.subTest(target=target):
+                result = run_benchmark(('irq-storm', target, 2000, 1))
+
+                self.assertEqual((result['workload'], result['target']),
+                                 ('irq-storm', target))
+                self.assertGreater(result['events'], 0)
+                self.assertGreater(result['events_per_sec'], 0)
+                self.assertGreater(result['peak_alloc_kb'], 0)
+
+        # the analysers alone are only timed on the events they handle
+        self.assertEqual(run_benchmark(('sched-heavy', 'pipeline', 2000,
+                                        1))['events'], 2000)
+        self.assertLess(run_benchmark(('sched-heavy', 'irq', 2000,
+                                       1))['events'], 2000)
+
+    def test_regressions(self):
+        baseline = benchmark_report([
+            benchmark_result('sched-heavy', 'sched', 100000, 1000),
+            benchmark_result('irq-storm', 'irq', 100000, 1000),
+        ])
+        report = benchmark_report([
+            benchmark_result('sched-heavy', 'sched', 85000, 1040),
+            benchmark_result('irq-storm', 'irq', 120000, 1200),
+            benchmark_result('fan-out', 'pipeline', 1, 10 ** 6),
+        ])
+
+        self.assertEqual(find_regressions(report, baseline, 0.1), [
+            (('sched-heavy', 'sched'), 'events_per_sec', 100000, 85000,
+             -0.15),
+            (('irq-storm', 'irq'), 'peak_alloc_kb', 1000, 1200, 0.2),
+        ])
+        self.assertEqual(find_regressions(report, baseline, 0.25), [])
+
+    def test_incomparable(self):
+        baseline = benchmark_report([])
+
+        for key, value in (('version', BENCHMARK_VERSION - 1),
+                           ('events', 2000)):
+            with self.subTest(key=key):
+                other = copy.deepcopy(baseline)
+                other[key] = value
+                with self.assertRaises(ValueError):
+                    find_regressions(baseline, other, 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import bt2_source
+from core.bt2_source import Bt2Source, METADATA_EVENT_RE
+from core.bt2_source import find_trace_dirs, timestamp_param, is_live_url
+
+METADATA = '''
+event {
+    name = "sched_switch";
+    id = 0;
+    stream_id = 0;
+};
+
+event {
+    name = syscall_entry_read;
+    id = 1;
+};
+'''
+
+# the event of a message, its fields by name
+class Event(dict):
+    def __init__(self, name, fields):
+        super().__init__(fields)
+        self.name = name
+
+# the message and field classes Bt2Source tells apart, the other messages
+# being strings
+class EventMessage:
+    def __init__(self, name, timestamp, fields):
+        self.event = Event(name, fields)
+        self.default_clock_snapshot = mock.Mock(ns_from_origin=timestamp)
+
+class StringField(str):
+    pass
+
+class IntegerField(int):
+    pass
+
+# The parts of the bt2 module a Bt2Source uses, each query and message
+# iterator being recorded.
+def fake_bt2(messages, stream_ranges):
+    bt2 = mock.MagicMock()
+    bt2._EventMessageConst = EventMessage
+    bt2._StringFieldConst = StringField
+    bt2._IntegerFieldConst = IntegerField
+
+    def query(component_class, obj, params):
+        if obj == 'babeltrace.trace-infos':
+            result = [{'stream-infos' : [{'range-ns' : {'begin' : begin,
+                                                        'end' : end}}
+                                         for begin, end in stream_ranges]}]
+        else:
+            result = {'text' : METADATA}
+
+        return mock.Mock(query=mock.Mock(return_value=result))
+
+    bt2.QueryExecutor.side_effect = query
+    bt2.TraceCollectionMessageIterator.side_effect = \
+                        lambda sources, filter_component_specs=(): messages
+
+    return bt2
+
+# Bt2Source over a mocked babeltrace 2 graph, and its helpers.
+class Bt2SourceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = self.tmp_dir.name
+        for trace_dir in ('kernel', os.path.join('ust', 'uid', '1000')):
+            os.makedirs(os.path.join(self.path, trace_dir))
+            with open(os.path.join(self.path, trace_dir, 'metadata'),
+                      'w') as f:
+                f.write(METADATA)
+
+        self.messages = [
+            'stream beginning',
+            EventMessage('sched_switch', 100,
+                         {'prev_tid' : IntegerField(1),
+                          'prev_comm' : StringField('bash')}),
+            EventMessage('syscall_entry_read', 200, {}),
+            'packet end',
+            EventMessage('sched_switch', 300, {}),
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def source(self):
+        bt2 = fake_bt2(self.messages, [(100, 250), (50, 300)])
+        patch = mock.patch.object(bt2_source, 'bt2', bt2)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        return Bt2Source(self.path), bt2
+
+    def test_helpers(self):
+        self.assertEqual(find_trace_dirs(self.path),
+                         [os.path.join(self.path, 'kernel'),
+                          os.path.join(self.path, 'ust', 'uid', '1000')])
+        self.assertEqual(timestamp_param(1234567890123), '1234.567890123')
+        self.assertEqual(timestamp_param(5), '0.000000005')
+        self.assertEqual(METADATA_EVENT_RE.findall(METADATA),
+                         ['sched_switch', 'syscall_entry_read'])
+        self.assertTrue(is_live_url('net://localhost/host/h/session'))
+        self.assertFalse(is_live_url('/traces/net://'))
+
+    def test_missing(self):
+        with mock.patch.object(bt2_source, 'bt2', None):
+            with self.assertRaises(ImportError):
+                Bt2Source(self.path)
+
+    def test_trace(self):
+        source, bt2 = self.source()
+
+        self.assertEqual((source.timestamp_begin, source.timestamp_end),
+                         (50, 300))
+        self.assertEqual(source.event_names(),
+                         {'sched_switch', 'syscall_entry_read'})
+
+        events = list(source.events())
+        self.assertEqual([(event.name, event.timestamp) for event in events],
+                         [('sched_switch', 100), ('syscall_entry_read', 200),
+                          ('sched_switch', 300)])
+
+        # converted to python values on access
+        self.assertEqual(events[0]['prev_tid'], 1)
+        self.assertIs(type(events[0]['prev_tid']), int)
+        self.assertIs(type(events[0]['prev_comm']), str)
+
+        # one ctf.fs source per trace directory, no filter
+        sources, = bt2.TraceCollectionMessageIterator.call_args[0]
+        self.assertEqual(len(sources), 2)
+        self.assertEqual(bt2.TraceCollectionMessageIterator.call_args[1],
+                         {'filter_component_specs' : []})
+
+    def test_range(self):
+        source, bt2 = self.source()
+
+        self.assertEqual([event.timestamp
+                          for event in source.events(150, 250)], [200])
+        bt2.ComponentSpec.from_named_plugin.assert_called_once_with(
+                    'utils', 'trimmer', {'begin' : '0.000000150',
+                                         'end' : '0.000000250'})
+
+if __name__ == '__main__':
+    unittest.main()
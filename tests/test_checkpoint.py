@@ -0,0 +1,85 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from core.checkpoint import Checkpoint, CheckpointError, load_checkpoint
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+
+from .test_cpu_stat_shard import ListSource, FIXTURE, report
+
+# --checkpoint: a trace analysed chunk by chunk, each run going on from the
+# checkpoint of the previous one, and the checkpoint files refused.
+class CheckpointTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(cls.events)))
+        collector.run()
+        cls.report = report(collector)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'checkpoint')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_chunk(self, events):
+        collector = CpuStatCollector(None, options=RunOptions(
+                            source=ListSource(events), checkpoint=self.path))
+        collector.run()
+
+        return collector
+
+    def test_rotated(self):
+        for begin, end in ((0, 7000), (7000, 13000), (13000, None)):
+            collector = self.run_chunk(self.events[begin:end])
+
+        self.assertEqual(report(collector), self.report)
+
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual((checkpoint.begin_ts, checkpoint.end_ts),
+                         (self.events[0].timestamp,
+                          self.events[-1].timestamp))
+        self.assertEqual(checkpoint.collectors, ['CpuStatCollector'])
+
+    def test_appended(self):
+        # the whole trace read again, only the events past the checkpoint
+        # being analysed
+        self.run_chunk(self.events[:10000])
+        collector = self.run_chunk(self.events)
+
+        self.assertEqual(report(collector), self.report)
+
+    def test_refused(self):
+        self.assertIsNone(load_checkpoint(self.path))
+
+        with open(self.path, 'wb') as f:
+            f.write(b'not a pickle')
+        with self.assertRaises(CheckpointError):
+            load_checkpoint(self.path)
+
+        with open(self.path, 'wb') as f:
+            pickle.dump({'version' : -1, 'checkpoint' : None}, f)
+        with self.assertRaises(CheckpointError):
+            load_checkpoint(self.path)
+
+        # a checkpoint of other collectors
+        os.unlink(self.path)
+        self.run_chunk(self.events[:1000])
+        checkpoint = load_checkpoint(self.path)
+        checkpoint.collectors = ['TimelineCollector']
+        checkpoint.save(self.path)
+        with self.assertRaises(CheckpointError):
+            self.run_chunk(self.events[1000:])
+
+        # nothing but the checkpoint left behind by saves
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['checkpoint'])
+
+if __name__ == '__main__':
+    unittest.main()
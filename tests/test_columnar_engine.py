@@ -0,0 +1,73 @@
+import unittest
+
+from core.columnar_engine import numpy
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_source import SyntheticSource
+
+from .test_cpu_stat_shard import ListSource, report
+
+# interrupts nesting in syscalls often enough that some syscalls get negative
+# durations, their time being stolen twice
+FIXTURE = {
+    'cpus' : 3,
+    'threads' : 40,
+    'events' : 20000,
+    'syscall_rate' : 0.5,
+    'block_rate' : 0.8,
+    'irq_rate' : 0.2,
+    'softirq_rate' : 0.2,
+}
+
+def run_report(events, keep_intervals=False, **options):
+    collector = CpuStatCollector(None, keep_intervals,
+                                 RunOptions(source=ListSource(events),
+                                            **options))
+    collector.run()
+
+    return report(collector)
+
+# The numpy engine reporting as the serial analysis, minimums and maximums
+# included.
+@unittest.skipIf(numpy is None, 'the numpy engine requires numpy')
+class ColumnarEngineTest(unittest.TestCase):
+    def test_seeds(self):
+        for seed in (1, 2, 3, 5):
+            with self.subTest(seed=seed):
+                events = list(SyntheticSource(seed=seed, **FIXTURE).events())
+
+                self.assertEqual(run_report(events, engine='numpy'),
+                                 run_report(events))
+
+    def test_negative_max(self):
+        events = list(SyntheticSource(seed=3, **FIXTURE).events())
+        collector = CpuStatCollector(None, options=RunOptions(
+                                engine='numpy', source=ListSource(events)))
+        collector.run()
+
+        stats = [stats for syscall_stats in collector.thread_syscall_stats()
+                 for stats in syscall_stats.values()
+                 if stats.count and stats.sum < 0]
+        self.assertTrue(stats)
+        for syscall in stats:
+            self.assertEqual(syscall.max_duration, 0)
+
+    def test_time_range(self):
+        events = list(SyntheticSource(seed=1, **FIXTURE).events())
+        time_range = {
+            'begin_ts' : events[len(events) // 3].timestamp,
+            'end_ts' : events[len(events) * 2 // 3].timestamp,
+        }
+
+        self.assertEqual(run_report(events, engine='numpy', **time_range),
+                         run_report(events, **time_range))
+
+    def test_keep_intervals(self):
+        events = list(SyntheticSource(seed=2, **FIXTURE).events())
+
+        self.assertEqual(run_report(events, engine='numpy',
+                                    keep_intervals=True),
+                         run_report(events, keep_intervals=True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.cpu_stat_shard import CpuStatShard
+from core.event_columns import traces_lifecycle
+from core.event_source import SyntheticSource
+from core.parallel_runner import split_windows
+
+# syscalls blocking across timeslices and cpus, and interrupts stealing time
+# from them, so that every kind of interval crosses some window boundary
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 20000,
+    'syscall_rate' : 0.5,
+    'block_rate' : 0.3,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+}
+
+# The events of a list, as read from a trace holding the streams of some cpus
+# only.
+class ListSource:
+    def __init__(self, events, cpu_ids=None):
+        self.event_list = [event for event in events
+                           if cpu_ids is None or event['cpu_id'] in cpu_ids]
+
+        self.timestamp_begin = self.event_list[0].timestamp
+        self.timestamp_end = self.event_list[-1].timestamp
+
+    def events(self, begin_ts=None, end_ts=None):
+        for event in self.event_list:
+            if begin_ts is not None and event.timestamp < begin_ts:
+                continue
+            if end_ts is not None and event.timestamp > end_ts:
+                break
+
+            yield event
+
+    def event_names(self):
+        return None
+
+def report(collector):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        collector.print_result()
+
+    return output.getvalue()
+
+# The report of the serial run and of the shards ParallelAnalyserRunner runs
+# for --jobs and --windows, one per cpu stream and window, merged.
+class ShardMergeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+        cls.source = ListSource(cls.events)
+
+        collector = CpuStatCollector(None,
+                                     options=RunOptions(source=cls.source))
+        collector.run()
+        cls.serial_report = report(collector)
+
+    def sharded_report(self, windows, events=None):
+        if events is None:
+            events = self.events
+        begin_ts = events[0].timestamp
+        end_ts = events[-1].timestamp
+
+        results = []
+        for window in split_windows(begin_ts, end_ts, windows):
+            for cpu_id in range(FIXTURE['cpus']):
+                shard = CpuStatShard(None, window, [cpu_id],
+                                     source=ListSource(events, [cpu_id]))
+                shard.run()
+                results.append(shard.result())
+
+        collector = CpuStatCollector(None)
+        collector.on_begin_analyse(begin_ts)
+        collector.merge_shards(results)
+        collector.on_end_analyse(end_ts)
+
+        return report(collector)
+
+    def test_jobs(self):
+        self.assertEqual(self.sharded_report(1), self.serial_report)
+
+    def test_windows(self):
+        for windows in (2, 3, 7):
+            with self.subTest(windows=windows):
+                self.assertEqual(self.sharded_report(windows),
+                                 self.serial_report)
+
+    # the shards merge the threads of a reused tid, ParallelAnalyserRunner
+    # runs the serial analysis instead on traces which may reuse them
+    def test_lifecycle(self):
+        self.assertFalse(traces_lifecycle(
+                                SyntheticSource(**FIXTURE).event_names()))
+
+        source = SyntheticSource(exit_rate=0.05, **FIXTURE)
+        self.assertTrue(traces_lifecycle(source.event_names()))
+
+        events = list(source.events())
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(events)))
+        collector.run()
+        self.assertNotEqual(self.sharded_report(1, events), report(collector))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import event_columns
+from core.event_columns import EventColumns, COLUMNS_HEADER
+from core.event_columns import event_cache_path, load_event_cache
+from core.event_columns import write_event_cache
+from core.event_source import SyntheticSource
+
+from .test_cpu_stat_shard import ListSource
+
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 5000,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+    'exit_rate' : 0.01,
+}
+
+# syscall exits are read back as 'sys_exit', the analysers not telling them
+# apart
+def event_tuples(events):
+    return [('sys_exit' if event.name.startswith('syscall_exit_')
+             else event.name, event.timestamp, sorted(event.fields.items()))
+            for event in events]
+
+# The event cache of a trace directory, written next to it.
+class EventCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'trace')
+        os.mkdir(self.path)
+        with open(os.path.join(self.path, 'metadata'), 'w') as f:
+            f.write('trace')
+
+        self.events = list(SyntheticSource(**FIXTURE).events())
+        self.source = ListSource(self.events)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        columns = write_event_cache(self.path, self.source)
+
+        self.assertTrue(os.path.exists(event_cache_path(self.path)))
+        self.assertEqual(event_tuples(columns.events()),
+                         event_tuples(self.events))
+
+        loaded = load_event_cache(self.path)
+        self.assertEqual(len(loaded), len(self.events))
+        self.assertEqual(loaded.timestamp_begin, self.source.timestamp_begin)
+        self.assertEqual(loaded.timestamp_end, self.source.timestamp_end)
+        self.assertEqual(event_tuples(loaded.events()),
+                         event_tuples(self.events))
+
+    def test_little_endian(self):
+        write_event_cache(self.path, self.source)
+
+        with open(event_cache_path(self.path), 'rb') as f:
+            f.seek(COLUMNS_HEADER.size)
+            first_timestamp = f.read(8)
+
+        self.assertEqual(int.from_bytes(first_timestamp, 'little'),
+                         self.events[0].timestamp)
+
+    def test_out_of_date(self):
+        write_event_cache(self.path, self.source)
+        self.assertIsNotNone(load_event_cache(self.path))
+
+        with open(os.path.join(self.path, 'metadata'), 'a') as f:
+            f.write(' grown')
+
+        self.assertIsNone(load_event_cache(self.path))
+
+    def test_not_an_event_cache(self):
+        with open(event_cache_path(self.path), 'wb') as f:
+            f.write(b'garbage')
+
+        self.assertIsNone(load_event_cache(self.path))
+
+    def test_unwritable(self):
+        # the columns are used from memory rather than decoding again
+        with mock.patch.object(EventColumns, 'save',
+                               side_effect=PermissionError):
+            columns = write_event_cache(self.path, self.source)
+
+        self.assertFalse(os.path.exists(event_cache_path(self.path)))
+        self.assertEqual(event_tuples(columns.events()),
+                         event_tuples(self.events))
+
+    def test_save_leaves_no_partial_file(self):
+        columns = EventColumns.from_events(self.events)
+        columns.timestamp_begin = self.source.timestamp_begin
+        columns.timestamp_end = self.source.timestamp_end
+
+        with mock.patch.object(event_columns, 'little_endian',
+                               side_effect=OSError):
+            with self.assertRaises(OSError):
+                columns.save(event_cache_path(self.path), bytes(32))
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['trace'])
+
+    def test_slice(self):
+        columns = EventColumns.from_events(self.events)
+        begin_ts = self.events[1000].timestamp
+        end_ts = self.events[2000].timestamp
+
+        self.assertEqual(event_tuples(columns.slice(begin_ts, end_ts).events()),
+                         event_tuples(event for event in self.events
+                                      if begin_ts <= event.timestamp <= end_ts))
+
+if __name__ == '__main__':
+    unittest.main()
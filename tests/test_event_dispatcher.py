@@ -0,0 +1,89 @@
+import unittest
+
+from core.analyser import Analyser
+from core.event_columns import ColumnEvent
+from core.event_dispatcher import EventDispatcher
+
+# Records the events it's called back for in 'calls', and the names it
+# resolved.
+class RecordingAnalyser(Analyser):
+    def __init__(self, tag, event_names, calls):
+        callbacks = {name : self.recorder(name) for name in event_names}
+        super().__init__(callbacks, None, None)
+
+        self.tag = tag
+        self.calls = calls
+        self.resolved = []
+
+    def recorder(self, name):
+        def record(event, syscall_name=None):
+            self.calls.append((self.tag, name, event.timestamp, syscall_name))
+
+        return record
+
+    def resolve(self, event_name):
+        self.resolved.append(event_name)
+
+        return super().resolve(event_name)
+
+def event(name, timestamp):
+    return ColumnEvent(name, timestamp, {'cpu_id' : 0})
+
+# EventDispatcher resolving the callbacks of each event name once.
+class EventDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.sched = RecordingAnalyser('sched', ('sched_switch',),
+                                       self.calls)
+        self.syscall = RecordingAnalyser('syscall', ('syscall_entry',
+                                                     'syscall_exit',
+                                                     'sched_switch'),
+                                         self.calls)
+        self.dispatcher = EventDispatcher([self.sched, self.syscall])
+
+    def test_resolved_once(self):
+        for timestamp in range(5):
+            self.dispatcher.dispatch(event('sched_switch', timestamp))
+            self.dispatcher.dispatch(event('irq_handler_entry', timestamp))
+
+        self.assertEqual(self.sched.resolved, ['sched_switch',
+                                               'irq_handler_entry'])
+        self.assertEqual(self.dispatcher.routes['irq_handler_entry'], ())
+
+        # in the order of the analysers
+        self.assertEqual(self.calls,
+                         [(tag, 'sched_switch', timestamp, None)
+                          for timestamp in range(5)
+                          for tag in ('sched', 'syscall')])
+
+    def test_syscall_names(self):
+        for name in ('syscall_entry_read', 'sys_enter_write',
+                     'raw_syscalls:sys_enter_openat', 'syscall_exit_read',
+                     'sys_exit'):
+            self.dispatcher.dispatch(event(name, 0))
+
+        # the syscall name is stripped once, when the route is resolved
+        self.assertEqual(self.calls, [
+            ('syscall', 'syscall_entry', 0, 'read'),
+            ('syscall', 'syscall_entry', 0, 'write'),
+            ('syscall', 'syscall_entry', 0, 'openat'),
+            ('syscall', 'syscall_exit', 0, None),
+            ('syscall', 'syscall_exit', 0, None),
+        ])
+
+    def test_subscribed(self):
+        self.assertEqual(self.dispatcher.subscribed(['sched_switch',
+                                                     'sys_enter_read',
+                                                     'irq_handler_entry',
+                                                     'lttng_statedump_end']),
+                         {'sched_switch', 'sys_enter_read'})
+
+        # the routes are kept for dispatch()
+        self.dispatcher.dispatch(event('sys_enter_read', 0))
+        self.assertEqual(self.syscall.resolved, ['sched_switch',
+                                                 'sys_enter_read',
+                                                 'irq_handler_entry',
+                                                 'lttng_statedump_end'])
+
+if __name__ == '__main__':
+    unittest.main()
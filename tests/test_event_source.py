@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+from core import event_source
+from core.event_source import SyntheticSource, open_trace_source
+
+def event_tuples(events):
+    return [(event.name, event.timestamp, sorted(event.fields.items()))
+            for event in events]
+
+# SyntheticSource generating a reproducible and consistent kernel trace, and
+# the trace backends.
+class SyntheticSourceTest(unittest.TestCase):
+    def test_reproducible(self):
+        events = event_tuples(SyntheticSource(events=5000).events())
+
+        self.assertEqual(len(events), 5000)
+        self.assertEqual(event_tuples(SyntheticSource(events=5000).events()),
+                         events)
+        self.assertNotEqual(event_tuples(SyntheticSource(events=5000,
+                                                         seed=1).events()),
+                            events)
+
+    def test_exit_rate_keeps_the_other_events(self):
+        # the draws of the exits only happen when they're enabled
+        events = event_tuples(SyntheticSource(events=5000,
+                                              exit_rate=0).events())
+
+        self.assertEqual(events,
+                         event_tuples(SyntheticSource(events=5000).events()))
+
+    def test_timestamps(self):
+        source = SyntheticSource(events=5000, timestamp_begin=10 ** 12,
+                                 event_gap=500)
+        timestamps = [event.timestamp for event in source.events()]
+
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertGreaterEqual(timestamps[0], source.timestamp_begin)
+        self.assertLess(timestamps[-1], source.timestamp_end)
+        self.assertEqual(source.timestamp_end, 10 ** 12 + 5000 * 500)
+
+    def test_range(self):
+        source = SyntheticSource(events=5000)
+        begin_ts = 1000 * 1000
+        end_ts = 3000 * 1000
+
+        self.assertEqual(event_tuples(source.events(begin_ts, end_ts)),
+                         [event for event in event_tuples(source.events())
+                          if begin_ts <= event[1] <= end_ts])
+
+    def test_consistent(self):
+        source = SyntheticSource(cpus=3, threads=5, events=20000,
+                                 irq_rate=0.1, softirq_rate=0.1,
+                                 exit_rate=0.05)
+        event_names = source.event_names()
+
+        running = {}
+        syscalls = {}
+        irqs = {}
+        for event in source.events():
+            self.assertIn(event.name, event_names)
+            cpu_id = event['cpu_id']
+
+            if event.name == 'sched_switch':
+                self.assertEqual(event['prev_tid'], running.get(cpu_id, 0))
+                self.assertNotIn(event['next_tid'],
+                                 [tid for other, tid in running.items()
+                                  if other != cpu_id and tid != 0])
+                running[cpu_id] = event['next_tid']
+            elif event.name.startswith('syscall_entry_'):
+                tid = running[cpu_id]
+                self.assertNotIn(tid, syscalls)
+                syscalls[tid] = event.name[len('syscall_entry_'):]
+            elif event.name.startswith('syscall_exit_'):
+                self.assertEqual(syscalls.pop(running[cpu_id]),
+                                 event.name[len('syscall_exit_'):])
+            elif event.name == 'irq_handler_entry':
+                self.assertNotIn(cpu_id, irqs)
+                irqs[cpu_id] = event['irq']
+            elif event.name == 'irq_handler_exit':
+                self.assertEqual(irqs.pop(cpu_id), event['irq'])
+            elif event.name == 'sched_process_exit':
+                self.assertEqual(event['tid'], running[cpu_id])
+            elif event.name == 'sched_process_free':
+                syscalls.pop(event['tid'], None)
+
+    def test_backends(self):
+        with self.assertRaises(ValueError):
+            open_trace_source('trace', 'lttng')
+
+        with mock.patch.object(event_source, 'babeltrace', None):
+            with self.assertRaises(ImportError):
+                open_trace_source('trace', 'babeltrace')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.fleet import expand_trace_paths, analyse_fleet, restored_collector
+from core.fleet import FleetRollup
+from core.stat_collector import RunOptions
+
+from .test_cpu_stat_shard import ListSource, report
+from .test_text_trace_source import FIXTURE, dump_lines
+
+# The fleet mode over text dumps, each a host: the traces analysed in a
+# process pool, and their results rolled up.
+class FleetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.hosts = {}
+
+        for seed in range(3):
+            path = os.path.join(cls.tmp_dir.name, 'host%d.txt' % seed)
+            events = list(SyntheticSource(seed=seed, **FIXTURE).events())
+            with open(path, 'w') as f:
+                f.writelines(dump_lines(events, 'ftrace'))
+
+            collector = CpuStatCollector(path, options=RunOptions(
+                                            source=ListSource(events)))
+            collector.run()
+            cls.hosts[path] = collector
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_expand(self):
+        pattern = os.path.join(self.tmp_dir.name, 'host*.txt')
+        missing = os.path.join(self.tmp_dir.name, 'missing')
+        paths = sorted(self.hosts)
+
+        self.assertEqual(expand_trace_paths([pattern, paths[0], missing,
+                                             pattern]),
+                         paths + [missing])
+        self.assertEqual(expand_trace_paths([os.path.join(self.tmp_dir.name,
+                                                          '*.dat')]), [])
+
+    def test_analyse(self):
+        missing = os.path.join(self.tmp_dir.name, 'missing')
+        results = {path : (result, error) for path, result, error
+                   in analyse_fleet(sorted(self.hosts) + [missing],
+                                    RunOptions(), 2)}
+
+        self.assertEqual(results[missing],
+                         (None, 'FileNotFoundError: no such trace'))
+        for path, collector in self.hosts.items():
+            with self.subTest(path=path):
+                result, error = results[path]
+                self.assertIsNone(error)
+                self.assertEqual(report(restored_collector(path, result)),
+                                 report(collector))
+
+    def test_rollup(self):
+        rollup = FleetRollup(top=5)
+        for path, collector in self.hosts.items():
+            rollup.add(path, collector)
+
+        self.assertEqual(rollup.hosts, 3)
+
+        # the busiest of every host's cpus and threads
+        cpus = sorted(((stats.sum / (collector.end_ts - collector.begin_ts),
+                        path, cpu_id)
+                       for path, collector in self.hosts.items()
+                       for cpu_id, stats
+                       in collector.per_cpu_usage_stats.items()),
+                      reverse=True)
+        self.assertEqual(sorted(rollup.cpus, reverse=True), cpus[:5])
+        self.assertEqual(len(rollup.tids), 5)
+
+        # irqs added up across hosts
+        for name, stats in rollup.irqs.items():
+            with self.subTest(irq=name):
+                host_stats = [irq_stats for collector in self.hosts.values()
+                              for irq_stats
+                              in collector.per_irq_usage_stats.values()
+                              if irq_stats.name == name]
+                self.assertEqual(stats.sum, sum(irq_stats.sum
+                                                for irq_stats in host_stats))
+                self.assertEqual(stats.count, sum(irq_stats.count
+                                                  for irq_stats in host_stats))
+                self.assertEqual(rollup.irq_hosts[name], set(self.hosts))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            rollup.print_result()
+        self.assertIn('=== Fleet Rollup (3 hosts) ===', output.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
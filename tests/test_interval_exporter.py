@@ -0,0 +1,123 @@
+import collections
+import os
+import tempfile
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_source import SyntheticSource
+from core.interval_exporter import IntervalExporter, load_intervals
+from core.interval_exporter import INTERVALS_HEADER, CHUNK_HEADER
+from core.interval_exporter import KIND_RUN, KIND_SYSCALL
+from core.interval_exporter import KIND_IRQ, KIND_SOFTIRQ
+
+from .test_cpu_stat_shard import ListSource
+
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 20000,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+}
+
+# A source failing after 'count' events, as an interrupted run.
+class FailingSource(ListSource):
+    def __init__(self, events, count):
+        super().__init__(events)
+        self.count = count
+
+    def events(self, begin_ts=None, end_ts=None):
+        for index, event in enumerate(super().events(begin_ts, end_ts)):
+            if index == self.count:
+                raise RuntimeError('trace read error')
+
+            yield event
+
+# The interval file IntervalExporter writes, next to the usage report.
+class IntervalExporterTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'intervals')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def export(self, source):
+        collector = CpuStatCollector(None, options=RunOptions(source=source))
+        collector.attach(IntervalExporter(None, self.file_path,
+                                          chunk_rows=1000))
+        collector.run()
+
+        return collector
+
+    def test_totals(self):
+        collector = self.export(ListSource(self.events))
+        columns, strings = load_intervals(self.file_path)
+
+        sums = collections.Counter()
+        for kind, cpu_id, duration, waiting, stolen in \
+                zip(columns['kind'], columns['cpu'], columns['duration'],
+                    columns['waiting'], columns['stolen']):
+            if kind == KIND_RUN:
+                sums['app', cpu_id] += duration - stolen
+            elif kind == KIND_SYSCALL:
+                sums['syscall', cpu_id] += duration - waiting - stolen
+            elif kind == KIND_IRQ:
+                sums['irq', cpu_id] += duration
+            elif kind == KIND_SOFTIRQ:
+                sums['softirq', cpu_id] += duration - stolen
+
+        for name, table in (('app', collector.per_cpu_app_usage_stats),
+                            ('syscall', collector.per_cpu_syscall_usage_stats),
+                            ('irq', collector.per_cpu_irq_usage_stats),
+                            ('softirq',
+                             collector.per_cpu_softirq_usage_stats)):
+            for cpu_id, stats in table.items():
+                with self.subTest(table=name, cpu_id=cpu_id):
+                    self.assertEqual(sums[name, cpu_id], stats.sum)
+
+        self.assertEqual({strings[comm] for comm in columns['comm']
+                          if comm >= 0},
+                         {'thread%d' % thread
+                          for thread in range(FIXTURE['threads'])})
+
+    def test_little_endian(self):
+        self.export(ListSource(self.events))
+        columns, strings = load_intervals(self.file_path)
+
+        # the cpu column follows the kind one, padded to 8 bytes
+        with open(self.file_path, 'rb') as f:
+            f.seek(INTERVALS_HEADER.size)
+            count, = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            f.seek((count + 7) & ~7, 1)
+            first_cpu = f.read(8)
+
+        self.assertEqual(count, 1000)
+        self.assertEqual(int.from_bytes(first_cpu, 'little', signed=True),
+                         columns['cpu'][0])
+
+    def test_failed_run(self):
+        with open(self.file_path, 'wb') as f:
+            f.write(b'previous')
+
+        with self.assertRaises(RuntimeError):
+            self.export(FailingSource(self.events, len(self.events) // 2))
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['intervals'])
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(), b'previous')
+
+    def test_not_an_interval_file(self):
+        with open(self.file_path, 'wb') as f:
+            f.write(b'garbage and more garbage')
+
+        with self.assertRaises(ValueError):
+            load_intervals(self.file_path)
+
+if __name__ == '__main__':
+    unittest.main()
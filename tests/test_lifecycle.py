@@ -0,0 +1,197 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_columns import ColumnEvent, EventColumns
+from core.event_source import SyntheticSource
+from core.parallel_runner import ParallelAnalyserRunner
+
+from .test_cpu_stat_shard import ListSource, report
+
+# threads exiting all along, their tids being reused by new threads
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 20000,
+    'syscall_rate' : 0.5,
+    'block_rate' : 0.3,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+    'exit_rate' : 0.05,
+}
+
+def switch(timestamp, prev_tid, prev_comm, next_tid, next_comm, cpu_id=0):
+    return ColumnEvent('sched_switch', timestamp, {
+        'cpu_id' : cpu_id,
+        'prev_tid' : prev_tid,
+        'prev_comm' : prev_comm,
+        'next_tid' : next_tid,
+        'next_comm' : next_comm,
+    })
+
+def lifecycle(name, timestamp, cpu_id=0, **fields):
+    return ColumnEvent(name, timestamp, dict(fields, cpu_id=cpu_id))
+
+# (tid, name, usage count) of every thread the collector reports
+def threads(collector):
+    return sorted((tid, stats.name, stats.count)
+                  for tid, stats, syscall_total, syscall_stats
+                  in collector.threads())
+
+def run_serial(events):
+    collector = CpuStatCollector(None,
+                                 options=RunOptions(source=ListSource(events)))
+    collector.run()
+
+    return collector
+
+# SchedAnalyser telling apart the threads which had the same tid, and freeing
+# the state of those which are gone.
+class SerialLifecycleTest(unittest.TestCase):
+    def test_tid_reuse(self):
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 10, 'a'),
+            lifecycle('sched_process_exit', 2000, tid=10),
+            switch(3000, 10, 'a', 0, 'swapper/0'),
+            lifecycle('sched_process_free', 3500, tid=10),
+            lifecycle('sched_process_fork', 4000, child_tid=10,
+                      child_pid=10),
+            switch(5000, 0, 'swapper/0', 10, 'b'),
+            switch(7000, 10, 'b', 0, 'swapper/0'),
+        ])
+
+        self.assertEqual(threads(collector), [(10, 'a', 1), (10, 'b', 1)])
+        self.assertIn('a (10)', report(collector))
+        self.assertIn('b (10)', report(collector))
+
+    def test_fork_reclaims_missed_exit(self):
+        # 'perf' only gives the tid of the child, as child_pid
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 10, 'a'),
+            switch(2000, 10, 'a', 0, 'swapper/0'),
+            lifecycle('sched_process_fork', 3000, child_pid=10),
+            switch(4000, 0, 'swapper/0', 10, 'b'),
+            switch(5000, 10, 'b', 0, 'swapper/0'),
+        ])
+
+        self.assertEqual(threads(collector), [(10, 'a', 1), (10, 'b', 1)])
+
+    def test_exec_renames(self):
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 10, 'sh'),
+            switch(2000, 10, 'sh', 0, 'swapper/0'),
+            switch(3000, 0, 'swapper/0', 10, 'sh'),
+            lifecycle('sched_process_exec', 3500, tid=10, old_tid=10,
+                      filename='/usr/bin/a_very_long_program_name'),
+            switch(4000, 10, 'sh', 0, 'swapper/0'),
+        ])
+
+        # truncated as the kernel does, TASK_COMM_LEN - 1
+        self.assertEqual(threads(collector),
+                         [(10, 'a_very_long_pro', 1), (10, 'sh', 1)])
+
+    def test_exec_from_other_thread(self):
+        # a thread of the process execs, taking the tid of the leader over
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 10, 'leader'),
+            switch(2000, 10, 'leader', 11, 'worker'),
+            lifecycle('sched_process_exec', 2500, tid=10, old_tid=11,
+                      filename='/bin/prog'),
+            switch(3000, 10, 'worker', 0, 'swapper/0'),
+        ])
+
+        # the timeslice of the worker is accounted to the new program
+        self.assertEqual(threads(collector),
+                         [(10, 'leader', 1), (10, 'prog', 1)])
+        self.assertEqual(list(collector.analyser_runner.state.tids), [10])
+
+    def test_free_reclaims(self):
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 10, 'a'),
+            switch(2000, 10, 'a', 11, 'b'),
+            lifecycle('sched_process_free', 2500, tid=10),
+            # still running: reclaimed once switched out
+            lifecycle('sched_process_free', 2600, tid=11),
+        ])
+        tids = collector.analyser_runner.state.tids
+
+        self.assertNotIn(10, tids)
+        self.assertIn(11, tids)
+        self.assertTrue(tids[11].exited)
+
+        collector = run_serial([
+            switch(1000, 0, 'swapper/0', 11, 'b'),
+            lifecycle('sched_process_free', 2600, tid=11),
+            switch(3000, 11, 'b', 0, 'swapper/0'),
+        ])
+
+        self.assertEqual(collector.analyser_runner.state.tids, {})
+        self.assertEqual(threads(collector), [(11, 'b', 1)])
+
+# The numpy engine, the sharded runner and the event cache reporting as the
+# serial analysis on a trace reusing tids.
+class LifecycleRunnersTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+        cls.serial_report = report(run_serial(cls.events))
+
+    def test_synthetic_reuses_tids(self):
+        collector = run_serial(self.events)
+        names = {}
+        for tid, name, count in threads(collector):
+            names.setdefault(tid, set()).add(name)
+
+        self.assertTrue(any(len(tid_names) > 1
+                            for tid_names in names.values()))
+
+    def test_event_columns(self):
+        columns = EventColumns.from_events(self.events)
+        self.assertTrue(columns.follows_lifecycle())
+        self.assertEqual(report(run_serial(list(columns.events()))),
+                         self.serial_report)
+
+        columns.timestamp_begin = self.events[0].timestamp
+        columns.timestamp_end = self.events[-1].timestamp
+        with tempfile.TemporaryDirectory() as cache_dir:
+            file_path = os.path.join(cache_dir, 'trace.columns')
+            columns.save(file_path, bytes(32))
+            loaded, identity = EventColumns.load(file_path)
+
+            self.assertEqual(report(run_serial(list(loaded.events()))),
+                             self.serial_report)
+
+    def test_numpy(self):
+        collector = CpuStatCollector(None, options=RunOptions(
+                            engine='numpy', source=ListSource(self.events)))
+        collector.run()
+
+        self.assertIsNotNone(collector.analyser_runner.fallback)
+        self.assertEqual(report(collector), self.serial_report)
+
+    def test_sharded(self):
+        source = ListSource(self.events)
+        cpu_streams = {cpu_id : ['channel0_%d' % cpu_id]
+                       for cpu_id in range(FIXTURE['cpus'])}
+
+        with mock.patch('core.analyser_runner.open_trace_source',
+                        return_value=source), \
+             mock.patch('core.parallel_runner.find_cpu_streams',
+                        return_value=cpu_streams), \
+             mock.patch.object(source, 'event_names',
+                               return_value=SyntheticSource(
+                                                **FIXTURE).event_names()):
+            collector = CpuStatCollector('trace',
+                                options=RunOptions(jobs=4, windows=2))
+            collector.run()
+
+        self.assertIsInstance(collector.analyser_runner,
+                              ParallelAnalyserRunner)
+        self.assertIsNotNone(collector.analyser_runner.fallback)
+        self.assertEqual(report(collector), self.serial_report)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import collections
+import time
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_source import SyntheticSource
+from core.live_runner import IteratorSource, IDLE_INTERVALS
+
+from .test_cpu_stat_shard import ListSource
+from .test_lifecycle import switch, lifecycle
+
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 20000,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+}
+
+# totals of the per-tid, per-cpu syscall and per-irq tables
+def totals(collector, counter):
+    for tid, stats in collector.per_tid_usage_stats.items():
+        counter['tid', tid] += stats.sum
+    for cpu_id, stats in collector.per_cpu_syscall_usage_stats.items():
+        counter['syscall', cpu_id] += stats.sum
+    for irq, stats in collector.per_irq_usage_stats.items():
+        counter['irq', irq] += stats.sum
+
+    return counter
+
+# Adds up the reports of every interval instead of printing them.
+class LiveTotals(CpuStatCollector):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.reports = 0
+        self.totals = collections.Counter()
+
+    def report_live(self, begin_ts, end_ts):
+        self.reports += 1
+        totals(self, self.totals)
+
+# events trickling in over several intervals
+def slow_events(events, batch=2000, pause=0.02):
+    for index, event in enumerate(events):
+        if index % batch == 0:
+            time.sleep(pause)
+
+        yield event
+
+# LiveAnalyserRunner reporting on every interval, and bounding its State.
+class LiveRunnerTest(unittest.TestCase):
+    def test_intervals_add_up(self):
+        events = list(SyntheticSource(**FIXTURE).events())
+
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(events)))
+        collector.run()
+
+        live_source = IteratorSource(slow_events(events), max_pending=1000)
+        live = LiveTotals(None, options=RunOptions(live_source=live_source,
+                                                   live_interval=0.05))
+        live.run()
+
+        self.assertGreater(live.reports, 1)
+        self.assertEqual(live.totals, totals(collector, collections.Counter()))
+
+    def live_runner(self):
+        collector = CpuStatCollector(None, options=RunOptions(
+                        live_source=IteratorSource([]), live_interval=0.001))
+        runner = collector.new_analyser_runner()
+        runner.begin_analyse(0)
+
+        return collector, runner
+
+    def test_reclaim_idle(self):
+        collector, runner = self.live_runner()
+        max_idle = int(0.001 * IDLE_INTERVALS * 1e9)
+
+        for event in (switch(1000, 0, 'swapper/0', 10, 'a'),
+                      switch(2000, 10, 'a', 11, 'b'),
+                      switch(max_idle, 11, 'b', 0, 'swapper/0'),
+                      switch(max_idle + 1000, 0, 'swapper/0', 12, 'c')):
+            runner.dispatcher.dispatch(event)
+
+        runner.reclaim_idle(max_idle + 1500)
+
+        # a hasn't run for max_idle, b ran within it, and c is running
+        self.assertEqual(sorted(runner.state.tids), [11, 12])
+
+    def test_exits_traced(self):
+        collector, runner = self.live_runner()
+        max_idle = int(0.001 * IDLE_INTERVALS * 1e9)
+
+        for event in (switch(1000, 0, 'swapper/0', 10, 'a'),
+                      switch(2000, 10, 'a', 0, 'swapper/0'),
+                      lifecycle('sched_process_free', 3000, tid=20)):
+            runner.dispatcher.dispatch(event)
+
+        runner.reclaim_idle(max_idle * 2)
+
+        # reclaimed on sched_process_free only
+        self.assertEqual(sorted(runner.state.tids), [10])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from core.event_source import SyntheticSource
+from core.notification_bus import NotificationBus, NOTIFICATIONS
+from core.stat_collector import StatCollector, RunOptions
+
+from .test_cpu_stat_shard import ListSource, FIXTURE
+
+# Logs every notification it subscribes to in 'log', tagged.
+class LoggingCollector(StatCollector):
+    def __init__(self, tag, log, notifications=NOTIFICATIONS, options=None):
+        self.tag = tag
+        self.log = log
+
+        super().__init__(None, {notification_id :
+                                self.logger(notification_id)
+                                for notification_id in notifications},
+                         options)
+
+    def logger(self, notification_id):
+        def log(*args):
+            self.log.append((self.tag, notification_id, len(args)))
+
+        return log
+
+# NotificationBus and the collectors subscribed to it through an analyser
+# run.
+class NotificationBusTest(unittest.TestCase):
+    def test_subscribe(self):
+        bus = NotificationBus()
+        first = lambda cpu, proc: None
+        second = lambda cpu, proc: None
+        bus.subscribe({'sched_out' : first})
+        bus.subscribe({'sched_out' : second, 'thread_end' : first})
+
+        self.assertEqual(bus.sched_out, [first, second])
+        self.assertEqual(bus.thread_end, [first])
+        self.assertEqual(bus.irq_exit, [])
+
+        with self.assertRaises(ValueError):
+            bus.subscribe({'sched_switch' : first})
+
+    def test_attached(self):
+        log = []
+        source = ListSource(list(SyntheticSource(exit_rate=0.02,
+                                                 **FIXTURE).events()))
+        collector = LoggingCollector('main', log,
+                                     options=RunOptions(source=source))
+        collector.attach(LoggingCollector('attached', log))
+        collector.attach(LoggingCollector('sched', log,
+                                          ('sched_in', 'sched_out')))
+        collector.run()
+
+        self.assertEqual({notification_id for tag, notification_id, args
+                          in log}, set(NOTIFICATIONS))
+
+        # each notification goes to the subscribers in the order they were
+        # attached, with its arguments
+        main = [entry[1:] for entry in log if entry[0] == 'main']
+        self.assertEqual([entry[1:] for entry in log
+                          if entry[0] == 'attached'], main)
+        self.assertEqual([entry[1:] for entry in log if entry[0] == 'sched'],
+                         [entry for entry in main
+                          if entry[0] in ('sched_in', 'sched_out')])
+
+        for index, (tag, notification_id, args) in enumerate(log):
+            if tag == 'main' and notification_id == 'sched_out':
+                self.assertEqual(log[index + 1],
+                                 ('attached', 'sched_out', 2))
+                self.assertEqual(log[index + 2], ('sched', 'sched_out', 2))
+
+        self.assertTrue(all(args == 1 for tag, notification_id, args in log
+                            if notification_id == 'thread_end'))
+
+if __name__ == '__main__':
+    unittest.main()
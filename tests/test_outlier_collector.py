@@ -0,0 +1,65 @@
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_source import SyntheticSource
+from core.outlier_collector import OutlierCollector
+
+from .test_cpu_stat_shard import ListSource
+from .test_columnar_engine import FIXTURE
+
+# The outliers OutlierCollector keeps, against every interval kept by
+# --keep-intervals, some syscalls having a negative duration.
+class OutlierCollectorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        events = list(SyntheticSource(seed=3, **FIXTURE).events())
+
+        cls.collector = CpuStatCollector(None, True, RunOptions(
+                                                source=ListSource(events)))
+        cls.outliers = OutlierCollector(None, {'syscall' : 1000, 'run' : 5,
+                                               'irq' : 3, 'softirq' : 1})
+        cls.collector.attach(cls.outliers)
+        cls.collector.run()
+
+    def check(self, category, durations, count):
+        for key, key_durations in durations.items():
+            with self.subTest(category=category, key=key):
+                expected = sorted(key_durations, reverse=True)[:count]
+                self.assertEqual([outlier.duration for outlier
+                                  in self.outliers.outliers(category, key)],
+                                 expected)
+
+    def test_run(self):
+        self.check('run', {cpu_id : [duration for begin_ts, duration
+                                     in stats.duration_list]
+                           for cpu_id, stats
+                           in self.collector.per_cpu_usage_stats.items()}, 5)
+
+    def test_syscall(self):
+        durations = {}
+        for syscall_stats in self.collector.thread_syscall_stats():
+            for name, stats in syscall_stats.items():
+                durations.setdefault(name, []).extend(
+                            duration for begin_ts, duration
+                            in stats.duration_list)
+
+        # K beyond the count of every syscall: none is left out, not even
+        # the negative ones
+        self.assertTrue(any(duration < 0 for key_durations in
+                            durations.values() for duration in key_durations))
+        self.check('syscall', durations, 1000)
+
+    def test_interrupts(self):
+        self.check('irq', {irq : [duration for begin_ts, duration
+                                  in stats.duration_list]
+                           for irq, stats
+                           in self.collector.per_irq_usage_stats.items()}, 3)
+        self.check('softirq', {vec : [duration for begin_ts, duration
+                                      in stats.duration_list]
+                               for vec, stats in
+                               self.collector.per_softirq_usage_stats.items()},
+                   1)
+
+if __name__ == '__main__':
+    unittest.main()
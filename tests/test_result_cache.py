@@ -0,0 +1,120 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from core import result_cache
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.result_cache import ResultCache
+from core.stat_collector import RunOptions
+
+from .test_cpu_stat_shard import ListSource, report
+
+# ResultCache, and CpuStatCollector reading its results back from it instead
+# of analysing the trace again.
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.trace = os.path.join(self.tmp_dir.name, 'trace')
+        os.mkdir(self.trace)
+        self.write_stream('channel0_0', b'stream')
+
+        self.cache = ResultCache(os.path.join(self.tmp_dir.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_stream(self, name, data, mtime_ns=None):
+        stream_path = os.path.join(self.trace, name)
+        with open(stream_path, 'wb') as f:
+            f.write(data)
+
+        if mtime_ns is not None:
+            os.utime(stream_path, ns=(mtime_ns, mtime_ns))
+
+    def test_key(self):
+        self.write_stream('channel0_0', b'stream', 10 ** 18)
+        key = self.cache.key(self.trace, ('options',))
+
+        self.assertEqual(self.cache.key(self.trace, ('options',)), key)
+        self.assertNotEqual(self.cache.key(self.trace, ('other',)), key)
+
+        # the trace growing, or rewritten in place
+        for name, data, mtime_ns in (('channel0_0', b'streams', 10 ** 18),
+                                     ('channel0_0', b'stream', 2 * 10 ** 18),
+                                     ('channel0_1', b'', None)):
+            with self.subTest(name=name, data=data):
+                self.write_stream(name, data, mtime_ns)
+                self.assertNotEqual(self.cache.key(self.trace, ('options',)),
+                                    key)
+
+        with mock.patch.object(result_cache, 'ANALYSER_VERSION',
+                               result_cache.ANALYSER_VERSION + 1):
+            self.assertNotEqual(self.cache.key(self.trace, ('options',)), key)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.cache.load('key'))
+
+        self.cache.store('key', {'sum' : 42})
+        self.assertEqual(self.cache.load('key'), {'sum' : 42})
+        self.assertEqual(os.listdir(self.cache.cache_dir), ['key.pickle'])
+
+    def test_unreadable(self):
+        self.cache.store('truncated', list(range(1000)))
+        with open(self.cache.entry_path('truncated'), 'r+b') as f:
+            f.truncate(100)
+
+        os.makedirs(self.cache.cache_dir, exist_ok=True)
+        with open(self.cache.entry_path('old'), 'wb') as f:
+            pickle.dump({'version' : result_cache.ANALYSER_VERSION - 1,
+                         'result' : 'stale'}, f)
+
+        # dropped rather than read back
+        self.assertIsNone(self.cache.load('truncated'))
+        self.assertIsNone(self.cache.load('old'))
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    def test_evict(self):
+        self.cache.store('first', bytes(1000))
+        size = os.path.getsize(self.cache.entry_path('first'))
+        self.cache.max_size = 2 * size
+
+        self.cache.store('second', bytes(1000))
+        os.utime(self.cache.entry_path('first'), ns=(1, 1))
+        os.utime(self.cache.entry_path('second'), ns=(3, 3))
+
+        # 'first' read last, 'second' is the least recently used
+        self.cache.load('first')
+        self.cache.store('third', bytes(1000))
+
+        self.assertEqual(sorted(os.listdir(self.cache.cache_dir)),
+                         ['first.pickle', 'third.pickle'])
+
+    def test_collector(self):
+        source = ListSource(list(SyntheticSource(events=5000).events()))
+
+        with mock.patch('core.analyser_runner.open_trace_source',
+                        return_value=source) as open_trace_source:
+            collector = CpuStatCollector(self.trace, options=RunOptions(
+                                            cache=self.cache))
+            collector.run()
+
+            cached = CpuStatCollector(self.trace, options=RunOptions(
+                                            cache=self.cache))
+            cached.run()
+
+            # another time range is another result
+            ranged = CpuStatCollector(self.trace, options=RunOptions(
+                            begin_ts=source.timestamp_begin + 1000,
+                            cache=self.cache))
+            ranged.run()
+
+        self.assertEqual(open_trace_source.call_count, 2)
+        self.assertIsNone(cached.analyser_runner)
+        self.assertEqual(report(cached), report(collector))
+        self.assertNotEqual(report(ranged), report(collector))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.stat_collector import RunOptions
+from core.event_columns import ColumnEvent
+from core.event_source import SyntheticSource
+from core.rollup import rollup_rows
+
+from .test_cpu_stat_shard import ListSource, report
+from .test_lifecycle import switch, lifecycle
+
+def syscall(timestamp, name, exit=False):
+    if exit:
+        return ColumnEvent('syscall_exit_' + name, timestamp,
+                           {'cpu_id' : 0, 'ret' : 0})
+
+    return ColumnEvent('syscall_entry_' + name, timestamp, {'cpu_id' : 0})
+
+# a process of two threads, a thread whose tgid isn't traced, and a thread
+# only seen in a zero-length timeslice. The process then ends, and a new one
+# reuses its tgid.
+EVENTS = [
+    lifecycle('sched_process_fork', 100, child_tid=10, child_pid=10),
+    lifecycle('sched_process_fork', 200, child_tid=11, child_pid=10),
+    switch(1000, 0, 'swapper/0', 10, 'srv'),
+    switch(2000, 10, 'srv', 11, 'srv-worker'),
+    syscall(2500, 'read'),
+    syscall(3000, 'read', exit=True),
+    switch(4000, 11, 'srv-worker', 12, 'cat'),
+    syscall(4100, 'write'),
+    syscall(4400, 'write', exit=True),
+    switch(4500, 12, 'cat', 13, 'z'),
+    switch(4500, 13, 'z', 0, 'swapper/0'),
+    lifecycle('sched_process_exit', 5000, tid=10),
+    lifecycle('sched_process_free', 5000, tid=10),
+    lifecycle('sched_process_fork', 6000, child_tid=10, child_pid=10),
+    switch(7000, 0, 'swapper/0', 10, 'new'),
+    switch(7300, 10, 'new', 0, 'swapper/0'),
+]
+
+def run_collector(events, rollups):
+    collector = CpuStatCollector(None,
+                                 options=RunOptions(source=ListSource(events)),
+                                 rollups=rollups)
+    collector.run()
+
+    return collector
+
+# label -> (usage sum, usage count, syscall sum) of the rows at 'level'
+def rows(collector, level):
+    return {row.label : (row.stats.sum, row.stats.count,
+                         row.syscall_total.sum)
+            for row in rollup_rows(collector, level)}
+
+# The per-thread tables added up per process and per comm.
+class RollupTest(unittest.TestCase):
+    def test_process(self):
+        collector = run_collector(EVENTS, ('tid', 'process'))
+
+        self.assertEqual(rows(collector, 'process'), {
+            'srv (10)' : (3000, 2, 500),
+            'cat (12)' : (500, 1, 300),
+            'z (13)' : (0, 1, 0),
+            'new (10)' : (300, 1, 0),
+        })
+
+    def test_comm(self):
+        events = EVENTS + [switch(8000, 0, 'swapper/0', 14, 'cat'),
+                           switch(8200, 14, 'cat', 0, 'swapper/0')]
+        collector = run_collector(events, ('comm',))
+
+        self.assertEqual(rows(collector, 'comm'), {
+            'srv' : (1000, 1, 0),
+            'srv-worker' : (2000, 1, 500),
+            'cat' : (700, 2, 300),
+            'z' : (0, 1, 0),
+            'new' : (300, 1, 0),
+        })
+
+    def test_zero_usage(self):
+        output = report(run_collector(EVENTS, ('tid', 'process', 'comm')))
+
+        self.assertIn('z (13)', output)
+
+    def test_folded(self):
+        # without the per-tid table, ended threads are only kept added up
+        for rollups in (('process',), ('comm',), ('process', 'comm')):
+            with self.subTest(rollups=rollups):
+                folded = run_collector(EVENTS, rollups)
+                self.assertEqual(folded.ended_threads, [])
+
+                kept = run_collector(EVENTS, ('tid',) + rollups)
+                for level in rollups:
+                    self.assertEqual(rows(folded, level), rows(kept, level))
+
+    def test_synthetic(self):
+        # the rollups add up to the per-tid table
+        events = list(SyntheticSource(cpus=4, threads=16, events=20000,
+                                      exit_rate=0.02).events())
+        collector = run_collector(events, ('tid', 'process', 'comm'))
+
+        tid_rows = rows(collector, 'tid').values()
+        for level in ('process', 'comm'):
+            with self.subTest(level=level):
+                level_rows = rows(collector, level).values()
+                self.assertEqual(sum(row[0] for row in level_rows),
+                                 sum(row[0] for row in tid_rows))
+                self.assertEqual(sum(row[1] for row in level_rows),
+                                 sum(row[1] for row in tid_rows))
+                self.assertEqual(sum(row[2] for row in level_rows),
+                                 sum(row[2] for row in tid_rows))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import sys
+import unittest
+from unittest import mock
+
+import analyse_cpu_usage
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.outlier_collector import OutlierCollector
+from core.run_profiler import RunProfiler
+from core.stat_collector import RunOptions
+from core.timeline_collector import TimelineCollector
+
+from .test_cpu_stat_shard import ListSource
+
+# the parse_args() error message for 'argv', None when it parses
+def parse_error(argv):
+    stderr = io.StringIO()
+    with mock.patch.object(sys, 'argv', ['analyse_cpu_usage.py'] + argv), \
+         contextlib.redirect_stderr(stderr):
+        try:
+            analyse_cpu_usage.parse_args()
+        except SystemExit:
+            return stderr.getvalue().strip().splitlines()[-1]
+
+    return None
+
+# Options the numpy engine or the parallel runner can't honour, refused
+# rather than silently running the serial analysis.
+class RunOptionsTest(unittest.TestCase):
+    def setUp(self):
+        self.source = ListSource(list(SyntheticSource(events=1000).events()))
+
+    def check_refused(self, collector, message):
+        with self.assertRaises(ValueError) as cm:
+            collector.run()
+
+        self.assertEqual(str(cm.exception), message)
+        self.assertIsNone(collector.analyser_runner)
+
+    def test_attached(self):
+        collector = CpuStatCollector(None, options=RunOptions(
+                                engine='numpy', source=self.source))
+        collector.attach(OutlierCollector(None))
+
+        self.check_refused(collector,
+                           'OutlierCollector only runs the serial analysis')
+
+    def test_not_mergeable(self):
+        collector = TimelineCollector(None, options=RunOptions(
+                                jobs=2, source=self.source))
+
+        self.check_refused(collector,
+                           'TimelineCollector only runs the serial analysis')
+
+    def test_profiler(self):
+        collector = CpuStatCollector(None, options=RunOptions(
+                    engine='numpy', source=self.source,
+                    profiler=RunProfiler(5.0)))
+
+        self.check_refused(collector,
+                           'the profiler only times the serial analysis')
+
+    def test_source_in_parallel(self):
+        collector = CpuStatCollector(None, options=RunOptions(
+                                windows=2, source=self.source))
+
+        self.check_refused(collector, 'event sources are only read by the '
+                                      'serial analysis')
+
+    def test_serial(self):
+        # every option goes with the serial analysis
+        collector = CpuStatCollector(None, options=RunOptions(
+                    source=self.source, profiler=RunProfiler(5.0)))
+        collector.attach(OutlierCollector(None))
+        collector.run()
+
+        self.assertIsNone(collector.analyser_runner.fallback)
+
+    def test_parse_args(self):
+        for argv, message in (
+                (['--engine', 'numpy', '-j', '2'],
+                 '--engine numpy cannot be used with --jobs and --windows'),
+                (['-j', '2', '--timeline', 'cpu.csv'],
+                 '--timeline cannot be used with --jobs and --windows'),
+                (['-w', '2', '--outliers', '5'],
+                 '--outliers cannot be used with --jobs and --windows'),
+                (['--engine', 'numpy', '--export-intervals', 'intervals'],
+                 '--export-intervals cannot be used with --engine numpy'),
+                (['--engine', 'numpy', '--profile'],
+                 '--profile cannot be used with --engine numpy'),
+                (['-j', '2', '--checkpoint', 'state'],
+                 '--checkpoint cannot be used with --jobs and --windows'),
+                (['--engine', 'numpy', '--outliers', '5', '--profile'],
+                 '--outliers cannot be used with --engine numpy'),
+                (['-j', '4', '-w', '2'], None),
+                (['--engine', 'numpy', '--keep-intervals'], None)):
+            with self.subTest(argv=argv):
+                error = parse_error(['trace'] + argv)
+                if message is None:
+                    self.assertIsNone(error)
+                else:
+                    self.assertTrue(error.endswith('error: ' + message),
+                                    error)
+
+    def test_text_dump_in_parallel(self):
+        self.assertTrue(parse_error([__file__, '-j', '2']).endswith(
+                        'error: --jobs and --windows need a trace directory'))
+
+if __name__ == '__main__':
+    unittest.main()
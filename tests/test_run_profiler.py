@@ -0,0 +1,99 @@
+import collections
+import io
+import re
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.run_profiler import RunProfiler, PROGRESS_CHECK_EVENTS
+from core.run_profiler import format_seconds
+from core.stat_collector import RunOptions
+
+from .test_cpu_stat_shard import ListSource, FIXTURE, report
+
+PROGRESS_RE = re.compile(r'^progress: ([\d.]+) %, (\d+) events, \d+ events/s, '
+                         r'ETA (\d+:\d\d:\d\d)$')
+
+# RunProfiler timing a serial run, without changing its results.
+class RunProfilerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(cls.events)))
+        collector.run()
+        cls.report = report(collector)
+
+    def run_profiled(self, progress_interval=5.0):
+        output = io.StringIO()
+        profiler = RunProfiler(progress_interval, output)
+        collector = CpuStatCollector(None, options=RunOptions(
+                            source=ListSource(self.events), profiler=profiler))
+        collector.run()
+
+        return collector, profiler, output
+
+    def test_same_results(self):
+        collector, profiler, output = self.run_profiled()
+
+        self.assertEqual(report(collector), self.report)
+        self.assertEqual(output.getvalue(), '')
+
+    def test_counts(self):
+        collector, profiler, output = self.run_profiled()
+
+        self.assertEqual(profiler.event_counts,
+                         collections.Counter(event.name
+                                             for event in self.events))
+
+        calls = {name : calls for name, (calls, seconds)
+                 in profiler.analyser_stats.items()}
+        self.assertEqual(calls['SchedAnalyser.process_sched_switch'],
+                         profiler.event_counts['sched_switch'])
+        self.assertEqual(calls['IrqAnalyser.process_irq_handler_entry'],
+                         profiler.event_counts['irq_handler_entry'])
+
+        notifier_calls = {name : calls for name, (calls, seconds)
+                          in profiler.collector_stats.items()}
+        self.assertEqual(notifier_calls['CpuStatCollector.process_irq_exit'],
+                         sum(stats.count for stats in
+                             collector.per_cpu_irq_usage_stats.values()))
+
+        # the parts add up to the run, dispatch being the rest
+        self.assertLessEqual(profiler.decode_time + profiler.analyser_time +
+                             profiler.collector_time, profiler.total_time)
+
+    def test_progress(self):
+        collector, profiler, output = self.run_profiled(progress_interval=0)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), len(self.events) // PROGRESS_CHECK_EVENTS)
+
+        percents = []
+        for index, line in enumerate(lines):
+            match = PROGRESS_RE.match(line)
+            self.assertIsNotNone(match, line)
+            percents.append(float(match.group(1)))
+            self.assertEqual(int(match.group(2)),
+                             (index + 1) * PROGRESS_CHECK_EVENTS)
+
+        self.assertEqual(percents, sorted(percents))
+        self.assertLessEqual(percents[-1], 100)
+
+    def test_print_result(self):
+        collector, profiler, output = self.run_profiled()
+        profiler.print_result()
+
+        text = output.getvalue()
+        for title in ('=== Profile ===', '=== Analyser Callbacks ===',
+                      '=== Collector Notifiers ===', '=== Events ==='):
+            self.assertIn(title, text)
+        self.assertIn('%d events in' % len(self.events), text)
+
+    def test_format_seconds(self):
+        self.assertEqual(format_seconds(0), '0:00:00')
+        self.assertEqual(format_seconds(3725.9), '1:02:05')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import collections
+import unittest
+
+from core import state
+from core.event_source import SyntheticSource
+from core.stat_collector import StatCollector, RunOptions
+
+from .test_cpu_stat_shard import ListSource, FIXTURE
+
+# The ids of the records the notifiers are handed, per owner.
+class RecordIds(StatCollector):
+    def __init__(self, source):
+        super().__init__(None, self.get_notifiers(),
+                         RunOptions(source=source))
+
+        self.ids = collections.defaultdict(set)
+        self.counts = collections.Counter()
+
+    def get_notifiers(self):
+        return {
+            'sched_out' : self.process_sched_out,
+            'syscall_exit' : self.process_syscall_exit,
+            'irq_exit' : self.process_irq_exit,
+            'softirq_exit' : self.process_softirq_exit,
+        }
+
+    def record(self, kind, owner, record):
+        self.ids[kind, owner].add(id(record))
+        self.counts[kind] += 1
+
+    def process_sched_out(self, cpu, proc):
+        self.record('timeslice', proc.tid, proc.duration)
+        self.record('irq_stolen', proc.tid, proc.irq_stolen_duration)
+
+    def process_syscall_exit(self, cpu, syscall):
+        self.record('syscall', cpu.current_proc.tid, syscall)
+        self.record('waiting', cpu.current_proc.tid, syscall.waiting_duration)
+
+    def process_irq_exit(self, cpu, irq):
+        self.record('irq', cpu.cpu_id, irq)
+
+    def process_softirq_exit(self, cpu, softirq):
+        self.record('softirq', cpu.cpu_id, softirq)
+
+# The analysers reusing one record per cpu or thread instead of allocating
+# one per event.
+class SlotStateTest(unittest.TestCase):
+    def test_reused(self):
+        source = ListSource(list(SyntheticSource(**FIXTURE).events()))
+        collector = RecordIds(source)
+        collector.run()
+
+        for kind in ('timeslice', 'irq_stolen', 'syscall', 'waiting', 'irq',
+                     'softirq'):
+            with self.subTest(kind=kind):
+                owners = [owner for owner_kind, owner in collector.ids
+                          if owner_kind == kind]
+                self.assertGreater(collector.counts[kind], 10 * len(owners))
+                for owner in owners:
+                    self.assertEqual(len(collector.ids[kind, owner]), 1)
+
+    def test_slots(self):
+        for record in (state.State(), state.Cpu(0), state.Process(1, 'a'),
+                       state.Syscall('read'), state.Irq('eth0', 3),
+                       state.SoftIrq(1), state.Duration(0)):
+            with self.subTest(record=type(record).__name__):
+                self.assertFalse(hasattr(record, '__dict__'))
+
+if __name__ == '__main__':
+    unittest.main()
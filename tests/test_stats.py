@@ -0,0 +1,96 @@
+import math
+import random
+import statistics
+import unittest
+
+from core.stats import DurationStats, Total, HISTOGRAM_SUB_BUCKETS
+
+# the durations of a run, log-uniform over 1ns .. 1s with a few zeros
+def durations(seed, count=20000):
+    rand = random.Random(seed)
+
+    return [0 if rand.random() < 0.01 else int(2 ** rand.uniform(0, 30))
+            for _ in range(count)]
+
+# the value of rank ceil(count * percent / 100) in sorted order
+def exact_percentile(values, percent):
+    values = sorted(values)
+
+    return values[math.ceil(len(values) * percent / 100) - 1]
+
+def duration_stats(values, keep_intervals=False):
+    stats = DurationStats(keep_intervals)
+    for begin_ts, duration in enumerate(values):
+        stats.update(begin_ts, duration)
+
+    return stats
+
+# DurationStats in constant memory: running moments and a log-bucketed
+# histogram instead of every interval, unless asked to keep them.
+class DurationStatsTest(unittest.TestCase):
+    def check_stats(self, stats, values):
+        self.assertEqual(stats.count, len(values))
+        self.assertEqual(stats.sum, sum(values))
+        self.assertEqual(stats.min_duration, min(values))
+        self.assertEqual(stats.max_duration, max(values))
+        self.assertAlmostEqual(stats.average, statistics.mean(values))
+        self.assertLess(abs(stats.stddev - statistics.pstdev(values)),
+                        1e-6 * statistics.pstdev(values))
+
+        for percent in (50, 99, 99.9):
+            with self.subTest(percent=percent):
+                expected = exact_percentile(values, percent)
+                self.assertLessEqual(abs(stats.percentile(percent) - expected),
+                                     0.022 * expected)
+
+    def test_streaming(self):
+        values = durations(1)
+        stats = duration_stats(values)
+
+        self.check_stats(stats, values)
+        self.assertIsNone(stats.duration_list)
+
+    def test_constant_memory(self):
+        # the histogram has at most one bucket per sub-bucket of each power
+        # of 2, whatever the count
+        stats = duration_stats(durations(2, count=100000))
+
+        self.assertLessEqual(len(stats.histogram),
+                             30 * HISTOGRAM_SUB_BUCKETS + 1)
+
+    def test_keep_intervals(self):
+        values = durations(3, count=100)
+        stats = duration_stats(values, keep_intervals=True)
+
+        self.assertEqual(stats.duration_list, list(enumerate(values)))
+
+    def test_merge(self):
+        values = durations(4)
+        whole = duration_stats(values)
+
+        for split in (0, 1, 5000, len(values)):
+            with self.subTest(split=split):
+                merged = duration_stats(values[:split])
+                merged.merge(duration_stats(values[split:]))
+
+                self.check_stats(merged, values)
+                self.assertEqual(merged.histogram, whole.histogram)
+
+    def test_empty(self):
+        stats = DurationStats()
+
+        self.assertEqual((stats.average, stats.stddev, stats.p99), (0, 0, 0))
+
+    def test_total(self):
+        values = durations(5, count=100)
+        first, second = Total(), Total()
+        for duration in values[:30]:
+            first.add(duration)
+        for duration in values[30:]:
+            second.add(duration)
+        first.merge(second)
+
+        self.assertEqual((first.sum, first.count), (sum(values), len(values)))
+
+if __name__ == '__main__':
+    unittest.main()
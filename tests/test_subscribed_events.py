@@ -0,0 +1,95 @@
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_columns import ColumnEvent
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+
+from .test_cpu_stat_shard import ListSource, report
+
+# events of classes no analyser handles
+NOISE_NAMES = ('kmem_kmalloc', 'block_rq_issue', 'lttng_ust_tracef:event')
+
+# An event no analyser handles, failing when one of its fields is read.
+class NoiseEvent(ColumnEvent):
+    __slots__ = ()
+
+    def __getitem__(self, field):
+        raise AssertionError('%s field %s read' % (self.name, field))
+
+# A ListSource declaring the names of the events it holds.
+class DeclaringSource(ListSource):
+    def __init__(self, events, event_names):
+        super().__init__(events)
+        self.names = event_names
+
+    def event_names(self):
+        return self.names
+
+def with_noise(events):
+    noisy = []
+    for index, event in enumerate(events):
+        noisy.append(event)
+        noisy.append(NoiseEvent(NOISE_NAMES[index % len(NOISE_NAMES)],
+                                event.timestamp, {}))
+
+    return noisy
+
+# AnalyserRunner only dispatching the events of the classes the analysers
+# subscribe to, when the source declares its event classes.
+class SubscribedEventsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        source = SyntheticSource(cpus=2, threads=8, events=5000,
+                                 irq_rate=0.05, softirq_rate=0.05)
+        cls.event_names = source.event_names()
+        cls.events = list(source.events())
+
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(cls.events)))
+        collector.run()
+        cls.report = report(collector)
+
+    # the report, and the names of the events dispatched
+    def run_counting(self, source):
+        collector = CpuStatCollector(None, options=RunOptions(source=source))
+        runner = collector.new_analyser_runner()
+
+        dispatched = set()
+        dispatch = runner.dispatcher.dispatch
+        def counting_dispatch(event):
+            dispatched.add(event.name)
+            dispatch(event)
+        runner.dispatcher.dispatch = counting_dispatch
+
+        collector.analyser_runner = runner
+        runner.run()
+
+        return report(collector), dispatched
+
+    def test_subscribed(self):
+        source = DeclaringSource(with_noise(self.events),
+                                 self.event_names | set(NOISE_NAMES))
+        runner = CpuStatCollector(None, options=RunOptions(
+                                        source=source)).new_analyser_runner()
+
+        self.assertEqual(runner.subscribed_events(), self.event_names)
+
+    def test_skipped(self):
+        source = DeclaringSource(with_noise(self.events),
+                                 self.event_names | set(NOISE_NAMES))
+        output, dispatched = self.run_counting(source)
+
+        self.assertEqual(output, self.report)
+        self.assertTrue(dispatched.isdisjoint(NOISE_NAMES))
+
+    def test_undeclared(self):
+        # every event is dispatched, the unhandled ones to no callback
+        output, dispatched = self.run_counting(
+                                        ListSource(with_noise(self.events)))
+
+        self.assertEqual(output, self.report)
+        self.assertTrue(dispatched.issuperset(NOISE_NAMES))
+
+if __name__ == '__main__':
+    unittest.main()
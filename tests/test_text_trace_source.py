@@ -0,0 +1,196 @@
+import os
+import tempfile
+import unittest
+
+from core import text_trace_source
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+from core.text_trace_source import TextTraceSource, parse_line
+
+from .test_cpu_stat_shard import ListSource, report
+
+FIXTURE = {
+    'cpus' : 4,
+    'threads' : 16,
+    'events' : 20000,
+    'irq_rate' : 0.05,
+    'softirq_rate' : 0.05,
+    'timestamp_begin' : 5 * 10 ** 9,
+}
+
+def seconds(timestamp):
+    return '%d.%09d' % divmod(timestamp, 10 ** 9)
+
+# the events as the lines of a 'perf' script or 'ftrace' dump, with some
+# lines of events the analysers don't read
+def dump_lines(events, dump_format):
+    lines = []
+    if dump_format == 'ftrace':
+        lines.append('# tracer: nop\n')
+
+    running = {}
+    for event in events:
+        cpu_id = event['cpu_id']
+        comm, tid = running.get(cpu_id, ('swapper/%d' % cpu_id, 0))
+        name = event.name
+
+        if name == 'sched_switch':
+            running[cpu_id] = (event['next_comm'], event['next_tid'])
+            subsystem = 'sched:'
+            fields = 'prev_comm=%s prev_pid=%d prev_prio=120 prev_state=S ' \
+                     '==> next_comm=%s next_pid=%d next_prio=120' % \
+                     (event['prev_comm'], event['prev_tid'],
+                      event['next_comm'], event['next_tid'])
+        elif name == 'irq_handler_entry':
+            subsystem = 'irq:'
+            fields = 'irq=%d name=%s' % (event['irq'], event['name'])
+        elif name == 'irq_handler_exit':
+            subsystem = 'irq:'
+            fields = 'irq=%d ret=handled' % event['irq']
+        elif name.startswith('irq_softirq_'):
+            subsystem = 'irq:'
+            name = name[len('irq_'):]
+            fields = 'vec=%d [action=NET_RX]' % event['vec']
+        elif name.startswith('syscall_entry_'):
+            subsystem = 'syscalls:'
+            name = 'sys_enter_' + name[len('syscall_entry_'):]
+            fields = 'fd: 0x00000003'
+        else:
+            subsystem = 'raw_syscalls:'
+            name = 'sys_exit'
+            fields = 'NR 0 = 0'
+
+        if dump_format == 'perf':
+            header = '%16s %6d [%03d] %s: %s' % (comm, tid, cpu_id,
+                                                 seconds(event.timestamp),
+                                                 subsystem)
+        else:
+            header = '%16s-%-7d [%03d] d..2. %s: ' % (comm, tid, cpu_id,
+                                                      seconds(event.timestamp))
+
+        lines.append('%s%s: %s\n' % (header, name, fields))
+        if tid % 7 == 1:
+            lines.append('%stimer_start: timer=0x1 function=tick\n' % header)
+
+    return lines
+
+# parse_line() on the lines of each format, and TextTraceSource streaming a
+# dump as the events it was written from.
+class TextTraceSourceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(**FIXTURE).events())
+
+        collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(cls.events)))
+        collector.run()
+        cls.report = report(collector)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_dump(self, lines):
+        path = os.path.join(self.tmp_dir.name, 'dump.txt')
+        with open(path, 'w') as f:
+            f.writelines(lines)
+
+        return TextTraceSource(path)
+
+    def test_parse_line(self):
+        for line, name, timestamp, fields in (
+                ('   my app  4321 [001]  5678.901234: sched:sched_switch: '
+                 'prev_comm=my app prev_pid=4321 prev_prio=120 prev_state=S '
+                 '==> next_comm=swapper/1 next_pid=0 next_prio=120',
+                 'sched_switch', 5678901234000,
+                 {'cpu_id' : 1, 'prev_comm' : 'my app', 'prev_tid' : 4321,
+                  'next_comm' : 'swapper/1', 'next_tid' : 0}),
+                ('  bash-4321  [002]  5678.000000001: sched_switch: '
+                 'bash:4321 [120] S ==> kworker/1:2:77 [120]',
+                 'sched_switch', 5678000000001,
+                 {'cpu_id' : 2, 'prev_comm' : 'bash', 'prev_tid' : 4321,
+                  'next_comm' : 'kworker/1:2', 'next_tid' : 77}),
+                ('  [x]-12 [003] d.h1. 10.5: irq_handler_entry: irq=24 '
+                 'name=nvme0q1', 'irq_handler_entry', 10500000000,
+                 {'cpu_id' : 3, 'irq' : 24, 'name' : 'nvme0q1'}),
+                ('  bash  4321 [004]  1.000001: raw_syscalls:sys_enter: '
+                 'NR 232 (4, 7ffc, 1, ffffffff, 0, 0)', 'sys_enter_nr232',
+                 1000001000, {'cpu_id' : 4}),
+                ('  bash  4321 [005]  1.000002: syscalls:sys_exit_read: '
+                 '0x0', 'sys_exit_read', 1000002000, {'cpu_id' : 5})):
+            with self.subTest(line=line):
+                event = parse_line(line)
+                self.assertEqual((event.name, event.timestamp, event.fields),
+                                 (name, timestamp, fields))
+
+        self.assertIsNone(parse_line('  bash  4321 [002]  1.0: '
+                                     'timer:hrtimer_start: timer=1'))
+        for line in ('sched_switch: prev_comm=a',
+                     '  bash  4321 [002]  1.0: sched:sched_switch: garbage',
+                     '  bash  4321 [002]  1.0: irq:irq_handler_entry: '
+                     'irq=x'):
+            with self.subTest(line=line):
+                with self.assertRaises(ValueError):
+                    parse_line(line)
+
+    def test_formats(self):
+        for dump_format in ('perf', 'ftrace'):
+            with self.subTest(dump_format=dump_format):
+                source = self.write_dump(dump_lines(self.events, dump_format))
+                collector = CpuStatCollector(None, options=RunOptions(
+                                                            source=source))
+                collector.run()
+
+                self.assertEqual(report(collector), self.report)
+                self.assertEqual(source.unparsed_lines, 0)
+                self.assertEqual((source.timestamp_begin,
+                                  source.timestamp_end),
+                                 (self.events[0].timestamp,
+                                  self.events[-1].timestamp))
+
+    def test_seek(self):
+        lines = dump_lines(self.events, 'ftrace')
+        source = self.write_dump(lines)
+        self.assertGreater(len(source.data),
+                           4 * text_trace_source.SEEK_GRANULE)
+
+        begin_ts = self.events[12000].timestamp
+        end_ts = self.events[15000].timestamp
+        offset = source.seek(begin_ts)
+
+        # a line beginning, before the range but within a granule of it
+        begin = source.data.find(seconds(begin_ts).encode())
+        self.assertEqual(source.data[offset - 1:offset], b'\n')
+        self.assertLessEqual(offset, begin)
+        self.assertLess(begin - offset,
+                        2 * text_trace_source.SEEK_GRANULE)
+
+        self.assertEqual([(event.name, event.timestamp) for event
+                          in source.events(begin_ts, end_ts)],
+                         [(event.name, event.timestamp) for event
+                          in source.events()
+                          if begin_ts <= event.timestamp <= end_ts])
+
+    def test_unparsed(self):
+        lines = dump_lines(self.events[:100], 'perf')
+        lines.insert(10, '  bash  4321 [002]  5.000010: sched:sched_switch: '
+                         'truncated\n')
+
+        source = self.write_dump(lines)
+        events = list(source.events())
+
+        self.assertEqual(len(events), 100)
+        self.assertEqual(source.unparsed_lines, 1)
+        self.assertIn('truncated', source.unparsed_example[0])
+
+    def test_empty(self):
+        source = self.write_dump([])
+
+        self.assertEqual(list(source.events()), [])
+        self.assertIsNone(source.timestamp_begin)
+
+if __name__ == '__main__':
+    unittest.main()
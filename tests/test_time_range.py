@@ -0,0 +1,105 @@
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+from core.trace_time import TraceTime, TimeRangeError, parse_trace_time
+
+from .test_cpu_stat_shard import ListSource
+
+# A ListSource recording the ranges it's asked for and the events it yields.
+class SeekingSource(ListSource):
+    def __init__(self, events):
+        super().__init__(events)
+
+        self.ranges = []
+        self.yielded = 0
+
+    def events(self, begin_ts=None, end_ts=None):
+        self.ranges.append((begin_ts, end_ts))
+
+        for event in super().events(begin_ts, end_ts):
+            self.yielded += 1
+            yield event
+
+# --begin and --end: the times given, and the analysis of the range only.
+class TimeRangeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.events = list(SyntheticSource(cpus=2, threads=8,
+                                          events=5000).events())
+
+    def run_range(self, begin_ts, end_ts):
+        source = SeekingSource(self.events)
+        collector = CpuStatCollector(None, options=RunOptions(
+                        begin_ts=begin_ts, end_ts=end_ts, source=source))
+        collector.run()
+
+        return collector, source
+
+    def test_parse(self):
+        for text, timestamp, relative in (('1500', 1500, False),
+                                          ('1.5us', 1500, False),
+                                          ('+2ms', 2000000, True),
+                                          ('1.23456789123s', 1234567891,
+                                           False),
+                                          (' +3s ', 3000000000, True)):
+            with self.subTest(text=text):
+                trace_time = parse_trace_time(text)
+                self.assertEqual((trace_time.timestamp, trace_time.relative),
+                                 (timestamp, relative))
+
+        for text in ('', '1.5 ms', '-1s', '1h', '+'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_trace_time(text)
+
+    def test_seek(self):
+        begin_ts = self.events[1000].timestamp
+        end_ts = self.events[2000].timestamp
+        collector, source = self.run_range(TraceTime(begin_ts),
+                                           TraceTime(end_ts))
+
+        # the source is asked for the range, rather than filtered
+        self.assertEqual(source.ranges, [(begin_ts, end_ts)])
+        self.assertEqual(source.yielded,
+                         sum(1 for event in self.events
+                             if begin_ts <= event.timestamp <= end_ts))
+        self.assertEqual((collector.begin_ts, collector.end_ts),
+                         (begin_ts, end_ts))
+
+        for stats in collector.per_cpu_usage_stats.values():
+            self.assertLessEqual(stats.sum, end_ts - begin_ts)
+
+    def test_relative(self):
+        trace_begin_ts = self.events[0].timestamp
+        offset = self.events[1000].timestamp - trace_begin_ts
+        collector, source = self.run_range(TraceTime(offset, relative=True),
+                                           None)
+
+        self.assertEqual(source.ranges, [(trace_begin_ts + offset,
+                                          self.events[-1].timestamp)])
+
+    def test_clamped(self):
+        trace_end_ts = self.events[-1].timestamp
+        collector, source = self.run_range(TraceTime(0),
+                                           TraceTime(trace_end_ts * 2))
+
+        self.assertEqual(source.ranges,
+                         [(self.events[0].timestamp, trace_end_ts)])
+        self.assertEqual(source.yielded, len(self.events))
+
+    def test_empty(self):
+        timestamp = self.events[1000].timestamp
+
+        for begin_ts, end_ts in ((timestamp, timestamp),
+                                 (timestamp + 1, timestamp),
+                                 (self.events[-1].timestamp + 1, None)):
+            with self.subTest(begin_ts=begin_ts, end_ts=end_ts):
+                with self.assertRaises(TimeRangeError):
+                    self.run_range(TraceTime(begin_ts),
+                                   None if end_ts is None
+                                   else TraceTime(end_ts))
+
+if __name__ == '__main__':
+    unittest.main()
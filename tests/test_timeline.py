@@ -0,0 +1,109 @@
+import collections
+import csv
+import io
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+from core.timeline_collector import TimelineCollector, CHUNK_BUCKETS
+from core.trace_time import TraceTime
+
+from .test_cpu_stat_shard import ListSource, FIXTURE
+
+# the CSV 'write' writes, as dicts of ints but for the thread names
+def csv_rows(write):
+    f = io.StringIO()
+    write(f)
+    f.seek(0)
+
+    return [{key : value if key == 'name' else int(value)
+             for key, value in row.items()}
+            for row in csv.DictReader(f)]
+
+# The per-cpu and per-tid timelines adding up to the CpuStatCollector
+# tables they were computed along with.
+class TimelineTest(unittest.TestCase):
+    def run_timeline(self, events, bucket_width, **options):
+        collector = CpuStatCollector(None, options=RunOptions(
+                                    source=ListSource(events), **options))
+        timeline = TimelineCollector(None, bucket_width)
+        collector.attach(timeline)
+        collector.run()
+
+        return collector, timeline
+
+    def test_cpu_totals(self):
+        events = list(SyntheticSource(**FIXTURE).events())
+        collector, timeline = self.run_timeline(events, 100000)
+
+        sums = collections.Counter()
+        for row in csv_rows(timeline.write_cpu_csv):
+            for series in ('usage', 'app', 'syscall', 'irq', 'softirq'):
+                sums[series, row['cpu']] += row[series]
+
+        for series, table in (('usage', collector.per_cpu_usage_stats),
+                              ('app', collector.per_cpu_app_usage_stats),
+                              ('irq', collector.per_cpu_irq_usage_stats),
+                              ('softirq',
+                               collector.per_cpu_softirq_usage_stats)):
+            for cpu_id, stats in table.items():
+                with self.subTest(series=series, cpu_id=cpu_id):
+                    self.assertEqual(sums[series, cpu_id], stats.sum)
+
+        # a syscall is accounted to the cpus it ran on, the table accounts
+        # it to the cpu it exits on
+        self.assertEqual(sum(sums['syscall', cpu_id]
+                             for cpu_id in range(FIXTURE['cpus'])),
+                         sum(stats.sum for stats in
+                             collector.per_cpu_syscall_usage_stats.values()))
+
+    def test_tid_totals(self):
+        # threads exiting and their tids reused, the timelines of both kept
+        events = list(SyntheticSource(exit_rate=0.02, **FIXTURE).events())
+        collector, timeline = self.run_timeline(events, 1000000)
+        self.assertTrue(collector.ended_threads)
+
+        sums = collections.Counter()
+        for row in csv_rows(timeline.write_tid_csv):
+            sums['usage', row['tid'], row['name']] += row['usage']
+            sums['syscall', row['tid'], row['name']] += row['syscall']
+
+        expected = collections.Counter()
+        for tid, stats, syscall_total, syscall_stats in collector.threads():
+            expected['usage', tid, stats.name] += stats.sum
+            expected['syscall', tid, stats.name] += syscall_total.sum
+
+        self.assertEqual(+sums, +expected)
+
+    def test_time_range(self):
+        events = list(SyntheticSource(**FIXTURE).events())
+        begin_ts = events[5000].timestamp
+        end_ts = events[15000].timestamp
+        bucket_width = 100000
+        collector, timeline = self.run_timeline(events, bucket_width,
+                                                begin_ts=TraceTime(begin_ts),
+                                                end_ts=TraceTime(end_ts))
+
+        rows = csv_rows(timeline.write_cpu_csv)
+        self.assertEqual(rows[0]['begin_ts'], begin_ts)
+        self.assertLessEqual(rows[-1]['begin_ts'], end_ts)
+        self.assertGreater(rows[-1]['begin_ts'] + bucket_width, end_ts)
+
+        # no bucket holds more time than it lasts
+        for row in rows:
+            self.assertLessEqual(row['usage'], bucket_width)
+
+    def test_sparse(self):
+        # a thread running in a few buckets of a long trace only has the
+        # chunks of those buckets
+        events = list(SyntheticSource(**FIXTURE).events())
+        collector, timeline = self.run_timeline(events, 1000)
+
+        self.assertGreater(timeline.bucket_count, 100 * CHUNK_BUCKETS)
+        for tid, tid_timeline in timeline.tid_timelines.items():
+            self.assertLess(len(tid_timeline.chunks),
+                            timeline.bucket_count // CHUNK_BUCKETS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import contextlib
+import io
+import unittest
+
+from core.cpu_stat_collector import CpuStatCollector
+from core.event_source import SyntheticSource
+from core.stat_collector import RunOptions
+from core.trace_diff import DiffRow, DIFF_CATEGORIES, DIFF_METRICS
+from core.trace_diff import diff_collectors, diff_thresholds, find_regressions
+from core.trace_diff import print_diff, stats_metrics
+
+from .test_cpu_stat_shard import ListSource, FIXTURE
+
+# the events without every other irq, as a trace before the irqs doubled
+def drop_irqs(events):
+    kept = []
+    dropping = {}
+    irqs = 0
+    for event in events:
+        cpu_id = event['cpu_id']
+        if event.name == 'irq_handler_entry':
+            dropping[cpu_id] = irqs % 2 == 0
+            irqs += 1
+            if dropping[cpu_id]:
+                continue
+        elif event.name == 'irq_handler_exit':
+            if dropping.pop(cpu_id, False):
+                continue
+
+        kept.append(event)
+
+    return kept
+
+def run_collector(events):
+    collector = CpuStatCollector(None, options=RunOptions(
+                                            source=ListSource(events)))
+    collector.run()
+
+    return collector
+
+# diff_collectors() between a trace and the same trace with twice the irqs,
+# and the thresholds telling a change from noise.
+class TraceDiffTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        events = list(SyntheticSource(**FIXTURE).events())
+
+        cls.base = run_collector(drop_irqs(events))
+        cls.candidate = run_collector(events)
+
+    def test_same(self):
+        rows = diff_collectors(self.candidate, self.candidate)
+
+        self.assertEqual(rows, {category : [] for category in DIFF_CATEGORIES})
+        self.assertEqual(find_regressions(rows), [])
+
+    def test_irqs(self):
+        rows = diff_collectors(self.base, self.candidate)
+
+        irq_rows = rows['irq']
+        self.assertEqual(len(irq_rows),
+                         len(self.candidate.per_irq_usage_stats))
+        for row in irq_rows:
+            with self.subTest(irq=row.name):
+                self.assertIn('cpu', row.changed)
+                self.assertGreater(row.impact, 0)
+                self.assertGreater(row.change('count'), 0)
+        self.assertEqual([abs(row.impact) for row in irq_rows],
+                         sorted((abs(row.impact) for row in irq_rows),
+                                reverse=True))
+
+        # the time the irqs took from the threads is given back
+        regressions = find_regressions(rows)
+        self.assertLessEqual(set(irq_rows), set(regressions))
+        self.assertTrue(all(row.impact < 0 for row in rows['tid']
+                            if 'cpu' in row.changed))
+
+        # no change is significant when every threshold is out of reach
+        thresholds = diff_thresholds(threshold=100, relative_threshold=1000,
+                                     latency_thresholds={'average' : 10 ** 9,
+                                                         'max' : 10 ** 9,
+                                                         'p99' : 10 ** 9})
+        self.assertEqual(find_regressions(diff_collectors(
+                                    self.base, self.candidate, thresholds)),
+                         [])
+
+    def test_thresholds(self):
+        thresholds = diff_thresholds(threshold=0.5,
+                                     latency_thresholds={'max' : 20})
+        self.assertEqual(thresholds, {'cpu' : (0.5, 5.0),
+                                      'average' : (1000, 5.0),
+                                      'max' : (20, 5.0),
+                                      'p99' : (1000, 5.0)})
+
+        def row(base, candidate):
+            base_metrics = dict.fromkeys(DIFF_METRICS, 0)
+            candidate_metrics = dict.fromkeys(DIFF_METRICS, 0)
+            base_metrics['max'] = base
+            candidate_metrics['max'] = candidate
+
+            return DiffRow('irq', 'x', base_metrics, candidate_metrics)
+
+        # both the absolute and the relative change are needed
+        self.assertEqual(row(100, 125).changed_metrics(thresholds), ['max'])
+        self.assertEqual(row(100, 110).changed_metrics(thresholds), [])
+        self.assertEqual(row(1000, 1030).changed_metrics(thresholds), [])
+        self.assertEqual(row(125, 100).changed_metrics(thresholds), ['max'])
+        self.assertEqual(row(0, 30).changed_metrics(thresholds), ['max'])
+
+        faster = row(125, 100)
+        faster.changed = ['max']
+        self.assertEqual(faster.regressed_metrics(), [])
+        self.assertIsNone(row(0, 30).relative_change('max'))
+
+        self.assertEqual(stats_metrics(None, 1),
+                         dict.fromkeys(DIFF_METRICS, 0))
+
+    def test_print(self):
+        rows = diff_collectors(self.base, self.candidate)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            print_diff(rows, top=1)
+
+        text = output.getvalue()
+        for category in DIFF_CATEGORIES:
+            self.assertIn('=== %s Changes ===' % category.capitalize(), text)
+        self.assertIn(rows['irq'][0].name, text)
+        self.assertNotIn(rows['irq'][1].name, text)
+
+if __name__ == '__main__':
+    unittest.main()